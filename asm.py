@@ -0,0 +1,549 @@
+#
+# x86_64 assembly listings
+#
+# Code is kept as a list of instructions until it is written out in NASM
+# syntax. An instruction is a tuple (op, operand, ...) of strings, op may
+# also be LABEL or COMMENT with the name or text as its operand, and the
+# empty tuple is an empty line.
+#
+
+import re
+
+
+LABEL = ":"
+COMMENT = ";"
+
+# local labels other units jump to
+ENTRY_LABELS = { ".continue", ".fast" }
+
+def format_code(code):
+    lines = []
+    append = lines.append
+
+    for instruction in code:
+        if not instruction:
+            append("\n")
+            continue
+
+        op = instruction[0]
+        if op is LABEL:
+            append("%s:\n" % (instruction[1]))
+        elif op is COMMENT:
+            append("\t; %s\n" % (instruction[1]))
+        elif len(instruction) == 2:
+            append("\t%s\t%s\n" % (instruction))
+        elif len(instruction) == 1:
+            append("\t%s\n" % (op))
+        else:
+            append("\t%s\t%s\n" % (op, ", ".join(instruction[1:])))
+
+    return "".join(lines)
+
+
+def count_instructions(code):
+    return sum(1 for instruction in code if is_instruction(instruction)
+                                         and instruction[0] != "global")
+
+def is_instruction(instruction):
+    return bool(instruction) and instruction[0] is not LABEL \
+                             and instruction[0] is not COMMENT
+
+
+
+#
+# peephole optimizer
+#
+# The rewrites only look at straight-line code and keep its effect on
+# registers, flags and the stack exactly, apart from memory below rsp.
+# Anything unknown (calls, jumps, labels, other instructions) ends what
+# is known about registers and stack slots. A call may take its arguments
+# in any register but never in the flags, and there are no jumps into a
+# lambda except to its global label, .continue and its local labels.
+#
+
+# 64 bit register of all register names
+REGISTERS = {}
+for r in "abcd":
+    REGISTERS.update({ "%sl" % r: "r%sx" % r, "%sx" % r: "r%sx" % r,
+                       "e%sx" % r: "r%sx" % r, "r%sx" % r: "r%sx" % r })
+for r in [ "si", "di", "bp", "sp" ]:
+    REGISTERS.update({ "%sl" % r: "r" + r, r: "r" + r,
+                       "e" + r: "r" + r, "r" + r: "r" + r })
+for n in range(8, 16):
+    for suffix in [ "b", "w", "d", "" ]:
+        REGISTERS["r%d%s" % (n, suffix)] = "r%d" % (n)
+
+# writing these registers sets the whole 64 bit register
+FULL_REGISTERS = { name for name in REGISTERS
+                   if name.startswith("r") and name[-1] not in "bwl"
+                   or name.startswith("e") }
+
+# instructions with a register destination, known not to touch memory
+# or control flow
+ALU = { "mov", "lea", "xor", "and", "or", "add", "sub", "imul", "shl", "shr",
+        "sar", "inc", "dec", "neg", "not", "movzx", "movsx" }
+
+# instructions only setting flags
+COMPARE = { "cmp", "test" }
+
+# instructions reading the flags
+FLAG_READERS = re.compile(r"j(?!mp)|set|cmov|adc|sbb|rc[lr]|pushf")
+
+# instructions leaving the flags alone
+FLAG_KEEPERS = { "mov", "lea", "push", "pop", "movzx", "movsx", "not" }
+
+JUMPS = re.compile(r"j")
+
+word_re = re.compile(r"[\w.]+")
+slot_re = re.compile(r"\[rsp \+ 8\*(\d+)\]$")
+
+
+def register(operand):
+    return REGISTERS.get(operand)
+
+def slot(operand):
+    m = slot_re.match(operand)
+    return int(m.group(1)) if m else None
+
+def is_immediate(operand):
+    return "[" not in operand and not any(w in REGISTERS for w in word_re.findall(operand))
+
+def uses(operand):
+    """ 64 bit registers an operand reads """
+    return { REGISTERS[w] for w in word_re.findall(operand) if w in REGISTERS }
+
+def is_code(instruction):
+    return bool(instruction) and instruction[0] is not COMMENT
+
+
+def optimize(code):
+    code = list(code)
+
+    for _ in range(8):
+        changed = False
+        for rewrite in [ thread_jumps, remove_unreachable, remove_labels,
+                         combine_pairs, forward_values, remove_dead_writes ]:
+            code, c = rewrite(code)
+            changed |= c
+
+        if not changed:
+            break
+
+    return code
+
+
+#
+# control flow
+#
+
+def thread_jumps(code):
+    """ let jumps go directly to their final destination """
+    labels = { ins[1]: i for i, ins in enumerate(code)
+                         if ins and ins[0] is LABEL }
+
+    def first(label):
+        i = labels[label] + 1
+        while i < len(code) and (not is_code(code[i]) or code[i][0] is LABEL):
+            i += 1
+        return code[i] if i < len(code) else None
+
+    def destination(label):
+        seen = set()
+        while label in labels and label not in seen:
+            seen.add(label)
+            target = first(label)
+            if target is None or target[0] != "jmp":
+                break
+            label = target[1]
+        return label
+
+    result = []
+
+    for ins in code:
+        if ins and JUMPS.match(ins[0]) and ins[1] in labels:
+            target = destination(ins[1])
+            if ins[0] == "jmp" and first(target) == ("ret",):
+                ins = ("ret",)
+            elif target != ins[1]:
+                ins = (ins[0], target)
+
+        result.append(ins)
+
+    return result, result != code
+
+
+def remove_unreachable(code):
+    """ remove code after jmp and ret up to the next label, and jumps to
+        the following label """
+    result = []
+    reachable = True
+
+    for i, ins in enumerate(code):
+        if ins and ins[0] is LABEL:
+            reachable = True
+        elif not reachable:
+            if ins:
+                continue
+
+        if ins and ins[0] == "jmp":
+            # jump to the next label?
+            j = i + 1
+            while j < len(code) and (not is_code(code[j]) or code[j][0] is LABEL):
+                if code[j] == (LABEL, ins[1]):
+                    break
+                j += 1
+            if j < len(code) and code[j] == (LABEL, ins[1]):
+                continue
+
+        if ins and ins[0] in ("jmp", "ret"):
+            reachable = False
+        result.append(ins)
+
+    return result, len(result) != len(code)
+
+
+def remove_labels(code):
+    """ remove local labels nobody refers to """
+    used = set()
+    for ins in code:
+        if ins and ins[0] is not LABEL and ins[0] is not COMMENT:
+            for operand in ins[1:]:
+                used.update(word_re.findall(operand))
+
+    result = [ ins for ins in code
+               if not (ins and ins[0] is LABEL and ins[1].startswith(".")
+                       and ins[1] not in ENTRY_LABELS and ins[1] not in used) ]
+
+    return result, len(result) != len(code)
+
+
+#
+# straight-line code
+#
+
+def next_code(code, i):
+    """ index of the next instruction after i, skipping comments and empty
+        lines """
+    i += 1
+    while i < len(code) and not is_code(code[i]):
+        i += 1
+    return i if i < len(code) else None
+
+
+def combine_pairs(code):
+    """
+    push a / pop b          -> mov b, a
+    pop a / push a          -> mov a, [rsp + 8*0]
+    mov a, [x] / push a     -> push qword [x]       if a is dead
+    mov a, x / mov b, a     -> mov b, x             if a is dead
+    add rsp, x / add rsp, y -> add rsp, x + y
+    add rsp, 8*1 / push a   -> mov [rsp + 8*0], a   if the flags are dead
+    """
+    result = list(code)
+    changed = False
+
+    i = next_code(result, -1)
+    while i is not None:
+        j = next_code(result, i)
+        if j is None:
+            break
+
+        a, b = result[i], result[j]
+        new = None
+
+        if a[0] == "push" and b[0] == "pop" and register(b[1]) \
+                and (register(a[1]) or a[1].startswith("qword [rsp")):
+            if a[1] == b[1]:
+                new = []
+            else:
+                new = [ ("mov", b[1], a[1].replace("qword ", "")) ]
+        elif a[0] == "pop" and b[0] == "push" and a[1] == b[1] and register(a[1]):
+            new = [ ("mov", a[1], "[rsp + 8*0]") ]
+        elif a[0] == "mov" and b[0] == "push" and a[1] == b[1] \
+                and a[1] in FULL_REGISTERS and slot(a[2]) is not None \
+                and not live_after(result, j, register(a[1])):
+            new = [ ("push", "qword " + a[2]) ]
+        elif a[0] == b[0] == "mov" and a[1] == b[2] and a[1] != b[1] \
+                and a[1] in FULL_REGISTERS and b[1] in FULL_REGISTERS \
+                and register(a[1]) == a[1] and register(b[1]) == b[1] \
+                and not live_after(result, j, a[1]):
+            new = [ ("mov", b[1], a[2]) ]
+        elif a[0] == b[0] == "add" and a[1] == b[1] == "rsp" \
+                and a[2].startswith("8*") and b[2].startswith("8*"):
+            new = [ ("add", "rsp", "8*%d" % (int(a[2][2:]) + int(b[2][2:]))) ]
+        elif a == ("add", "rsp", "8*1") and b[0] == "push" and register(b[1]) == b[1] \
+                and flags_dead(result, i):
+            new = [ ("mov", "[rsp + 8*0]", b[1]) ]
+
+        if new is None:
+            i = j
+            continue
+
+        # keep comments in between
+        result[i:j + 1] = new + [ ins for ins in result[i + 1:j] ]
+        changed = True
+        i = next_code(result, i - 1)
+
+    return result, changed
+
+
+def flags_dead(code, i):
+    """ are the flags overwritten after instruction i before anybody reads
+        them? """
+    j = next_code(code, i)
+    while j is not None:
+        op = code[j][0]
+        if op in ("call", "jmp") and not code[j][1].startswith("."):
+            # no function takes flags
+            return True
+        if op is LABEL or op in ("jmp", "ret") or FLAG_READERS.match(op):
+            return False
+        if op in COMPARE:
+            return True
+        if op in ALU and op not in FLAG_KEEPERS and op not in ("inc", "dec"):
+            # don't trust instructions reading their own flag results
+            return True
+        if op not in ALU and op not in FLAG_KEEPERS:
+            return False
+        j = next_code(code, j)
+
+    return False
+
+
+def forward_values(code):
+    """
+    Track which registers hold the value of a stack slot, an immediate,
+    zero or another register, and use that to drop or simplify loads,
+    stores and pushes.
+    """
+    result = []
+    changed = False
+
+    # register -> set of ("slot", n), ("imm", text), ("zero",), ("copy", reg)
+    known = {}
+
+    def forget(reg):
+        known.pop(reg, None)
+        for facts in known.values():
+            facts.discard(("copy", reg))
+
+    def learn(reg, facts):
+        forget(reg)
+        known[reg] = facts
+
+    def shift(n):
+        for reg in list(known):
+            facts = set()
+            for fact in known[reg]:
+                if fact[0] == "slot":
+                    if fact[1] + n >= 0:
+                        facts.add(("slot", fact[1] + n))
+                else:
+                    facts.add(fact)
+            known[reg] = facts
+
+    def holding(fact):
+        for reg, facts in known.items():
+            if fact in facts:
+                return reg
+        return None
+
+    for i, ins in enumerate(code):
+        if not is_code(ins):
+            result.append(ins)
+            continue
+
+        op = ins[0]
+        new = ins
+
+        if op is LABEL or op not in ALU and op not in COMPARE \
+                and op not in ("push", "pop"):
+            known.clear()
+
+        elif op == "push":
+            reg = register(ins[1])
+            if reg and ins[1] == reg:
+                copies = [ f[1] for f in known.get(reg, ()) if f[0] == "copy" ]
+                if copies:
+                    reg = copies[0]
+                    new = ("push", reg)
+            shift(1)
+            if reg:
+                known.setdefault(reg, set()).add(("slot", 0))
+
+        elif op == "pop":
+            reg = register(ins[1])
+            shift(-1)
+            if reg:
+                forget(reg)
+            else:
+                known.clear()
+
+        elif op in COMPARE:
+            pass
+
+        elif op == "lea" and register(ins[1]):
+            forget(register(ins[1]))
+
+        elif op == "add" and ins[1] == "rsp" and ins[2].startswith("8*"):
+            shift(-int(ins[2][2:]))
+
+        elif op == "mov" and slot(ins[1]) is not None and register(ins[2]):
+            # store to stack slot
+            n, reg = slot(ins[1]), register(ins[2])
+            if ins[2] == reg:
+                copies = [ f[1] for f in known.get(reg, ()) if f[0] == "copy" ]
+                if copies:
+                    reg = copies[0]
+                    new = ("mov", ins[1], reg)
+            if new[2] == reg and ("slot", n) in known.get(reg, ()):
+                new = None
+            else:
+                for facts in known.values():
+                    facts.discard(("slot", n))
+                if new[2] == reg:
+                    known.setdefault(reg, set()).add(("slot", n))
+
+        elif op == "mov" and ins[1] == register(ins[1]):
+            # full 64 bit register load
+            reg, source = ins[1], ins[2]
+            n = slot(source)
+
+            if n is not None:
+                fact = ("slot", n)
+            elif register(source) == source:
+                fact = None
+            elif is_immediate(source):
+                fact = ("imm", source)
+            else:
+                fact = False
+
+            if fact and fact in known.get(reg, ()):
+                new = None
+
+            elif fact is None:
+                # register to register
+                facts = set(known.get(source, ()))
+                if facts & known.get(reg, set()) or ("copy", source) in known.get(reg, ()):
+                    new = None
+                else:
+                    if ("zero",) in facts and flags_dead(code, i):
+                        new = ("xor", reg, reg)
+                    else:
+                        imm = [ f[1] for f in facts if f[0] == "imm" ]
+                        if imm:
+                            new = ("mov", reg, imm[0])
+                    learn(reg, facts | { ("copy", source) })
+
+            elif fact:
+                other = holding(fact) if fact[0] == "slot" else None
+                if other is not None and other != reg:
+                    new = ("mov", reg, other)
+                    learn(reg, set(known[other]) | { ("copy", other) })
+                else:
+                    learn(reg, { fact })
+
+            else:
+                known.clear()
+
+        elif op == "xor" and len(ins) == 3 and ins[1] == ins[2] \
+                and ins[1] in FULL_REGISTERS:
+            learn(register(ins[1]), { ("zero",) })
+
+        elif op in ALU and register(ins[1]) and "[" not in "".join(ins[2:]):
+            forget(register(ins[1]))
+
+        else:
+            known.clear()
+
+        if new != ins:
+            changed = True
+        if new is not None:
+            result.append(new)
+
+    return result, changed
+
+
+def reads(ins, reg):
+    if ins[0] in ("mov", "lea", "movzx", "movsx") and ins[1] in FULL_REGISTERS:
+        operands = ins[2:]
+    elif ins[0] == "xor" and ins[1] == ins[2] or ins[0] == "pop":
+        operands = ()
+    else:
+        operands = ins[1:]
+
+    return any(reg in uses(operand) for operand in operands)
+
+def full_write(ins):
+    """ register completely overwritten by ins, or None """
+    if ins[0] in ("mov", "lea", "movzx", "movsx", "pop") and ins[1] in FULL_REGISTERS:
+        return register(ins[1])
+    if ins[0] == "xor" and ins[1] == ins[2] and ins[1] in FULL_REGISTERS:
+        return register(ins[1])
+    return None
+
+def target_reads(target, reg):
+    """
+    Does a call or jump to target read reg? Lambdas and builtins get their
+    parameter on the stack and their number in rcx, the other functions of
+    the runtime and the fast entries of lambdas take theirs in registers.
+    """
+    if target.endswith(".fast"):
+        return True
+    if target.startswith("__") and not target.startswith("__builtin_") \
+                               and not target.startswith("__lambda_"):
+        return True
+    return reg == "rcx"
+
+
+def live_after(code, i, reg):
+    """ may the value of reg after instruction i be read? """
+    j = next_code(code, i)
+    while j is not None:
+        ins = code[j]
+        op = ins[0]
+
+        if op is LABEL:
+            return True
+        if op == "ret":
+            return reg == "rax"
+        if op in ("call", "jmp"):
+            if op == "jmp" and ins[1].startswith("."):
+                # local jump
+                return True
+            # registers don't survive calls
+            return target_reads(ins[1], reg)
+        if op not in ALU and op not in COMPARE and op not in ("push", "pop"):
+            return True
+        if reads(ins, reg):
+            return True
+        if full_write(ins) == reg:
+            return False
+
+        j = next_code(code, j)
+
+    return True
+
+
+def remove_dead_writes(code):
+    """ remove register writes nobody reads """
+    dead = set()
+
+    for i, ins in enumerate(code):
+        if not is_code(ins) or ins[0] not in ("mov", "lea", "xor"):
+            continue
+
+        # only writes without side effects: no flags, no memory but the stack
+        reg = full_write(ins)
+        if reg is None or reg == "rsp":
+            continue
+        if ins[0] == "mov" and "[" in ins[2] and slot(ins[2]) is None:
+            continue
+        if ins[0] == "xor" and not flags_dead(code, i):
+            continue
+
+        if not live_after(code, i, reg):
+            dead.add(i)
+
+    result = [ ins for i, ins in enumerate(code) if i not in dead ]
+    return result, bool(dead)
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+#
+# Benchmark: compare the interpreter backends
+#
+# Runs a few workloads against tests/common.lsp with the tree walker, the
+# closure compiler and the bytecode vm and prints the time of each run.
+#
+
+import os
+import sys
+import time
+import threading
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import environment
+
+
+BACKENDS = [ "tree", "closure", "bytecode" ]
+
+WORKLOADS = [
+        ("fibonacci",
+         [ "(defun fib (n) (if (lt n 2) n (+ (fib (- n 1)) (fib (- n 2)))))" ],
+         "(fib 22)"),
+        ("squaresum",
+         [ "(defun sum (L) (_sum 0 L))",
+           "(defun _sum (acc L) (if L (_sum (+ acc (head L)) (tail L)) acc))" ],
+         "(sum (map (lambda (x) (* x x)) (filter odd (range 0 5000))))"),
+        ("length",
+         [ "(set L (range 0 5000))" ],
+         "(length L)"),
+        ("closure",
+         [ "(defun adder (n) (lambda (x) (+ x n)))" ],
+         "(length (map (adder 3) (range 0 5000)))"),
+    ]
+
+
+def run():
+    print("%-10s %s" % ("workload", "".join("%12s" % b for b in BACKENDS)))
+
+    for name, setup, expr in WORKLOADS:
+        times = []
+        for backend in BACKENDS:
+            env = environment.Environment(backend=backend)
+            env.import_file(os.path.join(ROOT, "tests", "common.lsp"))
+            for line in setup:
+                env.interpret_single_line(line)
+
+            start = time.perf_counter()
+            env.interpret_single_line(expr)
+            times.append(time.perf_counter() - start)
+
+        print("%-10s %s" % (name, "".join("%11.3fs" % t for t in times)))
+
+
+sys.setrecursionlimit(100000)
+threading.stack_size(256 * 1024 * 1024)
+
+thread = threading.Thread(target=run)
+thread.start()
+thread.join()
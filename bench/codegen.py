@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+#
+# Benchmark: code generation for large programs
+#
+# Generates a program of many small functions, function i calling 2i+1 and
+# 2i+2, a program with a single function returning a long quoted list and
+# one like the first, calling a closure with a large body. Measures
+# how long the compiler takes to produce their assembly.
+#
+# Usage: codegen.py [size]
+#
+
+import os
+import sys
+import time
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import environment
+import compiler
+
+
+def many_functions(f, n):
+    for i in range(n):
+        f.write("(defun f%d (x y) (if (lt x %d) (f%d (+ x 1) (cons y '(%d \"s%d\"))) "
+                "(f%d x (map (lambda (z) (* z %d)) y))))\n"
+                % (i, i, min(2 * i + 1, n), i, i % 100, min(2 * i + 2, n), i))
+    f.write("(defun f%d (x y) y)\n" % (n))
+    f.write("(defun main () (f0 0 #nil))\n")
+
+def long_list(f, n):
+    f.write("(defun main () (length '(%s)))\n" % (" ".join(str(i) for i in range(n))))
+
+def closure_calls(f, n):
+    body = "x"
+    for i in range(50):
+        body = "(if (lt %s %d) (+ a %d) (* a (- x %d)))" % (body, i, i, i)
+    f.write("(defun make (a) (lambda (x) %s))\n" % (body))
+    f.write("(set g (make 7))\n")
+    for i in range(n):
+        f.write("(defun f%d (x) (g (f%d (g (f%d x)))))\n"
+                % (i, min(2 * i + 1, n), min(2 * i + 2, n)))
+    f.write("(defun f%d (x) x)\n" % (n))
+    f.write("(defun main () (f0 1))\n")
+
+
+WORKLOADS = [
+        ("functions", many_functions),
+        ("list", long_list),
+        ("closure", closure_calls),
+    ]
+
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+print("%-10s %8s %10s %12s %10s" % ("workload", "size", "load [s]", "codegen [s]", "lines"))
+
+for name, generate in WORKLOADS:
+    with tempfile.NamedTemporaryFile("w", suffix=".lsp", delete=False) as f:
+        generate(f, n)
+        source = f.name
+
+    try:
+        env = environment.Environment()
+        env.import_file(os.path.join(ROOT, "tests", "common.lsp"))
+
+        start = time.perf_counter()
+        env.import_file(source)
+        loaded = time.perf_counter() - start
+
+    finally:
+        os.unlink(source)
+
+    comp = compiler.Compiler(env)
+
+    start = time.perf_counter()
+    assembly = comp.get_assembly()
+    elapsed = time.perf_counter() - start
+
+    print("%-10s %8d %10.3f %12.3f %10d" % (name, n, loaded, elapsed, assembly.count("\n")))
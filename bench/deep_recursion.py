@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+#
+# Benchmark: deep non-tail recursion
+#
+# Builds and walks lists with the non tail recursive range and map from
+# tests/common.lsp. The bytecode vm keeps its own stack, the other backends
+# recurse in python and give up at the interpreter's recursion limit.
+#
+
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import environment
+from lisp import LispError
+
+
+SIZES = [ 1000, 10000, 100000, 1000000 ]
+
+BACKENDS = [ "tree", "closure", "bytecode" ]
+
+WORKLOADS = [
+        ("range", "(length (range 0 %d))"),
+        ("map", "(length (map inc (range 0 %d)))"),
+    ]
+
+
+print("%-8s %10s %s" % ("workload", "n", "".join("%12s" % b for b in BACKENDS)))
+
+for name, expr in WORKLOADS:
+    for n in SIZES:
+        results = []
+        for backend in BACKENDS:
+            env = environment.Environment(backend=backend)
+            env.import_file(os.path.join(ROOT, "tests", "common.lsp"))
+
+            start = time.perf_counter()
+            try:
+                env.interpret_single_line(expr % (n))
+                results.append("%11.3fs" % (time.perf_counter() - start))
+            except (LispError, RecursionError):
+                results.append("%12s" % "too deep")
+
+        print("%-8s %10d %s" % (name, n, "".join(results)))
+
+
+# the depth limit of the vm is configurable
+env = environment.Environment(backend="bytecode", max_depth=50000)
+env.import_file(os.path.join(ROOT, "tests", "common.lsp"))
+try:
+    env.interpret_single_line("(length (range 0 100000))")
+except LispError as e:
+    print("\nmax_depth=50000, range 0 100000: %s" % (e))
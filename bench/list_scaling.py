@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+#
+# Benchmark: map/filter over long lists in the interpreter
+#
+# Runs map and filter from tests/common.lsp over lists of growing length
+# and prints the time per element. With O(1) head/tail/cons the time per
+# element stays flat, a copying list representation makes it grow linearly.
+#
+
+import os
+import sys
+import time
+import threading
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import environment
+
+
+SIZES = [ 12500, 25000, 50000, 100000 ]
+
+WORKLOADS = [
+        ("map", "(length (map inc L))"),
+        ("filter", "(length (filter even L))"),
+    ]
+
+
+def run():
+    env = environment.Environment()
+    env.import_file(os.path.join(ROOT, "tests", "common.lsp"))
+
+    print("%-8s %10s %10s %12s" % ("workload", "n", "time [s]", "per elem [us]"))
+    for name, expr in WORKLOADS:
+        for n in SIZES:
+            env.interpret_single_line("(set L (range 0 %d))" % (n))
+
+            start = time.perf_counter()
+            result = env.interpret_single_line(expr)
+            elapsed = time.perf_counter() - start
+
+            print("%-8s %10d %10.3f %12.2f" % (name, n, elapsed, 1e6 * elapsed / n))
+
+
+# map and range are not tail recursive, so give the interpreter enough room
+sys.setrecursionlimit(100 * max(SIZES))
+threading.stack_size(1024 * 1024 * 1024)
+
+thread = threading.Thread(target=run)
+thread.start()
+thread.join()
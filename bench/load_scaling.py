@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+#
+# Benchmark: loading large generated sources
+#
+# Writes files with a growing number of top-level forms and measures the
+# time and peak memory of Environment.import_file. All forms assign the
+# same symbol, so a streaming loader needs constant memory.
+#
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import environment
+
+
+SIZES = [ 25000, 50000, 100000, 200000 ]
+
+
+print("%10s %10s %14s %12s" % ("forms", "time [s]", "per form [us]", "peak [KiB]"))
+
+for n in SIZES:
+    with tempfile.NamedTemporaryFile("w", suffix=".lsp", delete=False) as f:
+        for i in range(n):
+            f.write("(set x '(%d \"item\" #t))\n" % (i))
+        source = f.name
+
+    try:
+        env = environment.Environment()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        env.import_file(source)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    finally:
+        os.unlink(source)
+
+    print("%10d %10.3f %14.2f %12d" % (n, elapsed, 1e6 * elapsed / n, peak // 1024))
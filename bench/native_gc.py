@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+#
+# Benchmark: allocation heavy native executables
+#
+# Compiles tests/test-range, test-map and test-filter scaled up 1000x and
+# repeated, so that most of the run time is spent allocating and collecting.
+# Needs nasm and ld like `lisp -c`.
+#
+# Usage: native_gc.py [lisp-script]
+#
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+RUNS = 5
+REPEAT = 1000
+
+WORKLOADS = [
+        ("range", "(range 3 5003)"),
+        ("map", "(map (lambda (x) (* x x)) (range 0 6000))"),
+        ("filter", "(filter even (range 3 7003))"),
+    ]
+
+
+lisp = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "lisp")
+common = os.path.join(ROOT, "tests", "common.lsp")
+runtime = os.path.join(ROOT, "runtime")
+
+print("%-8s %10s %10s" % ("workload", "min [s]", "median [s]"))
+
+with tempfile.TemporaryDirectory() as tmp:
+    for name, expr in WORKLOADS:
+        source = os.path.join(tmp, name + ".lsp")
+        binary = os.path.join(tmp, name)
+
+        with open(source, "w") as f:
+            f.write("(defun work () %s)\n" % (expr))
+            f.write("(defun rep (n) (if (lt n 1) 0 (rep (- n (if (work) 1 1)))))\n")
+            f.write("(defun main () (rep %d))\n" % (REPEAT))
+
+        result = subprocess.run([ sys.executable, lisp, "-c", "-r", runtime,
+                                  "-o", binary, source, common ],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            sys.exit("%s: %s" % (name, result.stdout.decode("utf8").strip()))
+
+        times = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            subprocess.run([ binary ], check=True)
+            times.append(time.perf_counter() - start)
+
+        times.sort()
+        print("%-8s %10.3f %10.3f" % (name, times[0], times[len(times) // 2]))
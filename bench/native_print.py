@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+#
+# Benchmark: output of native executables
+#
+# Compiles programs printing long lists and strings and measures run time,
+# throughput and, if strace is installed, the number of write syscalls.
+# stdout is a pipe, so the output is fully buffered. Needs nasm and ld
+# like `lisp -c`.
+#
+# Usage: native_print.py [lisp-script]
+#
+
+import os
+import re
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+RUNS = 5
+
+WORKLOADS = [
+        ("list", "(println (range 0 10000))"),
+        ("strings", "(println (map (lambda (x) \"item\") (range 0 10000)))"),
+    ]
+
+
+def count_writes(binary):
+    result = subprocess.run([ "strace", "-c", "-e", "trace=write", binary ],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    m = re.search(r"(\d+)\s+(?:\d+\s+)?write", result.stderr.decode("utf8"))
+    return int(m.group(1)) if m else 0
+
+
+lisp = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "lisp")
+common = os.path.join(ROOT, "tests", "common.lsp")
+runtime = os.path.join(ROOT, "runtime")
+strace = shutil.which("strace") is not None
+
+print("%-8s %10s %12s %10s" % ("workload", "time [s]", "MiB/s", "writes"))
+
+with tempfile.TemporaryDirectory() as tmp:
+    for name, expr in WORKLOADS:
+        source = os.path.join(tmp, name + ".lsp")
+        binary = os.path.join(tmp, name)
+
+        with open(source, "w") as f:
+            f.write("(defun main () (if %s 0 0))\n" % (expr))
+
+        result = subprocess.run([ sys.executable, lisp, "-c", "-r", runtime,
+                                  "-o", binary, source, common ],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            sys.exit("%s: %s" % (name, result.stdout.decode("utf8").strip()))
+
+        times = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            output = subprocess.run([ binary ], stdout=subprocess.PIPE,
+                                    check=True).stdout
+            times.append(time.perf_counter() - start)
+
+        t = min(times)
+        writes = "%10d" % (count_writes(binary)) if strace else "%10s" % "-"
+        print("%-8s %10.3f %12.2f %s" % (name, t, len(output) / t / 2**20, writes))
@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+#
+# Benchmark: static instruction count of the peephole optimizer
+#
+# Compiles every tests/test-*.lsp program with and without optimization
+# (lisp -O) and counts the generated instructions, not counting labels,
+# comments and global directives.
+#
+# Usage: peephole.py
+#
+
+import os
+import sys
+import glob
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import environment
+import compiler
+import asm
+
+
+def count(source, optimize):
+    env = environment.Environment()
+    env.import_file(source)
+    env.import_file(os.path.join(ROOT, "tests", "common.lsp"))
+
+    comp = compiler.Compiler(env)
+    comp.set_optimize(optimize)
+    comp.compile_program()
+
+    return sum(asm.count_instructions(c.code) for c in comp.compiled_lambda.values())
+
+
+print("%-20s %10s %10s %8s" % ("test", "plain", "-O", "saved"))
+
+total = [ 0, 0 ]
+for source in sorted(glob.glob(os.path.join(ROOT, "tests", "test-*.lsp"))):
+    plain, optimized = count(source, False), count(source, True)
+    total[0] += plain
+    total[1] += optimized
+
+    print("%-20s %10d %10d %7.1f%%" % (os.path.basename(source), plain, optimized,
+                                       100 * (plain - optimized) / plain))
+
+print("%-20s %10d %10d %7.1f%%" % ("total", total[0], total[1],
+                                   100 * (total[0] - total[1]) / total[0]))
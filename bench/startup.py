@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+#
+# Benchmark: startup time of `lisp -p` on a trivial file
+#
+# Usage: startup.py [lisp-script]
+#
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+RUNS = 20
+
+
+lisp = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "lisp")
+
+with tempfile.NamedTemporaryFile("w", suffix=".lsp", delete=False) as f:
+    f.write("(defun main () 0)\n")
+    source = f.name
+
+try:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([ sys.executable, lisp, "-p", source ],
+                       stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+
+finally:
+    os.unlink(source)
+
+times.sort()
+print("lisp -p: min %.1f ms, median %.1f ms, max %.1f ms (%d runs)" %
+        (1000 * times[0], 1000 * times[len(times) // 2], 1000 * times[-1], RUNS))
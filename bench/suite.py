@@ -0,0 +1,195 @@
+#!/usr/bin/python3
+#
+# Benchmark: the lisp workloads in bench/suite on all backends
+#
+# Every workload defines (work n). It runs with tests/common.lsp through
+# Environment, in a process of its own for each interpreter backend, and
+# as executable built by Compiler.build. Wall time, peak RSS and the
+# allocations are written as JSON, so runs of different versions can be
+# compared. Native executables need nasm and ld like `lisp -c`.
+#
+# Usage: suite.py [-s scale] [-o output] [-b backend,...] [workload ...]
+#
+
+import os
+import re
+import gc
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import threading
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import environment
+import compiler
+from lisp import LispError
+
+
+SUITE = os.path.join(ROOT, "bench", "suite")
+COMMON = os.path.join(ROOT, "tests", "common.lsp")
+
+BACKENDS = [ "tree", "closure", "bytecode", "native" ]
+
+# n of each workload at scale 1
+SIZES = {
+        "range": 100000,
+        "map-filter": 100000,
+        "recursion": 10000,
+        "calls": 100000,
+        "closure": 50000,
+        "strings": 50000,
+        "gc": 1000000,
+    }
+
+# memory statistics of executables built with show_stats
+STATS = re.compile(r"^(cells allocated|minor collections|major collections|heap cells): (\d+)$",
+                   re.MULTILINE)
+
+
+def interpret(backend, source, n, output):
+    """ child process: run one workload through Environment """
+    env = environment.Environment(backend=backend)
+    env.import_file(COMMON)
+    env.import_file(source)
+
+    result = {}
+    collections = [ s["collections"] for s in gc.get_stats() ]
+    start = time.perf_counter()
+    try:
+        env.interpret_single_line("(work %d)" % (n))
+        result["time"] = time.perf_counter() - start
+    except (LispError, RecursionError) as e:
+        result["error"] = str(e) or type(e).__name__
+    result["gc_collections"] = [ s["collections"] - c
+                                 for s, c in zip(gc.get_stats(), collections) ]
+
+    with open(output, "w") as f:
+        json.dump(result, f)
+
+
+def wait(command, stderr=None):
+    """ run command, return wall time, its rusage, exit code and stderr """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=stderr)
+    errors = process.stderr.read().decode("utf8") if stderr else ""
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return wall, usage, process.returncode, errors
+
+
+def run_interpreter(backend, name, n, tmp):
+    output = os.path.join(tmp, "result.json")
+    wall, usage, code, _ = wait([ sys.executable, __file__, "--child", backend,
+                                  os.path.join(SUITE, name + ".lsp"), str(n), output ])
+    if code != 0:
+        return { "error": "exit code %d" % (code) }
+
+    with open(output) as f:
+        result = json.load(f)
+    result["wall"] = wall
+    result["max_rss_kib"] = usage.ru_maxrss
+    return result
+
+
+def run_native(name, n, tmp):
+    binary = os.path.join(tmp, name)
+    main = os.path.join(tmp, "main.lsp")
+    with open(main, "w") as f:
+        f.write("(defun main () (if (work %d) 0 0))\n" % (n))
+
+    try:
+        env = environment.Environment()
+        for fn in (os.path.join(SUITE, name + ".lsp"), main, COMMON):
+            env.import_file(fn)
+
+        comp = compiler.Compiler(env)
+        comp.set_runtime(os.path.join(ROOT, "runtime"))
+        comp.set_show_stats(True)
+        comp.build(binary)
+    except LispError as e:
+        return { "error": str(e) }
+
+    wall, usage, code, errors = wait([ binary ], subprocess.PIPE)
+    if code != 0:
+        return { "error": "exit code %d" % (code) }
+
+    result = { "time": wall, "wall": wall, "max_rss_kib": usage.ru_maxrss }
+    for key, value in STATS.findall(errors):
+        result[key.replace(" ", "_")] = int(value)
+    return result
+
+
+def run(args):
+    workloads = args.workloads or sorted(SIZES)
+    backends = args.backends.split(",")
+    results = []
+
+    print("%-12s %10s %s" % ("workload", "n", "".join("%12s" % b for b in backends)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in workloads:
+            n = int(SIZES[name] * args.scale)
+            line = []
+
+            for backend in backends:
+                if backend == "native":
+                    result = run_native(name, n, tmp)
+                else:
+                    result = run_interpreter(backend, name, n, tmp)
+
+                result.update({ "workload": name, "backend": backend, "n": n })
+                results.append(result)
+                line.append("%12s" % ("failed" if "error" in result else
+                                      "%.3fs" % (result["time"])))
+
+            print("%-12s %10d %s" % (name, n, "".join(line)))
+
+    with open(args.output, "w") as f:
+        json.dump({ "scale": args.scale,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": results }, f, indent=2)
+        f.write("\n")
+
+
+if len(sys.argv) > 1 and sys.argv[1] == "--child":
+    # the recursive backends need a deep python stack
+    sys.setrecursionlimit(1000000)
+    threading.stack_size(512 * 1024 * 1024)
+
+    thread = threading.Thread(target=interpret,
+                              args=(sys.argv[2], sys.argv[3], int(sys.argv[4]), sys.argv[5]))
+    thread.start()
+    thread.join()
+    sys.exit(0)
+
+
+parser = argparse.ArgumentParser(description="lisp benchmark suite")
+parser.add_argument("workloads", metavar="workload", nargs="*",
+                    help="workloads to run out of %s, default is all"
+                         % (", ".join(sorted(SIZES))))
+parser.add_argument("-s", dest="scale", type=float, default=1.0,
+                    help="factor for the size of all workloads")
+parser.add_argument("-o", dest="output", default="suite.json",
+                    help="JSON output file, default is suite.json")
+parser.add_argument("-b", dest="backends", default="closure,bytecode,native",
+                    help="comma separated backends out of %s" % (", ".join(BACKENDS)))
+
+args = parser.parse_args()
+
+for name in args.workloads:
+    if name not in SIZES:
+        parser.error("%s: unknown workload" % (name))
+for backend in args.backends.split(","):
+    if backend not in BACKENDS:
+        parser.error("%s: unknown backend" % (backend))
+
+run(args)
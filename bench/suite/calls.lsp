@@ -0,0 +1,15 @@
+; doubly recursive fibonacci, at least n calls and less than 1.7 n
+(defun fib (k)
+  (if (lt k 2)
+    k
+    (+ (fib (- k 1)) (fib (- k 2)))))
+
+; smallest k for which fib(k) makes 2 F(k+1) - 1 >= n calls, with
+; a = F(k+1) and b = F(k+2)
+(defun _fib_size (k a b n)
+  (if (lt (- (+ a a) 1) n)
+    (_fib_size (+ k 1) b (+ a b) n)
+    k))
+
+(defun work (n)
+  (fib (_fib_size 0 1 1 n)))
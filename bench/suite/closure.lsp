@@ -0,0 +1,9 @@
+; closures created and called n times, like tests/test-closure-*
+(defun adder (a)
+  (lambda (x) (+ x a)))
+
+(defun compose (f g)
+  (lambda (x) (f (g x))))
+
+(defun work (n)
+  (length (map (lambda (x) ((compose (adder x) (adder 1)) x)) (range 0 n))))
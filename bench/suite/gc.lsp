@@ -0,0 +1,8 @@
+; allocate n cells in short lived lists of 1000
+(defun churn (k)
+  (if (lt k 1)
+    0
+    (churn (- k (if (length (range 0 1000)) 1000 1000)))))
+
+(defun work (n)
+  (churn n))
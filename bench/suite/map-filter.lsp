@@ -0,0 +1,3 @@
+; map and filter over a list of n numbers
+(defun work (n)
+  (length (map (lambda (x) (* x x)) (filter odd (range 0 n)))))
@@ -0,0 +1,3 @@
+; build a list of n numbers with range and walk it
+(defun work (n)
+  (length (range 0 n)))
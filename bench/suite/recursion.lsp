@@ -0,0 +1,8 @@
+; non tail recursion n calls deep
+(defun depth (n)
+  (if (lt n 1)
+    0
+    (+ 1 (depth (- n 1)))))
+
+(defun work (n)
+  (depth n))
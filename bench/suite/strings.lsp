@@ -0,0 +1,3 @@
+; print a list of n strings
+(defun work (n)
+  (println (map (lambda (x) "item") (range 0 n))))
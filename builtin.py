@@ -3,7 +3,6 @@
 #
 
 from lisp import *
-import __main__
 
 class BuiltinError(LispError): pass
 
@@ -38,15 +37,11 @@ def builtin_cons(x, L):
     if type(L) != LispList:
         raise BuiltinError('cons: list expected as second parameter')
 
-    return LispList([x] + L)
+    return L.cons(x)
 
 def builtin_list(*L):
     return LispList(L)
 
-def builtin_eval(x):
-    # evaluate in main environment - this is a bit ugly
-    return __main__.env.evaluate(x)
-
 
 # Arithmetic
 #
@@ -124,6 +119,72 @@ def builtin_ge(x, y):
         return LispList()
 
 
+# Vectors
+#
+def builtin_make_vector(n, x):
+    if type(n) != LispInt:
+        raise BuiltinError('make_vector: integer expected as first parameter')
+    if n < 0:
+        raise BuiltinError('make_vector: negative size')
+
+    return LispVector([ x ] * n)
+
+def builtin_vector_ref(v, i):
+    if type(v) != LispVector or type(i) != LispInt:
+        raise BuiltinError('vector_ref: illegal parameter type')
+    if i < 0 or i >= len(v):
+        raise BuiltinError('vector_ref: index out of range')
+
+    return v[i]
+
+def builtin_vector_length(v):
+    if type(v) != LispVector:
+        raise BuiltinError('vector_length: vector expected')
+
+    return LispInt(len(v))
+
+def builtin_vector_to_list(v):
+    if type(v) != LispVector:
+        raise BuiltinError('vector_to_list: vector expected')
+
+    return LispList(v)
+
+def builtin_list_to_vector(L):
+    if type(L) != LispList:
+        raise BuiltinError('list_to_vector: list expected')
+
+    return LispVector(L)
+
+
+# Strings
+#
+def builtin_string_length(s):
+    if type(s) != LispStr:
+        raise BuiltinError('string_length: string expected')
+
+    return LispInt(len(s))
+
+def builtin_string_append(*S):
+    if any(type(s) != LispStr for s in S):
+        raise BuiltinError('string_append: strings expected')
+
+    return LispStr(''.join(S))
+
+def builtin_substring(s, start, end):
+    if type(s) != LispStr or type(start) != LispInt or type(end) != LispInt:
+        raise BuiltinError('substring: illegal parameter type')
+    if not 0 <= start <= end <= len(s):
+        raise BuiltinError('substring: index out of range')
+
+    return LispStr(s[start:end])
+
+def builtin_string_to_list(s):
+    if type(s) != LispStr:
+        raise BuiltinError('string_to_list: string expected')
+
+    return LispList([ LispStr(c) for c in s ])
+
+
 # Bool
 #
 def builtin_not(x):
@@ -158,7 +219,7 @@ def builtin_println(*param):
     return LispList()
 
 
-TABLE = {
+TABLE = SymbolTable({
         LispSym('head') : LispBuiltin(builtin_head, 1),
         LispSym('tail') : LispBuiltin(builtin_tail, 1),
         LispSym('print') : LispBuiltin(builtin_print, None),
@@ -166,7 +227,6 @@ TABLE = {
         LispSym('cons') : LispBuiltin(builtin_cons, 2),
         LispSym('atom') : LispBuiltin(builtin_atom, 1),
         LispSym('list') : LispBuiltin(builtin_list),
-        LispSym('eval') : LispBuiltin(builtin_eval, 1),
         LispSym('eq') : LispBuiltin(builtin_eq, 2),
         LispSym('lt') : LispBuiltin(builtin_lt, 2),
         LispSym('le') : LispBuiltin(builtin_le, 2),
@@ -180,5 +240,14 @@ TABLE = {
         LispSym('not') : LispBuiltin(builtin_not, 1),
         LispSym('and') : LispBuiltin(builtin_and, 2),
         LispSym('or') : LispBuiltin(builtin_or, 2),
-    }
+        LispSym('make_vector') : LispBuiltin(builtin_make_vector, 2),
+        LispSym('vector_ref') : LispBuiltin(builtin_vector_ref, 2),
+        LispSym('vector_length') : LispBuiltin(builtin_vector_length, 1),
+        LispSym('vector_to_list') : LispBuiltin(builtin_vector_to_list, 1),
+        LispSym('list_to_vector') : LispBuiltin(builtin_list_to_vector, 1),
+        LispSym('string_length') : LispBuiltin(builtin_string_length, 1),
+        LispSym('string_append') : LispBuiltin(builtin_string_append, None),
+        LispSym('substring') : LispBuiltin(builtin_substring, 3),
+        LispSym('string_to_list') : LispBuiltin(builtin_string_to_list, 1),
+    })
 
@@ -0,0 +1,434 @@
+#
+# bytecode compiler and virtual machine
+#
+# Baked lambda bodies are compiled into a small stack machine code. The VM
+# runs all calls on one preallocated stack: a frame consists of the callee's
+# locals (parameter followed by captured values), the saved return state and
+# the operand stack of the callee. Local references ($n) are resolved to
+# fixed offsets from the frame pointer at compile time.
+#
+# The stack grows on demand, so the recursion depth is only limited by
+# memory and the configurable maximal number of frames.
+#
+
+from copy import copy
+
+from lisp import *
+
+
+# opcodes
+CONST       = 0     # push arg
+LOAD        = 1     # push local at frame offset arg
+GLOBAL      = 2     # push value of global symbol with id arg
+CLOSURE     = 3     # push closure arg[0] capturing locals at offsets arg[1]
+LAMBDA      = 4     # push new lambda from expression arg
+JUMP        = 5     # continue at arg
+JUMP_FALSE  = 6     # pop value, continue at arg if it is false
+CALL        = 7     # pop function, call it with arg[0] parameter
+TAILCALL    = 8     # same as CALL, but replaces the current frame
+EVAL        = 9     # pop expression and evaluate it
+TAILEVAL    = 10    # same as EVAL, but replaces the current frame
+SLIDE       = 11    # drop arg values below top of stack
+RET         = 12    # return top of stack to caller
+FAIL        = 13    # raise EvalError with message arg
+
+OPNAMES = [ "CONST", "LOAD", "GLOBAL", "CLOSURE", "LAMBDA", "JUMP",
+            "JUMP_FALSE", "CALL", "TAILCALL", "EVAL", "TAILEVAL", "SLIDE",
+            "RET", "FAIL" ]
+
+
+# saved return state: code, program counter and frame pointer of caller
+FRAME = 3
+
+STACK_SIZE = 64 * 1024
+MAX_DEPTH = 10 * 1000 * 1000
+
+
+
+class Code:
+
+    def __init__(self, nlocals):
+        self.nlocals = nlocals
+        self.size = nlocals + FRAME
+        self.ops = []
+        self.args = []
+
+    def __str__(self):
+        lines = []
+        for pc, (op, arg) in enumerate(zip(self.ops, self.args)):
+            lines.append("%4d  %-10s %s" % (pc, OPNAMES[op],
+                                            "" if arg is None else arg))
+        return '\n'.join(lines)
+
+
+    def emit(self, op, arg=None):
+        self.ops.append(op)
+        self.args.append(arg)
+        return len(self.ops) - 1
+
+    def patch(self, pc, arg):
+        self.args[pc] = arg
+
+    def here(self):
+        return len(self.ops)
+
+    def reserve(self, depth):
+        if depth > self.size:
+            self.size = depth
+
+
+
+class VM:
+
+    def __init__(self, env, max_depth=MAX_DEPTH, size=STACK_SIZE):
+        self.env = env
+        self.symbols = env.symbols
+        self.max_depth = max_depth
+        self.stack = [ None ] * size
+        self.sp = 0
+        self.depth = 0
+
+
+    #
+    # compiler
+    #
+    def code(self, function):
+        compiled = function.compiled
+        if compiled is not None and compiled[0] is self:
+            return compiled[1]
+
+        nlocals = function.argc
+        if type(function) == LispClosure:
+            nlocals += len(function.capture_indices)
+
+        code = Code(nlocals)
+        self.emit_expression(code, function.body, list(range(nlocals)),
+                             nlocals + FRAME, True)
+
+        function.compiled = (self, code)
+        return code
+
+    def compile(self, expr):
+        code = Code(0)
+        self.emit_expression(code, expr, [], FRAME, True)
+        return code
+
+
+    #
+    # emit_expression - compile expression to code
+    #
+    # slots     frame offsets of all visible local bindings, $n refers to
+    #           slots[-n]
+    #
+    # depth     number of stack entries in use in the current frame, the
+    #           value of the expression is pushed at this offset
+    #
+    # tail      True if the expression is the last one in the lambda
+    #
+    def emit_expression(self, code, expr, slots, depth, tail):
+        code.reserve(depth + 1)
+
+        if expr.is_atom():
+            self.emit_atom(code, expr, slots)
+            if tail:
+                code.emit(RET)
+            return
+
+        function = expr.head()
+        parameter = expr.tail()
+
+        if type(function) == LispSym:
+            if function is SYM_QUOTE:
+                if len(parameter) != 1:
+                    code.emit(FAIL, 'quote expects exactly one parameter')
+                    return
+
+                code.emit(CONST, parameter[0])
+                if tail:
+                    code.emit(RET)
+                return
+
+            elif function is SYM_IF:
+                if len(parameter) != 3:
+                    code.emit(FAIL, 'if expects exactly 3 parameters')
+                    return
+
+                self.emit_expression(code, parameter[0], slots, depth, False)
+                jump_false = code.emit(JUMP_FALSE)
+
+                self.emit_expression(code, parameter[1], slots, depth, tail)
+                if not tail:
+                    jump_end = code.emit(JUMP)
+
+                code.patch(jump_false, code.here())
+                self.emit_expression(code, parameter[2], slots, depth, tail)
+                if not tail:
+                    code.patch(jump_end, code.here())
+                return
+
+            elif function is SYM_EVAL:
+                if len(parameter) != 1:
+                    code.emit(FAIL, 'eval expects exactly one parameter')
+                    return
+
+                self.emit_expression(code, parameter[0], slots, depth, False)
+                code.emit(TAILEVAL if tail else EVAL)
+                return
+
+            elif function is SYM_LAMBDA:
+                code.emit(LAMBDA, expr)
+                if tail:
+                    code.emit(RET)
+                return
+
+
+        # evaluate parameter onto the stack
+        for i, p in enumerate(parameter):
+            self.emit_expression(code, p, slots, depth + i, False)
+        argc = len(parameter)
+
+        # a direct lambda binds the parameter where they are on the stack
+        if type(function) == LispLambda:
+            if function.argc != argc:
+                code.emit(FAIL, "%s: expects %d parameter, got %d" %
+                        (function, function.argc, argc))
+                return
+
+            self.emit_expression(code, function.body,
+                                 slots + list(range(depth, depth + argc)),
+                                 depth + argc, tail)
+            if not tail and argc > 0:
+                code.emit(SLIDE, argc)
+            return
+
+        self.emit_expression(code, function, slots, depth + argc, False)
+        code.emit(TAILCALL if tail else CALL, (argc, function))
+
+
+    def emit_atom(self, code, expr, slots):
+        if type(expr) == LispSym:
+            self.symbols.reserve(expr)
+            code.emit(GLOBAL, expr.id)
+
+        elif type(expr) == LispRef:
+            code.emit(LOAD, slots[-int(expr)])
+
+        elif type(expr) == LispClosure:
+            # compile now, so all captured copies share the code
+            self.code(expr)
+            code.emit(CLOSURE, (expr, [ slots[-i] for i in expr.capture_indices ]))
+
+        else:
+            if type(expr) == LispLambda:
+                self.code(expr)
+            code.emit(CONST, expr)
+
+
+    #
+    # virtual machine
+    #
+    def evaluate(self, expr):
+        return self.execute(self.compile(expr))
+
+    def grow(self, size):
+        while len(self.stack) < size:
+            self.stack.extend([ None ] * len(self.stack))
+        return len(self.stack)
+
+    def execute(self, code):
+        S = self.stack
+        slots = self.symbols.slots
+        limit = len(S)
+        max_depth = self.max_depth
+
+        base = self.sp
+        base_depth = self.depth
+        depth = base_depth
+
+        fp = base
+        if fp + code.size > limit:
+            limit = self.grow(fp + code.size)
+
+        S[fp] = None
+        sp = fp + FRAME
+
+        ops = code.ops
+        args = code.args
+        nlocals = code.nlocals
+        pc = 0
+
+        try:
+            while True:
+                op = ops[pc]
+                arg = args[pc]
+                pc += 1
+
+                if op == LOAD:
+                    S[sp] = S[fp + arg]
+                    sp += 1
+
+                elif op == GLOBAL:
+                    value = slots[arg]
+                    if value is None:
+                        raise EvalError("%s: unknown symbol" % (LispSym.by_id[arg]))
+                    S[sp] = value
+                    sp += 1
+
+                elif op == CONST:
+                    S[sp] = arg
+                    sp += 1
+
+                elif op == JUMP_FALSE:
+                    sp -= 1
+                    if not S[sp].is_true():
+                        pc = arg
+
+                elif op == JUMP:
+                    pc = arg
+
+                elif op == RET:
+                    result = S[sp - 1]
+                    frame = fp + nlocals
+                    code = S[frame]
+                    if code is None:
+                        return result
+
+                    pc = S[frame + 1]
+                    sp = fp
+                    fp = S[frame + 2]
+                    S[sp] = result
+                    sp += 1
+                    depth -= 1
+
+                    ops = code.ops
+                    args = code.args
+                    nlocals = code.nlocals
+
+                elif op == CALL or op == TAILCALL or op == EVAL or op == TAILEVAL:
+                    if op == EVAL or op == TAILEVAL:
+                        sp -= 1
+                        callee = self.compile(S[sp])
+                        captured = None
+                        argc = 0
+                        tail = op == TAILEVAL
+
+                    else:
+                        argc, function = arg
+                        tail = op == TAILCALL
+
+                        sp -= 1
+                        evalfun = S[sp]
+
+                        if type(evalfun) == LispBuiltin:
+                            if evalfun.argc is not None and evalfun.argc != argc:
+                                raise EvalError("%s: expects %d parameter, got %d"
+                                        % (function, evalfun.argc, argc))
+
+                            sp -= argc
+                            self.sp = sp + argc
+                            self.depth = depth
+                            try:
+                                result = evalfun.function(*S[sp:sp + argc])
+                            except TypeError:
+                                raise EvalError("%s: illegal number of parameter to builtin function"
+                                        % (function))
+
+                            if not tail:
+                                S[sp] = result
+                                sp += 1
+                                continue
+
+                            # return result directly to our caller
+                            frame = fp + nlocals
+                            code = S[frame]
+                            if code is None:
+                                return result
+
+                            pc = S[frame + 1]
+                            sp = fp
+                            fp = S[frame + 2]
+                            S[sp] = result
+                            sp += 1
+                            depth -= 1
+
+                            ops = code.ops
+                            args = code.args
+                            nlocals = code.nlocals
+                            continue
+
+                        if not isinstance(evalfun, LispLambda):
+                            raise EvalError("%s: not executable" % (evalfun))
+
+                        if evalfun.argc != argc:
+                            raise EvalError("%s: expects %d parameter, got %d" %
+                                    (function, evalfun.argc, argc))
+
+                        compiled = evalfun.compiled
+                        if compiled is not None and compiled[0] is self:
+                            callee = compiled[1]
+                        else:
+                            callee = self.code(evalfun)
+
+                        if type(evalfun) == LispClosure:
+                            captured = evalfun.capture_values
+                        else:
+                            captured = None
+
+                    # the parameter are the first locals of the new frame
+                    if tail:
+                        frame = fp + nlocals
+                        ret_code = S[frame]
+                        ret_pc = S[frame + 1]
+                        ret_fp = S[frame + 2]
+
+                        if argc > 0:
+                            S[fp:fp + argc] = S[sp - argc:sp]
+                    else:
+                        depth += 1
+                        if depth > max_depth:
+                            raise EvalError("maximum recursion depth reached")
+
+                        ret_code = code
+                        ret_pc = pc
+                        ret_fp = fp
+                        fp = sp - argc
+
+                    if fp + callee.size > limit:
+                        limit = self.grow(fp + callee.size)
+
+                    if captured:
+                        S[fp + argc:fp + argc + len(captured)] = captured
+
+                    sp = fp + callee.nlocals
+                    S[sp] = ret_code
+                    S[sp + 1] = ret_pc
+                    S[sp + 2] = ret_fp
+                    sp += FRAME
+
+                    code = callee
+                    ops = code.ops
+                    args = code.args
+                    nlocals = code.nlocals
+                    pc = 0
+
+                elif op == CLOSURE:
+                    closure, offsets = arg
+                    new = copy(closure)
+                    new.capture_values = [ S[fp + i] for i in offsets ]
+                    S[sp] = new
+                    sp += 1
+
+                elif op == SLIDE:
+                    S[sp - 1 - arg] = S[sp - 1]
+                    sp -= arg
+
+                elif op == LAMBDA:
+                    S[sp] = LispLambda(arg)
+                    sp += 1
+
+                elif op == FAIL:
+                    raise EvalError(arg)
+
+        finally:
+            self.sp = base
+            self.depth = base_depth
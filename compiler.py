@@ -3,27 +3,57 @@
 #
 
 import os
+import hashlib
+import tempfile
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 from lisp import *
+import asm
+import simplify
+import memo
+import hashcons
 
 class CompileError(LispError): pass
 
 
+def is_constant(expr):
+    """ can expr be built as constant cells? """
+    if type(expr) in (LispInt, LispStr, LispTrue, LispSym):
+        return True
+    if type(expr) in (LispList, LispVector):
+        return all(is_constant(x) for x in expr)
+    return False
+
+
+# integers in this range are encoded inline as fixnums (see runtime.inc)
+FIXNUM_MIN = -(1 << 58)
+FIXNUM_MAX = (1 << 58) - 1
+
+# initial heap size of compiled programs, the runtime adds segments on demand
+DEFAULT_HEAP_SIZE = 64 * 1024 * 1024
+
+
 
 class Compiler:
 
     def __init__(self, env):
         self.env = env
-        self.target_symbol = "main"
+        self.target_symbol = LispSym("main")
         self.runtime_path = None
         self.leave_asm_file = False
+        self.heap_size = DEFAULT_HEAP_SIZE
+        self.cache_path = None
+        self.optimize = False
+        self.memo_size = memo.DEFAULT_MEMO_SIZE
+        self.show_stats = False
+        self.simplifier = simplify.Simplifier(env.symbols)
 
         self.reset()
 
 
     def set_target_symbol(self, target):
-        self.target_symbol = target
+        self.target_symbol = LispSym(target)
 
     def set_runtime(self, path):
         self.runtime_path = path
@@ -31,13 +61,38 @@ class Compiler:
     def set_leave_asm(self, leave):
         self.leave_asm_file = leave
 
+    def set_heap_size(self, size):
+        self.heap_size = size
+
+    def set_cache(self, path):
+        self.cache_path = path
+
+    def set_optimize(self, optimize):
+        self.optimize = optimize
+
+    def set_memo_size(self, size):
+        # tables of memoized results have a power of 2 slots
+        self.memo_size = 1 << max(size - 1, 0).bit_length()
+
+    def set_show_stats(self, show):
+        self.show_stats = show
+
     def reset(self):
         self.extern = set()
         self.compiled_lambda = {}
         self.lambda_cache = {}
-        self.string_cache = {}
+        self.node_table = hashcons.NodeTable()
+        self.resolved = {}
+        self.const_cache = {}
+        self.constants = []
         self.capture_cache = {}
-        self.counter = 0
+        self.labels = {}
+        self.fast_entry = set()
+        self.memo_tables = {}
+        self.symbol_cache = {}
+        self.unbound_symbols = []
+        self.function_cells = {}
+        self.data_extern = set()
 
 
     def compile_symbol(self, sym):
@@ -46,27 +101,56 @@ class Compiler:
 
         item = self.env.symbols[sym]
 
+        # resolving rewrites the whole body, do it once per closure
         if type(item) == LispClosure:
-            item = item.resolve()
+            closure, resolved = self.resolved.get(sym, (None, None))
+            if closure is not item:
+                resolved = item.resolve()
+                self.resolved[sym] = item, resolved
+            item = resolved
 
         return self.compile_expression(item, sym)
 
 
     def compile_expression(self, expr, name=None):
         if isinstance(expr, LispLambda):
-            # do we already have a label for this?
-            if str(expr) in self.lambda_cache:
-                return self.lambda_cache[str(expr)], expr.argc
+            # functions with a fixed number of parameter get an additional
+            # entry taking them in registers for static calls
+            fast = name is not None and expr.argc is not None \
+                    and expr.argc <= len(LambdaCompiler.ARG_REGS)
+
+            # do we already have a label for this or an equal lambda? one
+            # without the fast entry only does if we don't need it
+            node = self.node_table.number(expr)
+            if (node, True) in self.lambda_cache:
+                return self.lambda_cache[node, True], expr.argc
+            if not fast and (node, False) in self.lambda_cache:
+                return self.lambda_cache[node, False], expr.argc
 
             # invent a label if this is anonymous
             if name is None:
-                label = "__lambda_%s" % (self.get_unique())
+                label = self.get_label("__lambda", self.node_table.digest(expr))
             else:
                 label = name
 
-            # finally enter laber in our cache and compile it
-            self.lambda_cache[str(expr)] = label
-            self.compiled_lambda[label] = LambdaCompiler(self, expr, label)
+            if fast:
+                self.fast_entry.add(label)
+
+            # finally enter label in our cache and compile it
+            self.lambda_cache[node, fast] = label
+            self.compiled_lambda[label] = LambdaCompiler(
+                    self, self.simplifier.simplify_lambda(expr), label)
+
+            return label, expr.argc
+
+        elif type(expr) == LispBuiltin and isinstance(expr.function, memo.Memo):
+            # memoized functions get a wrapper looking up results in a
+            # table first, it is entered before compiling the function
+            # itself, which most likely calls it again
+            label = expr.function.name
+            if label not in self.memo_tables:
+                self.memo_tables[label] = self.get_label("__memo", label), expr.argc
+                self.compiled_lambda[label] = MemoCompiler(self, expr, label)
 
             return label, expr.argc
 
@@ -82,69 +166,175 @@ class Compiler:
 
 
 
-    def get_assembly(self):
-
+    def compile_program(self):
         self.reset()
         self.compile_symbol(self.target_symbol)
 
-        result = ""
+        # symbols in quoted code are bound once everything else is
+        # compiled, their functions may quote more of them
+        while self.unbound_symbols:
+            self.bind_symbol(*self.unbound_symbols.pop())
+
 
-        for label in self.extern:
-            result += "extern\t%s\n" % (label)
-        result += "\n"
+    def get_assembly(self):
+        self.compile_program()
 
+        parts = [ "extern\t%s\n" % (label) for label in sorted(self.extern) ]
+        parts.append("\n")
 
-        result += "section .text\n\n"
+        parts.append("section .text\n\n")
         for c in self.compiled_lambda.values():
-            result += c.text
-            result += "\n\n"
+            parts.append(c.get_text())
+            parts.append("\n\n")
 
-        if self.string_cache or self.capture_cache:
-            result += "section .data\n\n"
+        parts.append(self.get_data())
 
-            for string, label in self.string_cache.items():
-                result += '%s\tdb "%s"\n' % (label, string)
+        return "".join(parts)
 
-            for capture, label in self.capture_cache.items():
-                result += '%s\tdw %s, 0\n' % (label, capture)
 
+    def get_data(self):
+        parts = [ "section .data\n\n" ]
+        parts.append("\tglobal\t__heap_size\n")
+        parts.append("__heap_size\tdq\t%d\n" % (self.heap_size))
+
+        # print memory statistics to stderr on exit
+        parts.append("\tglobal\t__show_stats\n")
+        parts.append("__show_stats\tdq\t%d\n" % (self.show_stats))
+
+        for capture, label in self.capture_cache.items():
+            parts.append("\tglobal\t%s\n" % (label))
+            parts.append('%s\tdw %s, 0\n' % (label, capture))
+
+        # tables of memoized results, header and slots (see runtime/memo.inc)
+        for table, argc in self.memo_tables.values():
+            parts.append("\talign\t8\n")
+            parts.append("\tglobal\t%s\n" % (table))
+            parts.append("%s\tdq\t0, 0, %d, %d, 0, 0\n" % (table, self.memo_size, argc))
+            parts.append("\ttimes %d dq 0\n" % (self.memo_size * (argc + 2)))
+
+        # constant cells, the garbage collector leaves everything between
+        # __const_start and __const_end alone
+        parts.append("\nsection .rodata align=16\n\n")
+        parts.append("\tglobal\t__const_start\n")
+        parts.append("__const_start:\n")
+        parts += self.constants
+        parts.append("\tglobal\t__const_end\n")
+        parts.append("__const_end:\n")
+
+        return "".join(parts)
 
-        return result
+
+    #
+    # get_units - split the compiled program into separately assembled units
+    #
+    # There is one unit per lambda and one for all data. Every unit declares
+    # the labels it uses from other units and the runtime as extern.
+    #
+    def get_units(self):
+        units = []
+
+        for c in self.compiled_lambda.values():
+            defined = { c.label, c.label + ".continue", c.label + ".fast" }
+
+            parts = [ "extern\t%s\n" % (label) for label in sorted(c.extern - defined) ]
+            parts.append("\nsection .text\n\n")
+            parts.append(c.get_text())
+
+            units.append("".join(parts))
+
+        # symbols are bound to functions of other units or the runtime
+        parts = [ "extern\t%s\n" % (label) for label in sorted(self.data_extern) ]
+        parts.append("\n")
+        parts.append(self.get_data())
+        units.append("".join(parts))
+
+        return units
 
 
     def build(self, output):
         runtime_path = os.path.expanduser(self.runtime_path) + "/"
         runtime_file = runtime_path + "runtime.a"
-        asm_file = output + ".asm"
-        obj_file = output + ".o"
 
-        # write assembly file
-        with open(asm_file, "wb") as f:
-            f.write(self.get_assembly().encode('utf8'))
+        self.compile_program()
 
-        # try to compile it
+        if self.leave_asm_file:
+            with open(output + ".asm", "wb") as f:
+                f.write(self.get_assembly().encode('utf8'))
+
+        # objects are cached by their assembly and the runtime definitions
+        # included into it, so only changed units need to be assembled
         try:
-            result = subprocess.run(["nasm",
-                                     "-o", obj_file,
-                                     "-f elf64",
-                                     "-I", runtime_path,
-                                     "-p runtime.inc",
-                                     asm_file], capture_output=True)
+            with open(runtime_path + "runtime.inc", "rb") as f:
+                runtime_version = hashlib.sha256(f.read()).hexdigest()
+        except OSError as e:
+            raise CompileError("can't read runtime: %s" % (e.strerror))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            if self.cache_path is None:
+                cache_path = tmp
+            else:
+                cache_path = os.path.expanduser(self.cache_path)
+                os.makedirs(cache_path, exist_ok=True)
 
-            if result.returncode != 0:
-                raise CompileError("nasm failed: %s" %
-                        (result.stderr.decode('utf8')))
+            objects = []
+            missing = {}
+            for text in self.get_units():
+                key = hashlib.sha256((runtime_version + text).encode('utf8'))
+                obj_file = os.path.join(cache_path, key.hexdigest() + ".o")
 
-        except FileNotFoundError:
-            raise CompileError("nasm not found")
+                objects.append(obj_file)
+                if not os.path.exists(obj_file):
+                    missing[obj_file] = text
+
+            # nasm runs in its own process, so threads are enough to
+            # assemble in parallel
+            with ThreadPoolExecutor() as pool:
+                list(pool.map(lambda item: self.assemble(*item, runtime_path),
+                              missing.items()))
 
+            self.link(output, objects + [ runtime_file ])
+
+
+    def assemble(self, obj_file, text, runtime_path):
+        # assemble next to the cache entry and move it in place when done,
+        # so concurrent builds never see a partial object
+        fd, asm_file = tempfile.mkstemp(suffix=".asm",
+                                        dir=os.path.dirname(obj_file))
+        tmp_file = asm_file[:-4] + ".o"
 
-        # finally try to link it
         try:
-            result = subprocess.run(["ld",
-                                     "-o", output,
-                                     obj_file,
-                                     runtime_file ], capture_output=True)
+            with os.fdopen(fd, "wb") as f:
+                f.write(text.encode('utf8'))
+
+            try:
+                result = subprocess.run(["nasm",
+                                         "-o", tmp_file,
+                                         "-f elf64",
+                                         "-I", runtime_path,
+                                         "-p runtime.inc",
+                                         asm_file], capture_output=True)
+
+                if result.returncode != 0:
+                    raise CompileError("nasm failed: %s" %
+                            (result.stderr.decode('utf8')))
+
+            except FileNotFoundError:
+                raise CompileError("nasm not found")
+
+            os.replace(tmp_file, obj_file)
+
+        finally:
+            for fn in (asm_file, tmp_file):
+                try:
+                    os.unlink(fn)
+                except FileNotFoundError:
+                    pass    # whatever
+
+
+    def link(self, output, objects):
+        try:
+            result = subprocess.run(["ld", "-o", output ] + objects,
+                                    capture_output=True)
 
             if result.returncode != 0:
                 raise CompileError("linker failed: \n%s" %
@@ -153,30 +343,162 @@ class Compiler:
         except FileNotFoundError:
             raise CompileError("ld not found")
 
-        # remove assembler and object file
-        try:
-            if not self.leave_asm_file:
-                os.unlink(asm_file)
-            os.unlink(obj_file)
-        except FileNotFoundError:
-            pass    # whatever
 
 
+    def get_label(self, prefix, key):
+        # labels depend on content only, so they stay the same when
+        # other parts of the program change
+        digest = hashlib.sha1(key.encode('utf8')).hexdigest()
+        label = "%s_%s" % (prefix, digest[:12])
 
-    def get_unique(self):
-        result = "%06d" % self.counter
-        self.counter += 1
+        n = 0
+        while self.labels.get(label, key) != key:
+            n += 1
+            label = "%s_%s_%d" % (prefix, digest[:12], n)
+
+        self.labels[label] = key
+        return label
+
+
+
+    #
+    # get_constant - operand for a constant value
+    #
+    # Integers, strings, symbols and lists or vectors of them are built as
+    # cells in read-only data once, the operand is the tagged address of
+    # the first cell.
+    # Returns the operand and the label it refers to, or None if the value
+    # can't be a constant.
+    #
+    def get_constant(self, expr):
+        if type(expr) == LispSym:
+            return self.get_symbol(expr)
+        if type(expr) == LispInt and FIXNUM_MIN <= expr <= FIXNUM_MAX:
+            return "TAG_FIXNUM | (%d & MASK_ADDR)" % (expr), None
+        if type(expr) == LispTrue:
+            return "TYPE_TRUE << SHIFT_TYPE", None
+        if type(expr) == LispList and len(expr) == 0:
+            return "0", None
+        if type(expr) == LispStr and len(expr) == 0:
+            return "TYPE_STR << SHIFT_TYPE", None
+        if not is_constant(expr):
+            return None
+
+        key = repr(expr)
+        if key in self.const_cache:
+            return self.const_cache[key]
+
+        if type(expr) == LispList:
+            tag = "TYPE_CONS"
+            items = [ self.get_constant(x)[0] for x in expr ]
+        elif type(expr) == LispStr:
+            tag = "TYPE_STR"
+            items = expr.encode('utf8')
+        elif type(expr) == LispVector:
+            tag = "TYPE_VECTOR"
+            items = [ self.get_constant(x)[0] for x in expr ]
+        else:
+            tag = "TYPE_INT"
+            items = [ "%d" % (expr) ]
+
+        label = self.get_label("__const", key)
+
+        text = "\tglobal\t%s\n" % (label)
+        if tag == "TYPE_VECTOR":
+            # one block like the runtime allocates it (see runtime/mem.asm),
+            # the last cell is filled up
+            words = [ "0", "(TYPE_HEADER << SHIFT_TYPE) | %d" % (len(items)) ] + items
+            words += [ "0" ] * (len(words) % 2)
+            text += "%s:\tdq\t%s\n" % (label, ", ".join(words))
+        elif tag == "TYPE_STR":
+            # the same for a string, its characters are filled up with
+            # at least one 0
+            words = len(items) // 8 + 1
+            data = items.ljust(8 * (words + words % 2), b"\0")
+            text += "%s:\tdq\t%d, (TYPE_HEADER << SHIFT_TYPE) | %d\n" % (label, len(items), words)
+            text += "\tdb\t%s\n" % (", ".join(str(b) for b in data))
+        else:
+            cells = [ label ] + [ "%s.%d" % (label, i) for i in range(1, len(items)) ]
+            for i, (cell, item) in enumerate(zip(cells, items)):
+                if tag == "TYPE_INT":
+                    link = "0"
+                elif i + 1 < len(cells):
+                    link = "%s + (%s << SHIFT_TYPE)" % (cells[i + 1], tag)
+                else:
+                    link = "0"
+
+                text += "%s:\tdq\t%s, %s\n" % (cell, item, link)
+
+        self.constants.append(text)
+
+        result = "%s + (%s << SHIFT_TYPE)" % (label, tag), label
+        self.const_cache[key] = result
         return result
 
+    #
+    # get_symbol - operand for a symbol in quoted data
+    #
+    # Every symbol is one cell of its name and its global value, which is
+    # what eval looks up (see runtime/builtin_eval.asm). The cell gets its
+    # value in bind_symbol. The special forms are symbols of the runtime,
+    # quote has a type of its own.
+    #
+    def get_symbol(self, sym):
+        if sym == "quote":
+            return "TYPE_QUOTE << SHIFT_TYPE", None
 
+        if sym in self.symbol_cache:
+            return self.symbol_cache[sym]
 
-    def get_string_label(self, string):
-        if string in self.string_cache:
-            return self.string_cache[string]
+        if sym in ("if", "lambda"):
+            label = "__symbol_%s" % (sym)
+            self.extern.add(label)
+            self.data_extern.add(label)
+        else:
+            label = self.get_label("__symbol", str(sym))
+            self.unbound_symbols.append((sym, label))
+
+        result = "%s + (TYPE_SYMBOL << SHIFT_TYPE)" % (label), label
+        self.symbol_cache[sym] = result
+        return result
+
+
+    def bind_symbol(self, sym, label):
+        name, _ = self.get_constant(LispStr(str(sym)))
+        value = "SYMBOL_UNBOUND"
+
+        item = self.env.symbols.get(sym)
+        if type(item) == LispBuiltin or isinstance(item, LispLambda):
+            # functions are bound to a lambda cell of their code
+            function_label, function_argc = self.compile_symbol(sym)
+            value = self.get_function_cell(function_label, function_argc)
+        elif item is not None:
+            constant = self.get_constant(item)
+            if constant is not None:
+                value = constant[0]
+
+        text = "\tglobal\t%s\n" % (label)
+        text += "%s:\tdq\t%s, %s\n" % (label, name, value)
+        self.constants.append(text)
+
+
+    def get_function_cell(self, function_label, function_argc):
+        if function_label in self.function_cells:
+            return self.function_cells[function_label]
+
+        if function_argc is None:
+            function_argc = "LAMBDA_VARIADIC"
+
+        label = self.get_label("__function", function_label)
+        text = "\tglobal\t%s\n" % (label)
+        text += "%s:\tdq\t%s.continue, %s\n" % (label, function_label, function_argc)
+        self.constants.append(text)
+        self.data_extern.add(function_label + ".continue")
+
+        result = "%s + (TYPE_LAMBDA << SHIFT_TYPE)" % (label)
+        self.function_cells[function_label] = result
+        return result
 
-        label = "__string_%s" % (self.get_unique())
-        self.string_cache[string] = label
-        return label
 
     def get_capture_label(self, capture):
         key = ', '.join([ str(8*i) for i in reversed(capture) ])
@@ -184,7 +506,7 @@ class Compiler:
         if key in self.capture_cache:
             return self.capture_cache[key]
 
-        label = "__capture_%s" % (self.get_unique())
+        label = self.get_label("__capture", key)
         self.capture_cache[key] = label
         return label
 
@@ -195,13 +517,31 @@ class LambdaCompiler:
     REORDER_REGS = [ "rbx", "rcx", "rdx", "rsi", "rdi", "r8",
                      "r9", "r10", "r11", "r12", "r13", "r14" ]
 
+    # parameter registers of the fast entry
+    ARG_REGS = [ "rbx", "rcx", "rdx", "rsi", "rdi", "r8" ]
+
+    # builtins compiled inline for fixnums, other types and overflows are
+    # left to the runtime
+    INLINE_ARITH = { "__builtin_add": "add", "__builtin_sub": "sub",
+                     "__builtin_mul": "imul", "__builtin_div": "div",
+                     "__builtin_mod": "mod" }
+
+    # comparisons compiled inline and the condition they are true for
+    INLINE_COMPARE = { "__builtin_eq": "e", "__builtin_lt": "l",
+                       "__builtin_le": "le", "__builtin_gt": "g",
+                       "__builtin_ge": "ge" }
+
+    NEGATE = { "e": "ne", "l": "ge", "le": "g", "g": "le", "ge": "l" }
+
 
     def __init__(self, compiler, expr, label):
         self.compiler = compiler
 
         self.label = label
         self.counter = 0
-        self.text = ""
+        self.code = []
+        self.slow_code = []
+        self.extern = set()
 
         self.compile(expr)
 
@@ -221,19 +561,58 @@ class LambdaCompiler:
         if type(expr) == LispClosure:
             lambda_bindings += len(expr.capture_indices)
 
+        fast = self.label in self.compiler.fast_entry
+
         # emit function label
-        if not self.label.startswith("_"):
-            self.text += "\tglobal\t%s\n" % (self.label)
-            self.text += "\tglobal\t%s.continue\n" % (self.label)
-        self.text += "%s:\n" % (self.label)
+        self.emit("global", self.label)
+        self.emit("global", "%s.continue" % (self.label))
+        if fast:
+            self.emit("global", "%s.fast" % (self.label))
+        self.emit_label(self.label)
 
         # emit prologue
-        self.text += "\tpop\trax\n"
-        self.text += "\tmov\t[rsp + 8*%d], rax\n" % (lambda_bindings)
-        self.text += ".continue:\n"
+        self.emit("pop", "rax")
+        self.emit("mov", "[rsp + 8*%d]" % (lambda_bindings), "rax")
+
+        # the fast entry gets the return address on top of the stack and
+        # pushes its parameter below it, like the prologue leaves them
+        if fast:
+            if lambda_bindings > 0:
+                self.emit("jmp", ".continue")
+            self.emit_label(".fast")
+            for reg in self.ARG_REGS[:lambda_bindings]:
+                self.emit("push", reg)
 
-        # emit body
+        self.emit_label(".continue")
+
+        # emit body, followed by the runtime calls of inline builtins
         self.emit_expression(lambda_body, lambda_bindings, final=True)
+        self.code += self.slow_code
+
+        if self.compiler.optimize:
+            self.code = asm.optimize(self.code)
+
+
+
+    def get_text(self):
+        return asm.format_code(self.code)
+
+    def emit(self, *instruction):
+        self.code.append(instruction)
+
+    def emit_label(self, name):
+        self.code.append((asm.LABEL, name))
+
+    def emit_comment(self, text):
+        self.code.append((asm.COMMENT, text))
+
+    def add_extern(self, label):
+        self.extern.add(label)
+        self.compiler.extern.add(label)
+
+    def add_reference(self, label):
+        self.extern.add(label)
+        self.extern.add(label + ".continue")
 
 
 
@@ -243,20 +622,20 @@ class LambdaCompiler:
 
         if new <= len(self.REORDER_REGS):
             for i in range(new):
-                self.text += "\tpop\t%s\n" % (self.REORDER_REGS[i])
+                self.emit("pop", self.REORDER_REGS[i])
 
-            self.text += "\tadd\trsp, 8*%d\n" % (old)
+            self.emit("add", "rsp", "8*%d" % (old))
 
             for i in range(new):
-                self.text += "\tpush\t%s\n" % (self.REORDER_REGS[new - i - 1])
+                self.emit("push", self.REORDER_REGS[new - i - 1])
 
         else:
-            self.text += "\tmov\tecx, %d\n" % (new)
-            self.text += "\tlea\trsi, [rsp + 8*%d]\n" % (new - 1)
-            self.text += "\tlea\trdi, [rsp + 8*%d]\n" % (old + new - 1)
-            self.text += "\tstd\n"
-            self.text += "\trep\tmovsq\n"
-            self.text += "\tadd\trsp, 8*%d\n" % (old)
+            self.emit("mov", "ecx", "%d" % (new))
+            self.emit("lea", "rsi", "[rsp + 8*%d]" % (new - 1))
+            self.emit("lea", "rdi", "[rsp + 8*%d]" % (old + new - 1))
+            self.emit("std")
+            self.emit("rep", "movsq")
+            self.emit("add", "rsp", "8*%d" % (old))
 
 
     #
@@ -287,14 +666,11 @@ class LambdaCompiler:
 
         if type(function) == LispSym:
             if function == "if":
-                self.compiler.extern.add("__true")
                 iflabel = ".if_%s_" % self.get_unique()
 
                 # evaluate if-expression
-                #self.text += '\t; evaluate if-condition "%s"\n' % (parameter[0])
-                self.emit_expression(parameter[0], offset=offset)
-                self.text += "\tcall\t__true\n"
-                self.text += "\tjc\t%s\n" % (iflabel + "false")
+                #self.emit_comment('evaluate if-condition "%s"' % (parameter[0]))
+                self.emit_branch(parameter[0], iflabel + "false", offset, False)
 
                 #
                 # now emit true and false branches for our if
@@ -304,32 +680,56 @@ class LambdaCompiler:
                 #
 
                 # true case
-                self.text += "\n"
+                self.emit()
                 self.emit_expression(parameter[1], bindings, offset, final)
                 if not final:
-                    self.text += "\tjmp\t%s\n" % (iflabel + "end")
+                    self.emit("jmp", iflabel + "end")
 
                 # false case
-                self.text += "\n"
-                self.text += "%s:\n" % (iflabel + "false")
+                self.emit()
+                self.emit_label(iflabel + "false")
                 self.emit_expression(parameter[2], bindings, offset, final)
 
                 # add end-label if we aren't  a final expression
                 if not final:
-                    self.text += "\n"
-                    self.text += "%s:\n" % (iflabel + "end")
+                    self.emit()
+                    self.emit_label(iflabel + "end")
                 return
 
             elif function == "eval":
-                self.compiler.extern.add("__eval")
+                self.add_extern("__eval")
                 self.emit_expression(parameter[0], offset=offset)
-                self.text += "\t%s\t__eval\n" % ("jmp" if final else "call")
+                if final:
+                    self.emit_stack_reorder(bindings)
+                    self.emit("jmp", "__eval")
+                else:
+                    self.emit("call", "__eval")
+                    self.emit_stack_reorder(bindings)
                 return
 
             elif function == "quote":
                 self.emit_constant(parameter[0], bindings=bindings,
                                                  offset=offset,
-                                                 final=final)
+                                                 final=final,
+                                                 quoted=True)
+                return
+
+            function_label, function_argc = self.compiler.compile_symbol(function)
+            self.add_reference(function_label)
+            if function_argc is not None and function_argc != len(parameter):
+                raise CompileError("%s: expects %d parameter but got %d"
+                        % (function, function_argc, len(parameter)))
+
+            if function_label in self.compiler.fast_entry:
+                self.emit_fast_call(expr, function_label, bindings, offset, final)
+                return
+
+            if function_label in self.INLINE_ARITH \
+                    or function_label in self.INLINE_COMPARE:
+                self.emit_inline(expr, function_label, offset)
+                self.emit_stack_reorder(bindings)
+                if final:
+                    self.emit("ret")
                 return
 
 
@@ -359,9 +759,10 @@ class LambdaCompiler:
         else:
             # if this is not a local binding we are going to call a function
             # and therefor need a dummy on our stack
-            self.text += "\t; %s\n" % (expr)
+            self.emit_comment(str(expr))
             if type(function) != LispLambda:
-                self.text += "\tpush\trax\t\t\t; dummy\n"
+                self.emit_comment("dummy")
+                self.emit("push", "rax")
                 offset += 1
 
 
@@ -370,9 +771,9 @@ class LambdaCompiler:
         #
         for p in parameter:
             self.emit_expression(p, offset=offset)
-            self.text += "\tpush\trax\n"
+            self.emit("push", "rax")
             offset += 1
-            self.text += "\n"
+            self.emit()
 
 
         #
@@ -384,25 +785,24 @@ class LambdaCompiler:
         #  4) Static Function, a lambda call given by symbol
         #
         if type(function) == LispRef:
-            self.text += "\tmov\trax, [rsp + 8*%d]\n" % \
-                    (offset + int(function) - 1)
+            self.emit("mov", "rax", "[rsp + 8*%d]" % (offset + int(function) - 1))
 
             if final:
                 self.emit_stack_reorder(bindings, len(parameter))
 
             # apply takes number of parameter in rcx register
-            self.text += "\tmov\trcx, %d\n" % (parameter_count)
+            self.emit("mov", "rcx", "%d" % (parameter_count))
 
             if final:
-                self.compiler.extern.add("__apply.continue")
-                self.text += "\tjmp\t__apply.continue\n"
+                self.add_extern("__apply.continue")
+                self.emit("jmp", "__apply.continue")
             else:
-                self.compiler.extern.add("__apply")
-                self.text += "\tcall\t__apply\n"
+                self.add_extern("__apply")
+                self.emit("call", "__apply")
 
                 # remove local bindings
                 if bindings > 0:
-                    self.text += "\tadd\trsp, 8*%d\n" % (bindings)
+                    self.emit("add", "rsp", "8*%d" % (bindings))
 
 
         elif type(function) == LispList:
@@ -411,17 +811,17 @@ class LambdaCompiler:
             if final:
                 self.emit_stack_reorder(bindings, len(parameter))
 
-            self.text += "\tmov\trcx, %d\n" % (parameter_count)
+            self.emit("mov", "rcx", "%d" % (parameter_count))
 
             if final:
-                self.text += "\tjmp\t__apply.continue\n"
-                self.compiler.extern.add("__apply.continue")
+                self.emit("jmp", "__apply.continue")
+                self.add_extern("__apply.continue")
             else:
-                self.text += "\tcall\t__apply\n"
-                self.compiler.extern.add("__apply")
+                self.emit("call", "__apply")
+                self.add_extern("__apply")
                 # remove local bindings
                 if bindings > 0:
-                    self.text += "\tadd\trsp, 8*%d\n" % (bindings)
+                    self.emit("add", "rsp", "8*%d" % (bindings))
 
         elif type(function) == LispLambda:
             if function.argc is None:
@@ -435,26 +835,21 @@ class LambdaCompiler:
                                  final=final)
 
         elif type(function) == LispSym:
-            function_label, function_argc = self.compiler.compile_symbol(function)
-            if function_argc is not None and function_argc != parameter_count:
-                raise CompileError("%s: expects %d parameter but got %d"
-                        % (function, function_argc, parameter_count))
-
             if final:
                 self.emit_stack_reorder(bindings, len(parameter))
 
             # if variadic, inform our function how many parameter it is receiving
             if function_argc is None:
-                self.text += "\tmov\trcx, %d\n" % (parameter_count)
+                self.emit("mov", "rcx", "%d" % (parameter_count))
 
             if final:
-                self.text += "\tjmp\t%s.continue\n" % (function_label)
+                self.emit("jmp", "%s.continue" % (function_label))
             else:
-                self.text += "\tcall\t%s\n" % (function_label)
+                self.emit("call", function_label)
 
                 # remove local bindings
                 if bindings > 0:
-                    self.text += "\tadd\trsp, 8*%d\n" % (bindings)
+                    self.emit("add", "rsp", "8*%d" % (bindings))
 
         else:
             raise CompileError("%s: not executable" % (function))
@@ -462,11 +857,237 @@ class LambdaCompiler:
 
 
 
+    #
+    # emit_fast_call - static call of a function's fast entry
+    #
+    # Parameter are passed in ARG_REGS. They are evaluated in order, but only
+    # those needing code of their own are kept on stack meanwhile, constants
+    # and references are loaded into their register last.
+    #
+    def emit_fast_call(self, expr, label, bindings, offset, final):
+        self.extern.add(label + ".fast")
+
+        if not final:
+            self.emit_comment(str(expr))
+
+        self.emit_arguments(expr[1:], self.ARG_REGS, offset)
+
+        # the return address is on top once our bindings are gone
+        if final:
+            if bindings > 0:
+                self.emit("add", "rsp", "8*%d" % (bindings))
+            self.emit("jmp", "%s.fast" % (label))
+        else:
+            self.emit("call", "%s.fast" % (label))
+
+            # remove local bindings
+            if bindings > 0:
+                self.emit("add", "rsp", "8*%d" % (bindings))
+
+
+    #
+    # emit_arguments - evaluate parameter into registers
+    #
+    # Parameter are evaluated in order, but only those needing code of their
+    # own are kept on stack meanwhile. The last of them stays in rax,
+    # constants and references are loaded into their register at the end.
+    #
+    def emit_arguments(self, parameter, regs, offset):
+        direct = [ self.is_direct(p) for p in parameter ]
+        computed = [ i for i, d in enumerate(direct) if not d ]
+
+        for i in computed:
+            self.emit_expression(parameter[i], offset=offset)
+            if i != computed[-1]:
+                self.emit("push", "rax")
+                offset += 1
+                self.emit()
+
+        if computed:
+            if regs[computed[-1]] != "rax":
+                self.emit("mov", regs[computed[-1]], "rax")
+            for i in reversed(computed[:-1]):
+                self.emit("pop", regs[i])
+                offset -= 1
+
+        for p, d, reg in zip(parameter, direct, regs):
+            if d:
+                self.emit_direct(p, reg, offset)
+
+
+    def is_direct(self, expr):
+        return type(expr) == LispRef or \
+               type(expr) == LispInt and FIXNUM_MIN <= expr <= FIXNUM_MAX
+
+    def emit_direct(self, expr, reg, offset):
+        if type(expr) == LispRef:
+            self.emit_comment(str(expr))
+            self.emit("mov", reg, "[rsp + 8*%d]" % (offset + int(expr) - 1))
+        else:
+            self.emit("mov", reg, "TAG_FIXNUM | (%d & MASK_ADDR)" % (expr))
+
+
+
+    #
+    # emit_branch - jump to label if the truth of expr is when
+    #
+    # (not x) just inverts the condition and inline comparisons branch on
+    # the flags, everything else is tested by __true.
+    #
+    def emit_branch(self, expr, label, offset, when):
+        while self.get_builtin(expr) == "__builtin_not" and len(expr) == 2:
+            expr = expr[1]
+            when = not when
+
+        builtin = self.get_builtin(expr)
+        if builtin in self.INLINE_COMPARE and len(expr) == 3:
+            self.emit_inline(expr, builtin, offset, (label, when))
+            return
+
+        self.add_extern("__true")
+        self.emit_expression(expr, offset=offset)
+        self.emit("call", "__true")
+        self.emit("jnc" if when else "jc", label)
+
+
+    def get_builtin(self, expr):
+        if type(expr) != LispList or len(expr) == 0 or type(expr[0]) != LispSym:
+            return None
+        if expr[0] not in self.compiler.env.symbols:
+            return None
+
+        item = self.compiler.env.symbols[expr[0]]
+        return item.extern if type(item) == LispBuiltin else None
+
+
+    #
+    # emit_inline - inline arithmetic or comparison of two fixnums
+    #
+    # The operands are kept in rax and rbx until all checks passed, the
+    # slow path at the end of the lambda calls the runtime with them. A
+    # comparison given branch=(label, when) jumps to label if its result is
+    # when instead of returning #T or NIL.
+    #
+    def emit_inline(self, expr, builtin, offset, branch=None):
+        label, argc = self.compiler.compile_symbol(expr[0])
+        self.add_reference(label)
+        if argc != len(expr) - 1:
+            raise CompileError("%s: expects %d parameter but got %d"
+                    % (expr[0], argc, len(expr) - 1))
+
+        unique = self.get_unique()
+        slow = ".slow_%s" % (unique)
+        done = ".done_%s" % (unique)
+
+        self.emit_comment(str(expr))
+        self.emit_arguments(expr[1:], [ "rax", "rbx" ], offset)
+
+        # direct constants are known to be fixnums, boxed ones are not
+        for p, reg in zip(expr[1:], [ "rax", "rbx" ]):
+            if not (type(p) == LispInt and self.is_direct(p)):
+                self.emit("mov", "rdx", reg)
+                self.emit("shr", "rdx", "SHIFT_TYPE")
+                self.emit("cmp", "rdx", "TYPE_FIXNUM")
+                self.emit("jne", slow)
+
+        if builtin in self.INLINE_ARITH:
+            self.emit_arith(self.INLINE_ARITH[builtin], slow, unique)
+        else:
+            condition = self.INLINE_COMPARE[builtin]
+            self.emit_compare(builtin)
+
+            if branch:
+                self.emit("j" + (condition if branch[1] else self.NEGATE[condition]),
+                          branch[0])
+            else:
+                self.emit("set" + condition, "al")
+                self.emit("movzx", "eax", "al")
+                self.emit("imul", "eax", "eax", "TYPE_TRUE")
+                self.emit("shl", "rax", "SHIFT_TYPE")
+
+        self.emit_label(done)
+
+        # slow path
+        self.slow_code += [ (),
+                            (asm.LABEL, slow),
+                            ("push", "rax"),
+                            ("push", "rax"),
+                            ("push", "rbx"),
+                            ("call", label) ]
+        if branch:
+            self.add_extern("__true")
+            self.slow_code += [ ("call", "__true"),
+                                ("jnc" if branch[1] else "jc", branch[0]) ]
+        self.slow_code += [ ("jmp", done) ]
+
+
+    def emit_arith(self, operation, slow, unique):
+        if operation in ("add", "sub", "imul"):
+            # calculate with the values shifted to the top, so the overflow
+            # flag tells if the result fits into a fixnum
+            self.emit("mov", "rcx", "rax")
+            self.emit("shl", "rcx", "64 - SHIFT_TYPE")
+            self.emit("mov", "rdx", "rbx")
+            self.emit("shl", "rdx", "64 - SHIFT_TYPE")
+            if operation == "imul":
+                self.emit("sar", "rdx", "64 - SHIFT_TYPE")
+            self.emit(operation, "rcx", "rdx")
+            self.emit("jo", slow)
+            self.emit("shr", "rcx", "64 - SHIFT_TYPE")
+
+        else:
+            # leave division by 0 and -1 to the runtime, any other quotient
+            # fits into a fixnum
+            self.emit("mov", "rcx", "rbx")
+            self.emit("shl", "rcx", "64 - SHIFT_TYPE")
+            self.emit("sar", "rcx", "64 - SHIFT_TYPE")
+            self.emit("lea", "rdx", "[rcx + 1]")
+            self.emit("cmp", "rdx", "1")
+            self.emit("jbe", slow)
+
+            self.emit("shl", "rax", "64 - SHIFT_TYPE")
+            self.emit("sar", "rax", "64 - SHIFT_TYPE")
+            self.emit("cqo")
+            self.emit("idiv", "rcx")
+
+            # round towards negative infinity like floor_div
+            rounded = ".rounded_%s" % (unique)
+            self.emit("test", "rdx", "rdx")
+            self.emit("jz", rounded)
+            self.emit("mov", "rsi", "rdx")
+            self.emit("xor", "rsi", "rcx")
+            self.emit("jns", rounded)
+            if operation == "div":
+                self.emit("dec", "rax")
+            else:
+                self.emit("add", "rdx", "rcx")
+            self.emit_label(rounded)
+
+            self.emit("mov", "rcx", "rax" if operation == "div" else "rdx")
+            self.emit("and", "rcx", "rbp")
+
+        self.emit("mov", "rax", "TAG_FIXNUM")
+        self.emit("or", "rax", "rcx")
+
+
+    def emit_compare(self, builtin):
+        if builtin == "__builtin_eq":
+            self.emit("cmp", "rax", "rbx")
+        else:
+            self.emit("mov", "rcx", "rax")
+            self.emit("shl", "rcx", "64 - SHIFT_TYPE")
+            self.emit("mov", "rdx", "rbx")
+            self.emit("shl", "rdx", "64 - SHIFT_TYPE")
+            self.emit("cmp", "rcx", "rdx")
+
+
+
     def emit_constant(self, expr, bindings=0,
                                   offset=0,
                                   final=False,
                                   save_rax_to_rbx=False,
-                                  rax_zero=False):
+                                  rax_zero=False,
+                                  quoted=False):
 
         #print("[DEBUG] emit_constant: %s" % (expr))
 
@@ -477,20 +1098,21 @@ class LambdaCompiler:
             raise CompileError("internal error - impossible combination of save_rax_to_rbx and final")
 
 
-        if type(expr) == LispSym:
+        # symbols in code stand for their value, quoted ones are data
+        if type(expr) == LispSym and not quoted:
             sym = expr
 
             # hande special symbols
             if sym == "quote":
                 if save_rax_to_rbx:
-                    self.text += "\tmov\trbx, rax\n"
+                    self.emit("mov", "rbx", "rax")
 
-                self.text += "\tmov\tal, TYPE_QUOTE\n"
-                self.text += "\tshl\trax, SHIFT_TYPE\n"
+                self.emit("mov", "al", "TYPE_QUOTE")
+                self.emit("shl", "rax", "SHIFT_TYPE")
 
                 self.emit_stack_reorder(bindings)
                 if final:
-                    self.text += "\tret\n"
+                    self.emit("ret")
                 return
 
             # try to resolv symbol
@@ -499,148 +1121,204 @@ class LambdaCompiler:
             expr = self.compiler.env.symbols[sym]
 
 
-        if type(expr) == LispInt:
+        if type(expr) == LispInt and FIXNUM_MIN <= expr <= FIXNUM_MAX:
+            if save_rax_to_rbx:
+                self.emit("mov", "rbx", "rax")
+
+            self.emit("mov", "rax", "TAG_FIXNUM | (%d & MASK_ADDR)" % (expr))
+
             self.emit_stack_reorder(bindings)
+            if final:
+                self.emit("ret")
+
+        elif type(expr) in (LispInt, LispStr, LispSym) or \
+                type(expr) == LispList and len(expr) > 0 and is_constant(expr) or \
+                type(expr) == LispVector and is_constant(expr):
+            operand, label = self.compiler.get_constant(expr)
+            if label is not None:
+                self.extern.add(label)
+
             if save_rax_to_rbx:
-                self.text += "\tmov\trbx, rax\n"
+                self.emit("mov", "rbx", "rax")
+
+            self.emit("mov", "rax", operand)
 
-            self.text += "\tmov\trax, %d\n" % (expr)
-            self.text += "\t%s\t__mem_int\n" % (action)
-            self.compiler.extern.add("__mem_int")
+            self.emit_stack_reorder(bindings)
+            if final:
+                self.emit("ret")
 
 
 #        elif type(expr) == LispReal:
 #            self.emit_stack_reorder(bindings)
 #            if save_rax_to_rbx:
-#                self.text += "\tpush\trax\n"
-#            self.text += "\tmov\txmm0, %f\n" % (expr)
-#            self.text += "\t%s\t__mem_real\n" % (action)
+#                self.emit("push", "rax")
+#            self.emit("mov", "xmm0", "%f" % (expr))
+#            self.emit(action, "__mem_real")
 #            if save_rax_to_rbx:
-#                self.text += "\tpop\trbx\n"
+#                self.emit("pop", "rbx")
 
         elif type(expr) == LispRef:
             if save_rax_to_rbx:
-                self.text += "\tmov\trbx, rax\n"
+                self.emit("mov", "rbx", "rax")
 
-            self.text += "\tmov\trax, [rsp + 8*%d]\t; %s\n" % \
-                    (offset + int(expr) - 1, expr)
+            self.emit_comment(str(expr))
+            self.emit("mov", "rax", "[rsp + 8*%d]" % (offset + int(expr) - 1))
 
             self.emit_stack_reorder(bindings)
             if final:
-                self.text += "\tret\n"
+                self.emit("ret")
 
         elif type(expr) == LispTrue:
             if save_rax_to_rbx:
-                self.text += "\tmov\trbx, rax\n"
+                self.emit("mov", "rbx", "rax")
 
-            self.text += "\tmov\tal, TYPE_TRUE\n"
-            self.text += "\tshl\trax, SHIFT_TYPE\n"
+            self.emit("mov", "al", "TYPE_TRUE")
+            self.emit("shl", "rax", "SHIFT_TYPE")
 
             self.emit_stack_reorder(bindings)
             if final:
-                self.text += "\tret\n"
-
-        elif type(expr) == LispStr:
-            label = self.compiler.get_string_label(expr)
-
-            self.emit_stack_reorder(bindings)
-            if save_rax_to_rbx:
-                self.text += "\tpush\trax\n"
-
-            self.text += "\tmov\trsi, %s\n" % (label)
-            self.text += "\tmov\trbx, %d\n" % (len(expr))
-            self.text += "\t%s\t__mem_string\n" % (action)
-            self.compiler.extern.add("__mem_string")
-
-            if save_rax_to_rbx:
-                self.text += "\tpop\trbx\n"
+                self.emit("ret")
 
         elif type(expr) == LispBuiltin or isinstance(expr, LispLambda):
-            self.compiler.extern.add("__mem_lambda")
+            self.add_extern("__mem_lambda")
             function_label, function_argc = self.compiler.compile_expression(expr, sym)
+            self.add_reference(function_label)
 
             if save_rax_to_rbx:
-                self.text += "\tpush\trax\n"
+                self.emit("push", "rax")
 
-            self.text += "\tlea\trsi, [%s.continue]\n" % (function_label)
+            self.emit("lea", "rsi", "[%s.continue]" % (function_label))
             if function_argc is None:
-                self.text += "\tmov\trbx, LAMBDA_VARIADIC\n"
+                self.emit("mov", "rbx", "LAMBDA_VARIADIC")
             elif function_argc == 0:
-                self.text += "\txor\trbx, rbx\n"
+                self.emit("xor", "rbx", "rbx")
             else:
-                self.text += "\tmov\trbx, %d\n" % (function_argc)
+                self.emit("mov", "rbx", "%d" % (function_argc))
 
             # are we dealing with a closure that actually captured something?
             if type(expr) == LispClosure and expr.capture_indices:
                 # first create a lambda
-                self.text += "\tcall\t__mem_lambda\n"
+                self.emit("call", "__mem_lambda")
 
                 # now let __mem_closure capture stack
                 # please note, that we can not continue to __mem_closure,
                 # because for that we must cleanup our stack... the exact thing
                 # __mem_clousre is supposed to capture ;-)
                 capture_label = self.compiler.get_capture_label(expr.capture_indices)
-                self.text += "\tlea\trbx, [%s]\n" % (capture_label)
-                self.text += "\tcall\t__mem_closure\n"
-                self.compiler.extern.add("__mem_closure")
+                self.extern.add(capture_label)
+                self.emit("lea", "rbx", "[%s]" % (capture_label))
+                self.emit("call", "__mem_closure")
+                self.add_extern("__mem_closure")
 
                 # now we can clean up and go
                 if save_rax_to_rbx:
-                    self.text += "\tpop\trbx\n"
+                    self.emit("pop", "rbx")
                 self.emit_stack_reorder(bindings)
                 if final:
-                    self.text += "\tret\n"
+                    self.emit("ret")
 
             else:
                 if final:
                     self.emit_stack_reorder(bindings)
-                    self.text += "\tjmp\t__mem_lambda\n"
+                    self.emit("jmp", "__mem_lambda")
                 else:
-                    self.text += "\tcall\t__mem_lambda\n"
+                    self.emit("call", "__mem_lambda")
                     if save_rax_to_rbx:
-                        self.text += "\tpop\trbx\n"
+                        self.emit("pop", "rbx")
                     self.emit_stack_reorder(bindings)
 
 
         elif type(expr) == LispList:
             if len(expr) == 0:
                 if save_rax_to_rbx:
-                    self.text += "\tmov\trbx, rax\n"
+                    self.emit("mov", "rbx", "rax")
                 if not rax_zero:
-                    self.text += "\txor\trax, rax\n"
+                    self.emit("xor", "rax", "rax")
 
                 self.emit_stack_reorder(bindings)
                 if final:
-                    self.text += "\tret\n"
+                    self.emit("ret")
 
             else:
-                self.compiler.extern.add("__cons")
+                self.add_extern("__cons")
 
                 if save_rax_to_rbx:
-                    self.text += "\tpush\trax\n"
+                    self.emit("push", "rax")
                     offset += 1
 
                 if not rax_zero:
-                    self.text += "\txor\trax, rax\n"
+                    self.emit("xor", "rax", "rax")
                     rax_zero = True
 
                 # we build our list in reverse with a series of __cons calls
                 for item in reversed(expr[1:]):
-                    self.emit_constant(item, offset=offset, save_rax_to_rbx=True, rax_zero=rax_zero)
-                    self.text += "\tcall\t__cons\n"
+                    self.emit_constant(item, offset=offset, save_rax_to_rbx=True,
+                                       rax_zero=rax_zero, quoted=True)
+                    self.emit("call", "__cons")
                     rax_zero = False
 
                 # now do our last cons
-                self.emit_constant(expr[0], offset=offset, save_rax_to_rbx=True, rax_zero=rax_zero)
+                self.emit_constant(expr[0], offset=offset, save_rax_to_rbx=True,
+                                   rax_zero=rax_zero, quoted=True)
                 if final:
                     self.emit_stack_reorder(bindings)
-                    self.text += "\tjmp\t__cons\n"
+                    self.emit("jmp", "__cons")
                 else:
-                    self.text += "\tcall\t__cons\n"
+                    self.emit("call", "__cons")
                     # recover rbx from stack before removing all local bindings
                     if save_rax_to_rbx:
-                        self.text += "\tpop\trbx\n"
+                        self.emit("pop", "rbx")
                     self.emit_stack_reorder(bindings)
 
         else:
             raise CompileError("can't compile atom: %s" % (expr))
+
+
+
+class MemoCompiler(LambdaCompiler):
+    """
+    Wrapper of a memoized function: looks up its parameter in the table of
+    results (see runtime/memo.asm) and only calls the function on a miss.
+    """
+
+    def compile(self, expr):
+        table, argc = self.compiler.memo_tables[self.label]
+        function, _ = self.compiler.compile_expression(expr.function.function,
+                                                       "%s.memo" % (self.label))
+        self.add_reference(function)
+        self.extern.add(table)
+        self.add_extern("__memo_lookup")
+        self.add_extern("__memo_store")
+
+        self.emit("global", self.label)
+        self.emit("global", "%s.continue" % (self.label))
+        self.emit_label(self.label)
+
+        self.emit("pop", "rax")
+        self.emit("mov", "[rsp + 8*%d]" % (argc), "rax")
+        self.emit_label(".continue")
+
+        self.emit("mov", "rsi", table)
+        self.emit("mov", "rcx", "%d" % (argc))
+        self.emit("call", "__memo_lookup")
+        self.emit("jc", ".miss")
+        self.emit_stack_reorder(argc)
+        self.emit("ret")
+
+        # keep the hash returned by the lookup, the parameter are copied
+        # above it for the call
+        self.emit_label(".miss")
+        self.emit("push", "rax")
+        self.emit("push", "rax")
+        for i in range(argc):
+            self.emit("push", "qword [rsp + 8*%d]" % (argc + 1))
+        self.emit("call", function)
+
+        self.emit("mov", "rsi", table)
+        self.emit("mov", "rcx", "%d" % (argc))
+        self.emit("call", "__memo_store")
+        self.emit_stack_reorder(argc + 1)
+        self.emit("ret")
+
+        if self.compiler.optimize:
+            self.code = asm.optimize(self.code)
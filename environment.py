@@ -4,19 +4,38 @@
 
 import parser
 import builtin
+import precompile
+import bytecode
+import simplify
+import memo
 
 from lisp import *
 
-class EvalError(LispError): pass
-
 
 class Environment:
 
-    def __init__(self, symbols = None):
+    def __init__(self, symbols = None, backend = "closure",
+                       max_depth = bytecode.MAX_DEPTH,
+                       memo_size = memo.DEFAULT_MEMO_SIZE):
         if symbols is None:
             symbols = builtin.TABLE
 
         self.symbols = symbols.copy()
+        self.symbols[SYM_EVAL] = LispBuiltin(self.builtin_eval, 1)
+
+        # functions may still be redefined, don't inline them
+        self.simplifier = simplify.Simplifier(self.symbols, inline=False)
+
+        self.memo_size = memo_size
+        self.memos = []
+
+        self.backend = backend
+        if backend == "closure":
+            self.compiler = precompile.Precompiler(self)
+        elif backend == "bytecode":
+            self.compiler = bytecode.VM(self, max_depth)
+        elif backend != "tree":
+            raise EvalError("%s: unknown backend" % (backend))
 
 
     #
@@ -24,10 +43,8 @@ class Environment:
     #
     def import_file(self, fn):
         with open(fn, "r") as f:
-            lisp_file = parser.file_parser.parse(f.read())
-
-        for item in lisp_file:
-            self.interpret(item)
+            for item in parser.read(f):
+                self.interpret(item)
 
 
     #
@@ -48,29 +65,40 @@ class Environment:
                     raise EvalError("set expects symbol as first parameter")
 
                 value = self.evaluate(parameter[1])
+                if isinstance(value, LispLambda):
+                    self.prepare(value)
 
                 self.symbols[parameter[0]] = value
 
                 return value
 
-            if cmd == "defun":
+            if cmd in ("defun", "defmemo"):
                 if len(parameter) != 3:
-                    raise EvalError("defun expects three parameter")
+                    raise EvalError("%s expects three parameter" % (cmd))
 
                 symbol = parameter[0]
                 lambda_parameter = parameter[1]
                 lambda_body = parameter[2]
 
                 if type(symbol) != LispSym:
-                    raise EvalError("defun expects symbol as first parameter")
+                    raise EvalError("%s expects symbol as first parameter" % (cmd))
                 if type(lambda_parameter) != LispList:
-                    raise EvalError("defun expects list of symbols as second parameter")
+                    raise EvalError("%s expects list of symbols as second parameter"
+                                    % (cmd))
 
                 # construct lambda
                 function = LispList([ LispSym("lambda"),
                                       lambda_parameter,
                                       lambda_body ])
-                value = LispLambda(function)
+                value = self.simplifier.simplify_lambda(LispLambda(function))
+                self.prepare(value)
+
+                # results of memoized functions are cached by a builtin
+                if cmd == "defmemo":
+                    function = memo.Memo(self, symbol, value, self.memo_size)
+                    self.memos.append(function)
+                    value = LispBuiltin(function, value.argc)
+
                 self.symbols[symbol] = value
 
                 return value
@@ -86,8 +114,24 @@ class Environment:
 
 
 
+    #
+    # evaluate
+    #
+    def prepare(self, function):
+        if self.backend != "tree":
+            self.compiler.code(function)
+
+    def evaluate(self, expr):
+        if self.backend != "tree":
+            return self.compiler.evaluate(expr)
+
+        return self.evaluate_tree(expr)
+
+    def builtin_eval(self, expr):
+        """ eval as a value, evaluates in the global environment """
+        return self.evaluate(expr)
 
-    def evaluate(self, expr, stack = None, bindings = 0):
+    def evaluate_tree(self, expr, stack = None, bindings = 0):
         if stack is None:
             stack = []
 
@@ -96,8 +140,9 @@ class Environment:
 
             if expr.is_atom():
                 if type(expr) == LispSym:
-                    if expr in self.symbols:
-                        return self.symbols[expr]
+                    value = self.symbols.get(expr)
+                    if value is not None:
+                        return value
                     raise EvalError("%s: unknown symbol" % (expr))
 
                 if type(expr) == LispRef:
@@ -116,35 +161,35 @@ class Environment:
             parameter = expr.tail()
 
             if type(function) == LispSym:
-                if   function == 'quote':
+                if   function is SYM_QUOTE:
                     if len(parameter) != 1:
                         raise EvalError('quote expects exactly one parameter')
 
                     return parameter[0]
 
-                elif function == 'if':
+                elif function is SYM_IF:
                     if len(parameter) != 3:
                         raise EvalError('if expects exactly 3 parameters')
 
-                    if self.evaluate(parameter[0], stack).is_true():
+                    if self.evaluate_tree(parameter[0], stack).is_true():
                         expr = parameter[1]
                     else:
                         expr = parameter[2]
                     continue
 
-                elif function == 'eval':
+                elif function is SYM_EVAL:
                     if len(parameter) != 1:
                         raise EvalError('eval expects exactly one parameter')
 
-                    expr = self.evaluate(parameter[0], stack)
+                    expr = self.evaluate_tree(parameter[0], stack)
                     continue
 
-                elif function == 'lambda':
+                elif function is SYM_LAMBDA:
                     return LispLambda(expr)
 
 
-            evalpar = [ self.evaluate(p, stack) for p in parameter ]
-            evalfun = self.evaluate(function, stack)
+            evalpar = [ self.evaluate_tree(p, stack) for p in parameter ]
+            evalfun = self.evaluate_tree(function, stack)
 
             if type(evalfun) == LispBuiltin:
                 if evalfun.argc is not None and evalfun.argc != len(evalpar):
@@ -167,14 +212,15 @@ class Environment:
                 # check if we are executing an explicit lisp-lambda instead of an
                 # indirect one via symbol or call result. In case of a direct
                 # lambda, we are not allowed to clear current bindings, because
-                # it's body might still refer to them.
-                if type(function) != LispLambda and bindings > 0:
-                    stack = stack[:-bindings]
-                    bindings = 0
-
-                # add evaluated parameters to stack as new bindings
-                stack = stack + evalpar
-                bindings += len(evalpar)
+                # it's body might still refer to them. An indirect lambda only
+                # refers to its own parameter (and captured values), so it
+                # gets a fresh stack instead of a copy of ours.
+                if type(function) == LispLambda:
+                    stack = stack + evalpar
+                    bindings += len(evalpar)
+                else:
+                    stack = evalpar
+                    bindings = len(evalpar)
 
                 # if we execute a closure, add captured values to stack
                 if type(evalfun) == LispClosure:
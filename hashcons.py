@@ -0,0 +1,105 @@
+#
+# hash-consing of baked expressions
+#
+# Every structurally different expression gets a node number, equal ones
+# share it. Parameter are LispRefs after baking, so lambdas only differing
+# in the names of their parameter are equal as well. Numbers and digests
+# are memoized, each subexpression is visited once.
+#
+
+import hashlib
+
+from lisp import *
+
+
+# atoms are equal if their type and value are, LispTrue has no value
+ATOMS = { LispInt, LispReal, LispStr, LispSym, LispRef }
+
+
+class NodeTable:
+    """
+    Expressions are kept alive by the table, so their ids stay unique while
+    they are remembered.
+    """
+
+    def __init__(self):
+        self.nodes = {}         # structure -> node number
+        self.structure = []     # node number -> structure
+        self.known = {}         # id(expr) -> (expr, node number)
+        self.digests = {}       # node number -> digest
+
+
+    def number(self, expr):
+        """ node number of expr, equal for structurally equal expressions """
+        t = type(expr)
+        if t in ATOMS:
+            key = (t, expr)
+            n = self.nodes.get(key)
+            return self.add(key) if n is None else n
+
+        entry = self.known.get(id(expr))
+        if entry is not None:
+            return entry[1]
+
+        if t in (LispList, LispVector):
+            key = (t, tuple([ self.number(x) for x in expr ]))
+
+        elif t == LispClosure:
+            if expr.capture_values:
+                capture = ("values", tuple([ self.number(x) for x in expr.capture_values ]))
+            else:
+                capture = ("indices", tuple(expr.capture_indices))
+            key = (LispClosure, expr.argc, self.number(expr.body), capture)
+
+        elif t == LispLambda:
+            key = (LispLambda, expr.argc, self.number(expr.body))
+
+        else:
+            # builtins and everything else by identity
+            key = (t, id(expr), str(expr))
+
+        n = self.nodes.get(key)
+        if n is None:
+            n = self.add(key)
+
+        self.known[id(expr)] = (expr, n)
+        return n
+
+
+    def add(self, key):
+        n = len(self.structure)
+        self.nodes[key] = n
+        self.structure.append(key)
+        return n
+
+
+    def digest(self, expr):
+        """ hash of the structure of expr, the same in every program """
+        return self.node_digest(self.number(expr))
+
+
+    def node_digest(self, n):
+        if n in self.digests:
+            return self.digests[n]
+
+        key = self.structure[n]
+        kind = key[0]
+
+        if kind == LispList:
+            text = "(%s)" % (" ".join(self.node_digest(x) for x in key[1]))
+        elif kind == LispVector:
+            text = "#(%s)" % (" ".join(self.node_digest(x) for x in key[1]))
+        elif kind == LispLambda:
+            text = "lambda %d %s" % (key[1], self.node_digest(key[2]))
+        elif kind == LispClosure:
+            capture = key[3][1]
+            if key[3][0] == "values":
+                capture = [ self.node_digest(x) for x in capture ]
+            text = "closure %d %s %s %s" % (key[1], self.node_digest(key[2]), key[3][0],
+                                           " ".join(str(x) for x in capture))
+        else:
+            text = "%s %r" % (kind.__name__, key[-1])
+
+        result = hashlib.sha1(text.encode('utf8')).hexdigest()
+        self.digests[n] = result
+        return result
@@ -4,12 +4,16 @@ class LispError(Exception): pass
 
 class LambdaError(LispError): pass
 
+class EvalError(LispError): pass
+
 
 
 #
 # Classes
 #
 class LispObj:
+    __slots__ = ()
+
     def _bake(self, local, binding=False):
         return self
 
@@ -40,13 +44,42 @@ class LispObj:
 
 
 
-class LispList(list, LispObj):
+class LispList(LispObj):
+    """
+    Immutable list built from shared cons cells: a tail shares all of its
+    cells with the list it was taken from, so head(), tail() and cons()
+    run in constant time.
+    """
+    __slots__ = ('_head', '_tail', '_len')
+
+    def __init__(self, items=()):
+        if type(items) == LispList:
+            self._head = items._head
+            self._tail = items._tail
+            self._len = items._len
+            return
+
+        items = list(items)
+        if not items:
+            self._head = None
+            self._tail = None
+            self._len = 0
+            return
+
+        rest = _EMPTY
+        for x in reversed(items[1:]):
+            rest = rest.cons(x)
+
+        self._head = items[0]
+        self._tail = rest
+        self._len = rest._len + 1
+
     def __str__(self):
         # special case for quote
-        if len(self) == 2 and type(self[0]) == LispSym and self[0] == 'quote':
-            return "'%s" % (str(self[1]))
+        if self._len == 2 and self._head is SYM_QUOTE:
+            return "'%s" % (str(self._tail._head))
         # special case for NIL
-        if len(self) == 0:
+        if self._len == 0:
             return "#NIL"
 
         return '(' + ' '.join(map(repr, self)) + ')'
@@ -55,6 +88,67 @@ class LispList(list, LispObj):
         return str(self)
 
 
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        cell = self
+        while cell._len:
+            yield cell._head
+            cell = cell._tail
+
+    def __reversed__(self):
+        return reversed(list(self))
+
+    def __getitem__(self, index):
+        if type(index) == slice:
+            start, stop, step = index.indices(self._len)
+            if step == 1 and stop == self._len:
+                # suffixes share their cells with us
+                cell = self
+                for _ in range(start):
+                    cell = cell._tail
+                return cell if start > 0 else LispList(self)
+
+            return LispList(list(self)[index])
+
+        if index < 0:
+            index += self._len
+        if index < 0 or index >= self._len:
+            raise IndexError("list index out of range")
+
+        cell = self
+        for _ in range(index):
+            cell = cell._tail
+        return cell._head
+
+    def __eq__(self, other):
+        if type(other) != LispList:
+            return NotImplemented
+        if self._len != other._len:
+            return False
+
+        a, b = self, other
+        while a._len:
+            if a is b:
+                return True
+            if a._head != b._head:
+                return False
+            a, b = a._tail, b._tail
+
+        return True
+
+    __hash__ = None
+
+
+    def cons(self, x):
+        cell = LispList.__new__(LispList)
+        cell._head = x
+        cell._tail = self
+        cell._len = self._len + 1
+        return cell
+
+
     def _bake(self, local, binding=False):
         if self.is_atom():
             return self
@@ -64,17 +158,17 @@ class LispList(list, LispObj):
 
         # handle special cases first: "quote", "if" and "lambda"
         if type(function) == LispSym:
-            if function == "quote":
+            if function is SYM_QUOTE:
                 if len(parameter) != 1:
                     raise LambdaError("quote needs exactly one parameter")
                 return self
-            elif function == "if":
+            elif function is SYM_IF:
                 if len(parameter) != 3:
                     raise LambdaError("if needs exactly three parameter")
 
                 return LispList( [ x._bake(local) for x in self ] )
 
-            elif function == "lambda":
+            elif function is SYM_LAMBDA:
                 if binding:
                     return LispLambda(self, local)
                 else:
@@ -107,25 +201,25 @@ class LispList(list, LispObj):
 
 
     def head(self):
-        if len(self) == 0:
+        if self._len == 0:
             raise LispError("head of empty list is not defined")
 
-        return self[0]
+        return self._head
 
     def tail(self):
-        if len(self) == 0:
+        if self._len == 0:
             raise LispError("tail of empty list is not defined")
 
-        return LispList(self[1:])
+        return self._tail
 
     def is_true(self):
-        return len(self) > 0
+        return self._len > 0
 
     def is_atom(self):
-        return len(self) == 0
+        return self._len == 0
 
     def is_executable(self):
-        if len(self) == 0:
+        if self._len == 0:
             return True
 
         head = self.head()
@@ -136,22 +230,42 @@ class LispList(list, LispObj):
 
 
     def is_head(self, name):
-        if len(self) > 0 and type(self[0]) == LispSym and self[0] == name:
+        if self._len > 0 and self._head is LispSym(name):
             return True
 
         return False
 
 
+_EMPTY = LispList()
+
 
 
 class LispSym(str, LispObj):
+    """
+    Symbols are interned: there is exactly one LispSym per name, which
+    carries a small integer id used to index global slot arrays.
+    """
+    interned = {}
+    by_id = []
+
+    def __new__(cls, name):
+        sym = cls.interned.get(name)
+        if sym is None:
+            sym = str.__new__(cls, name)
+            sym.id = len(cls.by_id)
+            cls.interned[str(name)] = sym
+            cls.by_id.append(sym)
+
+        return sym
+
     def __repr__(self):
         return str(self)
 
     def _resolve_local(self, local):
-        for i,name in enumerate(reversed(local)):
-            if self == name:
-                return LispRef(i+1)
+        # the innermost binding is $1, symbols are interned
+        for i in range(len(local) - 1, -1, -1):
+            if local[i] is self:
+                return LispRef(len(local) - i)
 
         return None
 
@@ -176,6 +290,74 @@ class LispSym(str, LispObj):
 
 
 
+SYM_QUOTE = LispSym("quote")
+SYM_IF = LispSym("if")
+SYM_EVAL = LispSym("eval")
+SYM_LAMBDA = LispSym("lambda")
+
+
+
+class SymbolTable:
+    """
+    Global bindings, kept in a slot array indexed by symbol id. Compiled
+    code holds on to the slot array and reads it directly: it only ever
+    grows in place and None marks an unbound symbol.
+    """
+
+    def __init__(self, items=()):
+        self.slots = []
+        self.order = []
+
+        for sym, value in dict(items).items():
+            self[sym] = value
+
+    def reserve(self, sym):
+        if sym.id >= len(self.slots):
+            self.slots.extend([ None ] * (sym.id + 1 - len(self.slots)))
+
+    def __getitem__(self, sym):
+        if sym.id < len(self.slots):
+            value = self.slots[sym.id]
+            if value is not None:
+                return value
+
+        raise KeyError(sym)
+
+    def __setitem__(self, sym, value):
+        self.reserve(sym)
+        if self.slots[sym.id] is None:
+            self.order.append(sym)
+
+        self.slots[sym.id] = value
+
+    def __contains__(self, sym):
+        return sym.id < len(self.slots) and self.slots[sym.id] is not None
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def __len__(self):
+        return len(self.order)
+
+    def get(self, sym, default=None):
+        if sym.id < len(self.slots):
+            value = self.slots[sym.id]
+            if value is not None:
+                return value
+
+        return default
+
+    def items(self):
+        return [ (sym, self.slots[sym.id]) for sym in self.order ]
+
+    def copy(self):
+        new = SymbolTable()
+        new.slots = list(self.slots)
+        new.order = list(self.order)
+        return new
+
+
+
 class LispRef(int, LispObj):
     def __repr__(self):
         return str(self)
@@ -213,6 +395,44 @@ class LispStr(str, LispObj):
     def is_true(self):
         return len(self) > 0
 
+
+class LispVector(LispObj):
+    """
+    Immutable array of values with constant time indexing. A vector literal
+    #(...) evaluates to itself, its items are not evaluated.
+    """
+    __slots__ = ('_items',)
+
+    def __init__(self, items=()):
+        self._items = tuple(items)
+
+    def __str__(self):
+        return '#(' + ' '.join(map(repr, self._items)) + ')'
+
+    def __repr__(self):
+        return str(self)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __eq__(self, other):
+        if type(other) != LispVector:
+            return NotImplemented
+
+        return self._items == other._items
+
+    __hash__ = None
+
+    def is_executable(self):
+        return False
+
+
 class LispTrue(LispObj):
     def __str__(self):
         return '#T'
@@ -242,6 +462,7 @@ class LispBuiltin(LispObj):
 class LispLambda(LispObj):
 
     def __init__(self, expr=None, local=None):
+        self.compiled = None
         if expr is not None:
             self._load(expr, local)
 
@@ -270,7 +491,7 @@ class LispLambda(LispObj):
                     % (lambda_parameter))
 
         self.argc = len(lambda_parameter)
-        self.body = lambda_body._bake(local + lambda_parameter)
+        self.body = lambda_body._bake(local + list(lambda_parameter))
 
 
     def _rewrite(self, stack):
@@ -295,6 +516,7 @@ class LispLambda(LispObj):
 class LispClosure(LispLambda):
 
     def __init__(self, expr=None, local=None):
+        self.compiled = None
         if expr is not None:
             self._load(expr, local)
 
@@ -322,7 +544,7 @@ class LispClosure(LispLambda):
 
         backrefs = lambda_body._backrefs(local, set(lambda_parameter))
 
-        local = lambda_parameter + [ R[0] for R in backrefs ]
+        local = list(lambda_parameter) + [ R[0] for R in backrefs ]
         self.capture_indices = [ R[1] for R in backrefs ]
         self.capture_values = None
 
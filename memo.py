@@ -0,0 +1,62 @@
+#
+# memoized functions
+#
+# (defmemo name (args) body) binds name to a builtin wrapping the lambda.
+# Results are cached by the structure of the parameter, like eq compares
+# them, in a bounded table dropping the least recently used result first.
+#
+
+from collections import OrderedDict
+
+from lisp import *
+
+
+DEFAULT_MEMO_SIZE = 1024
+
+
+def key(value):
+    """ hashable key, equal for values eq finds equal """
+    if type(value) in (LispList, LispVector):
+        return (type(value),) + tuple(key(x) for x in value)
+    if type(value) in (LispInt, LispReal, LispStr, LispSym):
+        return (type(value), value)
+    if type(value) == LispTrue:
+        return (LispTrue,)
+    return value
+
+
+
+class Memo:
+
+    def __init__(self, env, name, function, capacity=DEFAULT_MEMO_SIZE):
+        self.__name__ = "memo_" + name
+        self.env = env
+        self.name = name
+        self.function = function
+        self.capacity = capacity
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, *parameter):
+        k = key(LispList(parameter))
+
+        if k in self.cache:
+            self.cache.move_to_end(k)
+            self.hits += 1
+            return self.cache[k]
+
+        self.misses += 1
+        result = self.env.evaluate(LispList([ self.function ] +
+                                            [ LispList([ SYM_QUOTE, p ])
+                                              for p in parameter ]))
+
+        self.cache[k] = result
+        if len(self.cache) > self.capacity:
+            self.cache.popitem(last=False)
+
+        return result
+
+    def __str__(self):
+        return "%s: %d hits, %d misses, %d cached" % (self.name, self.hits,
+                                                      self.misses, len(self.cache))
@@ -1,5 +1,4 @@
-import ply.lex as lex
-import ply.yacc as yacc
+import re
 
 from lisp import *
 
@@ -9,119 +8,185 @@ class ParseError(LispError): pass
 #
 # lexer
 #
-tokens = (
-        'LPAR',
-        'RPAR',
-        'QUOTE',
-        'TRUE',
-        'NIL',
-        'SYM',
-        'INT',
-        'STR',
-        )
-
-t_LPAR = r'\('
-t_RPAR = r'\)'
-t_QUOTE = r"'"
-
-t_ignore = ' \t'
-t_ignore_COMMENT = r';.*'
-
-
-def t_SYM(t):
-    r'[a-zA-Z\+\-\*\/_]\w*'
-    t.value = LispSym(t.value)
-    return t
-
-def t_TRUE(t):
-    r'\#(T|t)'
-    t.value = LispTrue()
-    return t
-
-def t_NIL(t):
-    r'\#[Nn][Ii][Ll]'
-    t.value = LispList([])
-    return t
-
-def t_INT(t):
-    r'-?\d+'
-    t.value = LispInt(t.value)
-    return t
-
-def t_STR(t):
-    r'"[^"]*"'
-    t.value = LispStr(t.value[1:-1])
-    return t
-
-def t_newline(t):
-    r'\n+'
-    t.lexer.lineno += len(t.value)
-
-def t_error(t):
-    raise ParseError('illegal character: %s' % (t.value[0]))
+# The alternatives are tried in this order, so e.g. "-1" is a symbol and
+# "#true" is #T followed by the symbol "rue".
+#
+TOKENS = [
+        ('SYM',     r'[a-zA-Z\+\-\*\/_]\w*'),
+        ('TRUE',    r'\#(?:T|t)'),
+        ('NIL',     r'\#[Nn][Ii][Ll]'),
+        ('LVEC',    r'\#\('),
+        ('INT',     r'-?\d+'),
+        ('STR',     r'"[^"]*"'),
+        ('NEWLINE', r'\n+'),
+        ('COMMENT', r';.*'),
+        ('LPAR',    r'\('),
+        ('RPAR',    r'\)'),
+        ('QUOTE',   r"'"),
+        ]
 
+IGNORE = ' \t'
 
-lexer = lex.lex()
+token_re = re.compile('|'.join('(?P<%s>%s)' % T for T in TOKENS))
 
 
 #
-# yacc
+# tokenize - split input into tokens
 #
-
-def p_item_sym(p):
-    'item : SYM'
-    p[0] = p[1]
-
-def p_item_true(p):
-    'item : TRUE'
-    p[0] = p[1]
-
-def p_item_int(p):
-    'item : INT'
-    p[0] = p[1]
-
-def p_item_str(p):
-    'item : STR'
-    p[0] = p[1]
-
-def p_item_list(p):
-    'item : list'
-    p[0] = p[1]
-
-def p_quoted_item(p):
-    'item : QUOTE item'
-    p[0] = LispList([ LispSym('quote'), p[2] ])
-
-def p_sequence_s(p):
-    'sequence : item'
-    p[0] = [ p[1] ]
-
-def p_sequence(p):
-    'sequence : sequence item'
-    p[0] = p[1] + [ p[2] ]
-
-def p_list_empty(p):
-    'list : LPAR RPAR'
-    p[0] = LispList([])
-
-def p_list_nil(p):
-    'list : NIL'
-    p[0] = p[1]
-
-def p_list(p):
-    'list : LPAR sequence RPAR'
-    p[0] = LispList(p[2])
-
-def p_error(p):
-    if p:
-        raise ParseError('illegal syntax: %s' % (p))
-    else:
-        raise ParseError('illegal end of data')
+# The input is an iterable of chunks (e.g. a file object yielding lines).
+# A token may span several chunks: a match that runs up to the end of the
+# buffered data is only taken once more data arrived or the input ended.
+#
+def tokenize(chunks):
+    lineno = 1
+    data = ''
+    pos = 0
+    final = False
+    chunks = iter(chunks)
+
+    while True:
+        if pos == len(data) or not final:
+            # drop consumed data and fetch the next chunk
+            data = data[pos:]
+            pos = 0
+            chunk = next(chunks, None)
+            if chunk is None:
+                final = True
+            else:
+                data += chunk
+
+        while pos < len(data):
+            if data[pos] in IGNORE:
+                pos += 1
+                continue
+
+            m = token_re.match(data, pos)
+            if m is None:
+                # unterminated string or incomplete #NIL, wait for more data
+                if not final and data[pos] in '"#':
+                    break
+                raise ParseError('illegal character in line %d: %s' % (lineno, data[pos]))
+
+            if m.end() == len(data) and not final:
+                break
+
+            kind = m.lastgroup
+            value = m.group()
+            pos = m.end()
+
+            if kind == 'NEWLINE':
+                lineno += len(value)
+            elif kind != 'COMMENT':
+                yield kind, value, lineno
+                if kind == 'STR':
+                    lineno += value.count('\n')
+
+        if final and pos == len(data):
+            return
+
+
+def describe(kind, value):
+    if kind == 'STR':
+        return value
+    return "'%s'" % (value)
 
 
-line_parser = yacc.yacc(optimize=False, debug=False, start = 'item')
-file_parser = yacc.yacc(optimize=False, debug=False, start = 'sequence')
+#
+# read - yield top-level items as soon as they are complete
+#
+# item     : SYM | TRUE | INT | STR | list | vector | QUOTE item
+# sequence : item | sequence item
+# list     : LPAR RPAR | NIL | LPAR sequence RPAR
+# vector   : LVEC RPAR | LVEC sequence RPAR
+#
+# If single is True, the input must consist of exactly one item.
+#
+def read(chunks, single=False):
+    if isinstance(chunks, str):
+        chunks = [ chunks ]
+
+    # open lists, each with its line number, the number of quotes
+    # waiting for its next item and if it is a vector
+    stack = [ [] ]
+    lines = [ None ]
+    quotes = [ 0 ]
+    vectors = [ False ]
+    count = 0
+
+    for kind, value, lineno in tokenize(chunks):
+        if single and count > 0:
+            raise ParseError('illegal syntax in line %d: unexpected %s'
+                    % (lineno, describe(kind, value)))
+
+        if kind in ('LPAR', 'LVEC'):
+            stack.append([])
+            lines.append(lineno)
+            quotes.append(0)
+            vectors.append(kind == 'LVEC')
+            continue
+
+        if kind == 'QUOTE':
+            quotes[-1] += 1
+            continue
+
+        if kind == 'RPAR':
+            if len(stack) == 1 or quotes[-1] > 0:
+                raise ParseError('illegal syntax in line %d: unexpected %s'
+                        % (lineno, describe(kind, value)))
+            quotes.pop()
+            lines.pop()
+            if vectors.pop():
+                item = LispVector(stack.pop())
+            else:
+                item = LispList(stack.pop())
+
+        elif kind == 'SYM':
+            item = LispSym(value)
+        elif kind == 'TRUE':
+            item = LispTrue()
+        elif kind == 'NIL':
+            item = LispList([])
+        elif kind == 'INT':
+            item = LispInt(value)
+        else:
+            item = LispStr(value[1:-1])
+
+        for _ in range(quotes[-1]):
+            item = LispList([ LispSym('quote'), item ])
+        quotes[-1] = 0
+
+        if len(stack) > 1:
+            stack[-1].append(item)
+        else:
+            count += 1
+            yield item
+
+    if len(stack) > 1:
+        raise ParseError('illegal end of data: list opened in line %d is not closed'
+                % (lines[-1]))
+    if quotes[-1] > 0:
+        raise ParseError('illegal end of data: quote without item')
+
+
+class Parser:
+
+    def __init__(self, start):
+        self.start = start
+
+    def parse(self, data):
+        items = list(read(data, single=(self.start == 'item')))
+
+        if not items:
+            raise ParseError('illegal end of data')
+
+        if self.start == 'item':
+            return items[0]
+        return items
+
+
+line_parser = Parser('item')
+file_parser = Parser('sequence')
 
 def load_file(fn):
     with open(fn, 'r') as f:
-        return file_parser.parse(f.read())
+        return list(read(f))
@@ -0,0 +1,217 @@
+#
+# closure compiler
+#
+# Turns baked lambda bodies into trees of python closures. All dispatching
+# on special forms and object types happens once at compile time, the
+# resulting code is cached on the lambda.
+#
+
+from lisp import *
+
+
+#
+# Compiled code is a function taking the stack and returning the value of
+# the expression. Code in tail position may return a tuple (code, stack)
+# instead, which is the call still to be made.
+#
+def run(code, stack):
+    result = code(stack)
+    while type(result) == tuple:
+        code, stack = result
+        result = code(stack)
+
+    return result
+
+
+def fail(msg):
+    def code(stack):
+        raise EvalError(msg)
+    return code
+
+
+
+class Precompiler:
+
+    def __init__(self, env):
+        self.env = env
+        self.symbols = env.symbols
+
+
+    def evaluate(self, expr, stack=None):
+        if stack is None:
+            stack = []
+
+        return run(self.compile(expr, True), stack)
+
+
+    def code(self, function):
+        compiled = function.compiled
+        if compiled is not None and compiled[0] is self:
+            return compiled[1]
+
+        code = self.compile(function.body, True)
+        function.compiled = (self, code)
+        return code
+
+
+
+    def compile(self, expr, tail=False):
+        if expr.is_atom():
+            return self.compile_atom(expr)
+
+        function = expr.head()
+        parameter = expr.tail()
+
+        if type(function) == LispSym:
+            if function is SYM_QUOTE:
+                if len(parameter) != 1:
+                    return fail('quote expects exactly one parameter')
+
+                value = parameter[0]
+                return lambda stack: value
+
+            elif function is SYM_IF:
+                if len(parameter) != 3:
+                    return fail('if expects exactly 3 parameters')
+
+                return self.compile_if(parameter, tail)
+
+            elif function is SYM_EVAL:
+                if len(parameter) != 1:
+                    return fail('eval expects exactly one parameter')
+
+                return self.compile_eval(parameter[0], tail)
+
+            elif function is SYM_LAMBDA:
+                return lambda stack: LispLambda(expr)
+
+        return self.compile_call(function, parameter, tail)
+
+
+    def compile_atom(self, expr):
+        if type(expr) == LispSym:
+            self.symbols.reserve(expr)
+            slots = self.symbols.slots
+            index = expr.id
+
+            def global_ref(stack):
+                value = slots[index]
+                if value is None:
+                    raise EvalError("%s: unknown symbol" % (expr))
+                return value
+
+            return global_ref
+
+        if type(expr) == LispRef:
+            index = -int(expr)
+            return lambda stack: stack[index]
+
+        if type(expr) == LispClosure:
+            # compile now, so all captured copies share the code
+            self.code(expr)
+            return expr.capture
+
+        if type(expr) == LispLambda:
+            self.code(expr)
+
+        return lambda stack: expr
+
+
+    def compile_if(self, parameter, tail):
+        condition = self.compile(parameter[0])
+        true_case = self.compile(parameter[1], tail)
+        false_case = self.compile(parameter[2], tail)
+
+        def if_code(stack):
+            if condition(stack).is_true():
+                return true_case(stack)
+            return false_case(stack)
+
+        return if_code
+
+
+    def compile_eval(self, parameter, tail):
+        argument = self.compile(parameter)
+        compile = self.compile
+
+        if tail:
+            return lambda stack: (compile(argument(stack), True), stack)
+
+        return lambda stack: run(compile(argument(stack), True), stack)
+
+
+    def compile_arguments(self, parameter):
+        arguments = [ self.compile(p) for p in parameter ]
+
+        if len(arguments) == 0:
+            return lambda stack: []
+        if len(arguments) == 1:
+            a, = arguments
+            return lambda stack: [ a(stack) ]
+        if len(arguments) == 2:
+            a, b = arguments
+            return lambda stack: [ a(stack), b(stack) ]
+        if len(arguments) == 3:
+            a, b, c = arguments
+            return lambda stack: [ a(stack), b(stack), c(stack) ]
+
+        return lambda stack: [ a(stack) for a in arguments ]
+
+
+    def compile_call(self, function, parameter, tail):
+        arguments = self.compile_arguments(parameter)
+        argc = len(parameter)
+
+        # a direct lambda is known now and its body may refer to our stack
+        if type(function) == LispLambda:
+            if function.argc != argc:
+                msg = "%s: expects %d parameter, got %d" % \
+                        (function, function.argc, argc)
+
+                def mismatch(stack):
+                    arguments(stack)
+                    raise EvalError(msg)
+
+                return mismatch
+
+            body = self.code(function)
+            if tail:
+                return lambda stack: (body, stack + arguments(stack))
+
+            return lambda stack: run(body, stack + arguments(stack))
+
+
+        evaluate_function = self.compile(function)
+        code = self.code
+
+        def call(stack):
+            evalpar = arguments(stack)
+            evalfun = evaluate_function(stack)
+
+            if type(evalfun) == LispBuiltin:
+                if evalfun.argc is not None and evalfun.argc != argc:
+                    raise EvalError("%s: expects %d parameter, got %d"
+                            % (function, evalfun.argc, argc))
+
+                try:
+                    return evalfun.function(*evalpar)
+                except TypeError:
+                    raise EvalError("%s: illegal number of parameter to builtin function"
+                            % (function))
+
+            if isinstance(evalfun, LispLambda):
+                if evalfun.argc != argc:
+                    raise EvalError("%s: expects %d parameter, got %d" %
+                            (function, evalfun.argc, argc))
+
+                # if we execute a closure, add captured values to stack
+                if type(evalfun) == LispClosure:
+                    evalpar = evalpar + evalfun.capture_values
+
+                if tail:
+                    return (code(evalfun), evalpar)
+                return run(code(evalfun), evalpar)
+
+            raise EvalError("%s: not executable" % (evalfun))
+
+        return call
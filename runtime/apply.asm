@@ -51,14 +51,17 @@ __apply:	pop	rdx
 		je	.closure
 		jmp	.check_lambda
 
-.closure:	mov	rbx, [rax + 8]
-.push:		and	rbx, rbp
-		jz	.closure_done
-		push	qword [rbx]
-		mov	rbx, [rbx + 8]
-		jmp	.push
-
-.closure_done:	mov	rax, [rax]		; load λ
+.closure:	mov	r8, rcx			; push captured values
+		mov	ecx, [rax + 8]		; with a block move
+		lea	rdx, [8*rcx]
+		sub	rsp, rdx
+		lea	rsi, [rax + 16]
+		mov	rdi, rsp
+		cld
+		rep	movsq
+		mov	rcx, r8
+
+		mov	rax, [rax]		; load λ
 		mov	rdx, rax
 		and	rax, rbp
 		jz	__panic_nil
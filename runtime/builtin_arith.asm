@@ -13,9 +13,8 @@ __builtin_add:	pop	rax
 .continue:	call	pop_2_int
 		jc	__panic_type
 
-		mov	rax, [rax]
-		add	rax, [rbx]
-		jc	__panic_overflow
+		add	rax, rbx
+		jo	__panic_overflow
 		jmp	__mem_int
 
 
@@ -28,9 +27,8 @@ __builtin_sub:	pop	rax
 .continue:	call	pop_2_int
 		jc	__panic_type
 
-		mov	rax, [rax]
-		sub	rax, [rbx]
-		jc	__panic_underflow
+		sub	rax, rbx
+		jo	__panic_underflow
 		jmp	__mem_int
 
 
@@ -44,10 +42,8 @@ __builtin_mul:	pop	rax
 .continue:	call	pop_2_int
 		jc	__panic_type
 
-		mov	rax, [rax]
-		mul	qword [rbx]
-		test	rdx, rdx	; overflow check
-		jnz	__panic_overflow
+		imul	rax, rbx
+		jo	__panic_overflow
 		jmp	__mem_int
 
 
@@ -60,9 +56,7 @@ __builtin_div:	pop	rax
 .continue:	call	pop_2_int
 		jc	__panic_type
 
-		xor	rdx, rdx
-		mov	rax, [rax]
-		div	qword [rbx]
+		call	floor_div
 		jmp	__mem_int
 
 
@@ -76,9 +70,7 @@ __builtin_mod:	pop	rax
 .continue:	call	pop_2_int
 		jc	__panic_type
 
-		xor	rdx, rdx
-		mov	rax, [rax]
-		div	qword [rbx]
+		call	floor_div
 		mov	rax, rdx
 		jmp	__mem_int
 
@@ -92,8 +84,7 @@ __builtin_gt:	pop	rax
 
 .continue:	call	pop_2_int
 		jc	return_false
-		mov	rax, [rax]
-		cmp	rax, [rbx]
+		cmp	rax, rbx
 		jg	return_true
 
 return_false:	xor	rax, rax
@@ -113,8 +104,7 @@ __builtin_ge:	pop	rax
 		mov	[rsp + 2*8], rax
 .continue:	call	pop_2_int
 		jc	return_false
-		mov	rax, [rax]
-		cmp	rax, [rbx]
+		cmp	rax, rbx
 		jge	return_true
 		jmp	return_false
 
@@ -128,8 +118,7 @@ __builtin_lt:	pop	rax
 
 .continue:	call	pop_2_int
 		jc	return_false
-		mov	rax, [rax]
-		cmp	rax, [rbx]
+		cmp	rax, rbx
 		jl	return_true
 		jmp	return_false
 
@@ -141,35 +130,87 @@ __builtin_le:	pop	rax
 		mov	[rsp + 2*8], rax
 .continue:	call	pop_2_int
 		jc	return_false
-		mov	rax, [rax]
-		cmp	rax, [rbx]
+		cmp	rax, rbx
 		jle	return_true
 		jmp	return_false
 
 
 
-		global	__type_is_int
+;
+; signed division rounding towards negative infinity
+;
+; input:
+;	RAX	dividend
+;	RBX	divisor
+;
+; output:
+;	RAX	quotient
+;	RDX	remainder, with the sign of the divisor
+;
+; changes: rcx
+;
+floor_div:	cqo
+		idiv	rbx
+		test	rdx, rdx		; exact?
+		jz	.out
+		mov	rcx, rdx		; signs of remainder and
+		xor	rcx, rbx		; divisor differ?
+		jns	.out
+		dec	rax
+		add	rdx, rbx
+.out:		ret
+
+
 
-__type_is_int:	mov	rdx, rax
+;
+; get value of an integer
+;
+; input:
+;	RAX	fixnum or integer cell
+;
+; output:
+;	RAX	integer
+;	CF	set if input is no integer
+;
+; changes: rdx
+;
+		global	__int_value
+
+__int_value:	mov	rdx, rax
 		shr	rdx, SHIFT_TYPE
 		and	dl, BYTEMASK_TYPE
-		cmp	dl, TYPE_INT
+		cmp	dl, TYPE_FIXNUM
+		jne	.boxed
+		shl	rax, 64 - SHIFT_TYPE	; sign extend 59 bit value
+		sar	rax, 64 - SHIFT_TYPE
+		clc
+		ret
+
+.boxed:		cmp	dl, TYPE_INT
 		jne	.errout
 		and	rax, rbp
 		jz	.errout
+		mov	rax, [rax]
 		clc
 		ret
 .errout:	stc
 		ret
 
 
+;
+; pops the two integer parameters of a builtin
+;
+; output:
+;	RAX	value of first parameter
+;	RBX	value of second parameter
+;	CF	set if one of them is no integer
+;
 pop_2_int:	pop	rcx
 		pop	rax
 		pop	rbx
 		push	rcx
-		call	__type_is_int
+		call	__int_value
 		jc	.out
 		xchg	rax, rbx
-		call	__type_is_int
-		jc	.out
+		call	__int_value
 .out:		ret
@@ -12,14 +12,32 @@ __builtin_eq:	pop	rax
 .continue:	pop	rsi
 		pop	rdi
 
-eq:		mov	rdx, rsi
-		shr	rdx, 8
-		or	rdx, rdi
-		shr	rdx, SHIFT_TYPE - 8
+;
+; compare two cells
+;
+; input:
+;	RSI, RDI	cells
+;
+; output:
+;	RAX	true or false
+;
+; changes: rax, rdx, rsi, rdi
+;
+		global	__eq
+
+__eq:
+eq:		mov	rax, rdi		; dh <- type(rdi)
+		shr	rax, SHIFT_TYPE
+		mov	rdx, rsi		; dl <- type(rsi)
+		shr	rdx, SHIFT_TYPE
+		mov	dh, al
 		and	dx, 0x0f0f
 		cmp	dh, dl
 		jne	return_false
 
+		cmp	dl, TYPE_FIXNUM		; before NIL check, 0 has
+		je	cmp_ptr			; no address bits set
+
 		and	rsi, rbp
 		jz	.is_rdi_nil
 		and	rdi, rbp
@@ -41,6 +59,10 @@ eq:		mov	rdx, rsi
 		je	return_true
 		cmp	dl, TYPE_QUOTE
 		je	return_true
+		cmp	dl, TYPE_VECTOR
+		je	cmp_vector
+		cmp	dl, TYPE_SYMBOL		; symbols are unique
+		je	cmp_ptr
 
 		jmp	__panic_type
 
@@ -68,21 +90,41 @@ cmp_cons:	push	rsi
 		test	rax, rax		; false?
 		jz	.out
 
-		mov	rsi, [rsi + 8]
+		mov	rsi, [rsi + 8]		; compare tails
 		mov	rdi, [rdi + 8]
-		and	rsi, rbp
-		jz	.found_rsi_end
-		and	rdi, rbp
-		jz	return_false
-		jmp	cmp_cons
+		jmp	eq
 
-.found_rsi_end:	test	rdi, rbp
-		jnz	return_false
-		; rax is still true from last eq
 .out:		ret
 
 
 
+cmp_vector:	mov	eax, [rsi + 8]		; same length?
+		cmp	eax, [rdi + 8]
+		jne	return_false
+
+		push	rcx			; compare elements from the end
+		mov	ecx, eax
+.element:	test	rcx, rcx
+		jz	.equal
+		push	rsi
+		push	rdi
+		mov	rsi, [rsi + 8 + 8*rcx]
+		mov	rdi, [rdi + 8 + 8*rcx]
+		call	eq
+		pop	rdi
+		pop	rsi
+		test	rax, rax		; false?
+		jz	.out
+		dec	rcx
+		jmp	.element
+
+.equal:		pop	rcx
+		jmp	return_true
+.out:		pop	rcx
+		ret
+
+
+
 cmp_int:	mov	rax, [rsi]
 		cmp	rax, [rdi]
 		je	return_true
@@ -90,24 +132,16 @@ cmp_int:	mov	rax, [rsi]
 
 cmp_real:	jmp	__panic_notyet
 
-cmp_str:	mov	al, [rsi]
-		inc	rsi
-		mov	ah, [rdi]
-		inc	rdi
-
-		cmp	al, ah
+cmp_str:	mov	rax, [rsi]		; same length?
+		cmp	rax, [rdi]
 		jne	return_false
-		test	al, al
-		jz	return_true
-
-.reload_rsi:	test	sil, 0x07
-		jnz	.reload_rdi
-		mov	rsi, [rsi]
-		and	rsi, rbp
-
-.reload_rdi:	test	dil, 0x07
-		jnz	cmp_str
-		mov	rdi, [rdi]
-		and	rdi, rbp
-		jmp	cmp_str
 
+		push	rcx			; compare words of characters,
+		mov	ecx, [rsi + 8]		; they are filled up with 0
+		add	rsi, 16
+		add	rdi, 16
+		cld
+		repe	cmpsq
+		pop	rcx
+		je	return_true
+		jmp	return_false
@@ -1,4 +1,5 @@
 %include "runtime.inc"
+%include "mem.inc"
 %include "panic.inc"
 
 
@@ -7,10 +8,26 @@ extern __builtin_println
 %endif
 
 extern	__apply.continue
+extern	__cons
+extern	__true
 
 
 section .text
 
+;
+; Code to evaluate is made of lists, symbols and constants. Symbols are
+; static cells of their name and their global value: the compiler emits
+; one for every symbol in quoted data, bound to the compiled function or
+; the constant of the same name. The special forms if and lambda are the
+; symbols below, quote is a cell of its own type.
+;
+; Local bindings are kept in an environment, a list of (symbol . value)
+; pairs with the innermost one first. Calls continue to the function, so
+; the evaluated code runs in constant stack space as long as it only
+; recurses in final position.
+;
+
+
 ;
 ; builtin-wrapper for __eval below
 ;
@@ -36,8 +53,25 @@ __builtin_eval:	pop	rax
 ;
 		global	__eval
 
-__eval:
+__eval:		xor	rbx, rbx		; no local bindings
+
+		; fallthrough
+
+;
+; evaluates a cell in an environment
+;
+; input:
+;	RAX	cell to evaluate
+;	RBX	environment
+;
+; output:
+;	RAX	result of evaluation
+;
+; changes: all registers
+;
+eval:
 %ifdef DEBUG
+		push	rbx
 		push	rax
 		push	rax	; dummy
 		push	msg_eval
@@ -45,75 +79,227 @@ __eval:
 		mov	rcx, 2
 		call	__builtin_println
 		pop	rax
+		pop	rbx
 %endif
 
 		mov	rdx, rax
 		shr	rdx, SHIFT_TYPE
 		and	dl, BYTEMASK_TYPE
+		cmp	dl, TYPE_SYMBOL
+		je	eval_symbol
 		test	rax, rbp		; leave type on for return value
 		jz	.out
 		cmp	dl, TYPE_CONS
 		je	eval_cons
-.out:		ret
+.out:		ret				; anything else is constant
 
 
 
-eval_cons:	mov	rbx, rax
-		and	rbx, rbp
-		mov	r8, [rbx]		; r8  = function to execute
-		mov	rdx, r8
-		shr	rdx, SHIFT_TYPE
-		and	dl, BYTEMASK_TYPE
-		cmp	dl, TYPE_QUOTE		; detect quote early
-		je	.handle_quote
+;
+; value of a symbol, the local binding first
+;
+eval_symbol:	mov	rsi, rax
+.local:		and	rbx, rbp
+		jz	.global
+		mov	rdx, [rbx]		; rdx <- (symbol . value)
+		and	rdx, rbp
+		cmp	rsi, [rdx]
+		je	.found
+		mov	rbx, [rbx + 8]
+		jmp	.local
+
+.found:		mov	rax, [rdx + 8]
+		ret
+
+.global:	and	rsi, rbp
+		mov	rax, [rsi + 8]
+		mov	rdx, SYMBOL_UNBOUND
+		cmp	rax, rdx
+		je	__panic_symbol
+		ret
 
-		xor	rcx, rcx		; count parameters in rcx
-.push_params:	mov	rbx, [rbx + 8]		; load next entry in list
-		mov	rdx, rbx		; dl <- type of parameter
+
+
+eval_cons:	mov	rsi, rax
+		and	rsi, rbp
+		mov	rax, [rsi]		; rax <- head of list
+		mov	rdx, rax
 		shr	rdx, SHIFT_TYPE
 		and	dl, BYTEMASK_TYPE
-		and	rbx, rbp		; found end of parameter?
-		jz	.execute
-		cmp	dl, TYPE_CONS		; this must be a list!
-		jne	__panic_type
+		cmp	dl, TYPE_QUOTE
+		je	eval_quote
+		mov	rdx, __symbol_if + (TYPE_SYMBOL << SHIFT_TYPE)
+		cmp	rax, rdx
+		je	eval_if
+		mov	rdx, __symbol_lambda + (TYPE_SYMBOL << SHIFT_TYPE)
+		cmp	rax, rdx
+		je	eval_lambda
 
-		push	rbx
+		xor	rcx, rcx		; anything else is a call:
+		push	rcx			; number of parameter,
+		push	rax			; function,
+		push	rbx			; environment and parameter
+		push	qword [rsi + 8]		; left are kept on stack
+
+.parameter:	mov	rsi, [rsp]		; evaluate next parameter
+		test	rsi, rbp
+		jz	.apply
+		call	list_next
+		mov	[rsp], rsi
+		mov	rax, rdx
+		mov	rbx, [rsp + 8]
+		call	eval
+
+		pop	rsi			; push its value below
+		pop	rbx
+		pop	rdx
+		pop	rcx
+		push	rax
+		inc	rcx
 		push	rcx
-		push	r8
-		mov	rax, [rbx]		; eval [rbx] recursively
-		call	__eval
-		pop	r8
+		push	rdx
+		push	rbx
+		push	rsi
+		jmp	.parameter
+
+.apply:		mov	rax, [rsp + 16]		; evaluate function
+		mov	rbx, [rsp + 8]
+		call	eval
+		add	rsp, 24
 		pop	rcx
+		jmp	__apply.continue
+
+
+
+eval_quote:	mov	rsi, [rsi + 8]		; just return first argument
+		call	list_next
+		mov	rax, rdx
+		ret
+
+
+
+eval_if:	mov	rsi, [rsi + 8]		; rsi <- (condition then else)
+		push	rsi
+		push	rbx
+		call	list_next
+		mov	rax, rdx
+		call	eval
+		call	__true
+		sbb	rcx, rcx		; rcx <- -1 if false
 		pop	rbx
+		pop	rsi
+
+		call	list_next		; skip condition
+		call	list_next
+		test	rcx, rcx
+		jz	.branch
+		call	list_next
+.branch:	mov	rax, rdx		; continue with branch
+		jmp	eval
+
 
-		push	rax			; push result on stack
-		inc	rcx
-		jmp	.push_params
 
-.execute:	mov	rax, r8
-		mov	rdx, r8
+;
+; a lambda is a closure of its parameter, its body and the environment
+;
+eval_lambda:	push	qword [rsi + 8]		; ((parameter) body)
+		push	rbx
+		lea	rsi, [eval_closure]
+		mov	rbx, LAMBDA_VARIADIC	; checked when binding
+		call	__mem_lambda
+		lea	rbx, [lambda_capture]
+		call	__mem_closure
+		add	rsp, 16
+		ret
+
+
+
+;
+; code of a closure made by eval_lambda
+;
+; input:
+;	RCX	number of parameter
+;	stack:	environment, ((parameter) body), pn, ..., p1
+;
+; Binds the parameter and continues to evaluate the body.
+;
+eval_closure:	mov	r11, rcx		; r11 <- number of parameter
+		mov	rsi, [rsp + 8]
+		call	list_next
+		mov	rsi, rdx		; rsi <- parameter symbols
+
+.bind:		test	rcx, rcx
+		jz	.body
+		test	rsi, rbp		; less symbols than parameter?
+		jz	__panic_argc
+		dec	rcx
+		call	list_next		; push (symbol . value) onto
+		mov	rax, rdx		; the environment
+		mov	rbx, [rsp + 16 + 8*rcx]
+		call	__cons
+		mov	rbx, [rsp]
+		call	__cons
+		mov	[rsp], rax
+		jmp	.bind
+
+.body:		test	rsi, rbp		; more symbols than parameter?
+		jnz	__panic_argc
+		pop	rbx			; rbx <- environment
+		pop	rsi
+		lea	rsp, [rsp + 8*r11]	; clear stack
+		call	list_next
+		call	list_next
+		mov	rax, rdx
+		jmp	eval
+
+
+
+;
+; first element and rest of a list
+;
+; input:
+;	RSI	list
+;
+; output:
+;	RDX	its first element
+;	RSI	its rest
+;
+list_next:	mov	rdx, rsi		; this must be a list!
 		shr	rdx, SHIFT_TYPE
 		and	dl, BYTEMASK_TYPE
 		cmp	dl, TYPE_CONS
-		je	.handle_cons
-		cmp	dl, TYPE_LAMBDA
-		je	.apply
-		cmp	dl, TYPE_CLOSURE
-		je	.apply
-		jmp	__panic_type
-
-.handle_quote:	mov	rax, [rbx + 8]		; just return first argument
-		and	rax, rbp
-		mov	rax, [rax]
+		jne	__panic_type
+		and	rsi, rbp
+		mov	rdx, [rsi]
+		mov	rsi, [rsi + 8]
 		ret
 
-.handle_cons:	call	eval_cons
-.apply:		jmp	__apply.continue
-
 
 
 section .data
 
+; stack offsets __mem_closure captures for eval_lambda
+lambda_capture		dw	8, 16, 0
+
 %ifdef DEBUG
 msg_eval		db "eval: ", 0
 %endif
+
+
+;
+; symbols of the special forms, a string block for their name each
+;
+section .rodata align=16
+
+		global	__symbol_if
+__symbol_if:	dq	name_if + (TYPE_STR << SHIFT_TYPE), SYMBOL_UNBOUND
+name_if:	dq	2, (TYPE_HEADER << SHIFT_TYPE) | 1
+		db	"if"
+		align	16, db 0
+
+		global	__symbol_lambda
+__symbol_lambda:
+		dq	name_lambda + (TYPE_STR << SHIFT_TYPE), SYMBOL_UNBOUND
+name_lambda:	dq	6, (TYPE_HEADER << SHIFT_TYPE) | 1
+		db	"lambda"
+		align	16, db 0
@@ -76,6 +76,8 @@ __print_cell:
 		je	print_true
 		cmp	dl, TYPE_QUOTE
 		je	print_quote
+		cmp	dl, TYPE_FIXNUM		; fixnum 0 looks like NIL
+		je	print_fixnum
 
 		test	r8, r8			; now handle NIL
 		jz	print_nil
@@ -90,6 +92,10 @@ __print_cell:
 		je	print_lambda
 		cmp	dl, TYPE_CLOSURE
 		je	print_closure
+		cmp	dl, TYPE_VECTOR
+		je	print_vector
+		cmp	dl, TYPE_SYMBOL
+		je	print_symbol
 
 		jmp	__panic_type
 
@@ -131,6 +137,8 @@ print_cons:	lea	rsi, [char_lb]
 		mov	rdx, r8
 		shr	rdx, SHIFT_TYPE
 		and	dl, BYTEMASK_TYPE
+		cmp	dl, TYPE_FIXNUM
+		je	.right
 		test	r8, rbp			; check for NIL
 		jz	.out
 		cmp	dl, TYPE_CONS		; check type
@@ -153,6 +161,12 @@ print_int:	mov	rax, [r8]		; rax <- left(r8)
 		call	__printnum10
 		ret
 
+print_fixnum:	mov	rax, r8			; sign extend 59 bit value
+		shl	rax, 64 - SHIFT_TYPE
+		sar	rax, 64 - SHIFT_TYPE
+		call	__printnum10
+		ret
+
 print_string:	test	al, al
 		jz	.start
 
@@ -166,26 +180,14 @@ print_string:	test	al, al
 .start:		test	r8, r8			; empty string?
 		jz	.done
 
-.print_block:	mov	rsi, r8
-		mov	rcx, 8
+		mov	rcx, [r8]		; all characters at once
+		lea	rsi, [r8 + 16]
+		jmp	__putn
 
-.print_char:	cmp	byte [rsi], 0
-		je	.done
-		push	rcx
-		call	__putc
-		pop	rcx
-		inc	rsi
-		loop	.print_char
 
-		mov	r8, [r8 + 8]
-		mov	rdx, r8
-		shr	rdx, SHIFT_TYPE
-		and	dl, BYTEMASK_TYPE
+print_symbol:	mov	r8, [r8]		; its name, never in ""
 		and	r8, rbp
-		jz	.done
-		cmp	dl, TYPE_STR
-		jne	__panic_type
-		jmp	.print_block
+		jmp	print_string.start
 
 
 print_lambda:	lea	rsi, [msg_lambda]
@@ -210,22 +212,63 @@ print_lambda:	lea	rsi, [msg_lambda]
 
 print_closure:	lea	rsi, [msg_closure]
 		call	__puts
+		lea	rsi, [char_lb]
+		call	__putc
 
-		push	qword [r8]		; save pointer to lambda
-		mov	r8, [r8 + 8]		; print captured stack
+		mov	ecx, [r8 + 8]		; print captured values, the
+.value:		push	r8			; last one was captured first
+		push	rcx
+		mov	r8, [r8 + 8 + 8*rcx]
+		mov	al, 1
 		call	__print_cell
+		pop	rcx
+		pop	r8
+		dec	rcx
+		jz	.done
+		push	rcx
 		call	__putsp
+		pop	rcx
+		jmp	.value
 
-		pop	r8			; restore lambda
+.done:		lea	rsi, [char_rb]
+		call	__putc
+		call	__putsp
+
+		mov	r8, [r8]		; lambda
 		and	r8, rbp			; no type check
 		jmp	print_lambda.continue
 
+print_vector:	lea	rsi, [msg_vector]
+		call	__puts
+
+		xor	rcx, rcx
+.element:	cmp	ecx, [r8 + 8]		; all elements done?
+		je	.done
+		push	r8
+		push	rcx
+		test	rcx, rcx
+		jz	.first
+		call	__putsp
+.first:		mov	rcx, [rsp]
+		mov	r8, [r8 + 16 + 8*rcx]
+		mov	al, 1
+		call	__print_cell
+		pop	rcx
+		pop	r8
+		inc	rcx
+		jmp	.element
+
+.done:		lea	rsi, [char_rb]
+		call	__putc
+		ret
+
 
 section .data
 
 msg_hex		db "0x", 0
 msg_closure	db "(ξ ", 0
 msg_lambda	db "(λ ", 0
+msg_vector	db "#(", 0
 msg_nl		db `\n`, 0
 msg_nil		db "#NIL", 0
 msg_true	db "#T", 0
@@ -0,0 +1,215 @@
+%include "runtime.inc"
+%include "mem.inc"
+%include "panic.inc"
+
+extern	__cons
+
+section .text
+
+;
+; A string is a block of cells (see mem.asm): its length in bytes, a
+; header with the number of words holding the characters, then the
+; characters filled up with 0. The empty string has no address.
+;
+
+
+;
+; number of characters of a string
+;
+; input:
+;	stack:	dummy, string
+;
+; output:
+;	RAX	length
+;
+		global	__builtin_string_length
+		global	__builtin_string_length.continue
+
+__builtin_string_length:
+		pop	rax
+		mov	[rsp + 8], rax
+
+.continue:	pop	rbx
+		call	str_length
+		mov	rax, rcx
+		mov	rdx, TAG_FIXNUM
+		or	rax, rdx
+		ret
+
+
+;
+; concatenation of strings
+;
+; input:
+;	RCX	k
+;	stack:	dummy, s1, ..., sk
+;
+; output:
+;	RAX	s1 ... sk in one string
+;
+		global	__builtin_string_append
+		global	__builtin_string_append.continue
+
+__builtin_string_append:
+		pop	rax
+		mov	[rsp + 8*rcx], rax
+
+.continue:	mov	r11, rcx		; r11 <- k
+		xor	rax, rax		; rax <- length of result
+		xor	rsi, rsi
+.sum:		cmp	rsi, r11
+		je	.alloc
+		mov	rbx, [rsp + 8*rsi]
+		call	str_length
+		add	rax, rcx
+		inc	rsi
+		jmp	.sum
+
+.alloc:		mov	rbx, rax		; the strings stay on stack
+		call	__mem_chars		; while allocating
+
+		mov	r10, r11		; copy them, s1 first
+.copy:		test	r10, r10
+		jz	.out
+		dec	r10
+		mov	rbx, [rsp + 8*r10]
+		call	str_length
+		lea	rsi, [rbx + 16]
+		cld
+		rep	movsb
+		jmp	.copy
+
+.out:		lea	rsp, [rsp + 8*r11]	; clear stack
+		ret
+
+
+;
+; part of a string
+;
+; input:
+;	stack:	dummy, string, start, end
+;
+; output:
+;	RAX	characters from start up to, but not including end
+;
+		global	__builtin_substring
+		global	__builtin_substring.continue
+
+__builtin_substring:
+		pop	rax
+		mov	[rsp + 3*8], rax
+
+.continue:	mov	rbx, [rsp + 2*8]	; r11 <- length of string
+		call	str_length
+		mov	r11, rcx
+		mov	rcx, [rsp]		; r9 <- end
+		call	fixnum_value
+		mov	r9, rcx
+		mov	rcx, [rsp + 8]		; rcx <- start
+		call	fixnum_value
+
+		cmp	r9, r11			; start <= end <= length,
+		ja	__panic_index		; negative ones are above
+		cmp	rcx, r9			; any length as well
+		ja	__panic_index
+
+		mov	rbx, r9			; rbx <- length of result
+		sub	rbx, rcx
+		mov	r11, rcx		; the string stays on stack
+		call	__mem_chars		; while allocating
+
+		mov	rsi, [rsp + 2*8]
+		and	rsi, rbp
+		lea	rsi, [rsi + 16 + r11]
+		mov	rcx, rbx
+		cld
+		rep	movsb
+
+		add	rsp, 3*8
+		ret
+
+
+;
+; list of the characters of a string, each one a string of its own
+;
+; input:
+;	stack:	dummy, string
+;
+; output:
+;	RAX	list
+;
+		global	__builtin_string_to_list
+		global	__builtin_string_to_list.continue
+
+__builtin_string_to_list:
+		pop	rax
+		mov	[rsp + 8], rax
+
+.continue:	mov	rbx, [rsp]		; the string stays on stack
+		call	str_length		; while allocating
+		push	0			; and the list, built from
+						; the end
+.char:		test	rcx, rcx
+		jz	.out
+		dec	rcx
+		mov	rbx, 1
+		call	__mem_chars
+
+		mov	rsi, [rsp + 8]
+		and	rsi, rbp
+		mov	dl, [rsi + 16 + rcx]
+		mov	[rdi], dl
+
+		mov	rbx, [rsp]
+		call	__cons
+		mov	[rsp], rax
+		jmp	.char
+
+.out:		pop	rax
+		add	rsp, 8
+		ret
+
+
+;
+; address and length of a string
+;
+; input:
+;	RBX	string
+;
+; output:
+;	RBX	its address, 0 for the empty string
+;	RCX	its length
+;
+; changes: rdx
+;
+str_length:	mov	rdx, rbx
+		shr	rdx, SHIFT_TYPE
+		and	dl, BYTEMASK_TYPE
+		cmp	dl, TYPE_STR
+		jne	__panic_type
+		xor	rcx, rcx
+		and	rbx, rbp
+		jz	.out
+		mov	rcx, [rbx]
+.out:		ret
+
+
+;
+; value of a fixnum
+;
+; input:
+;	RCX	fixnum
+;
+; output:
+;	RCX	its value
+;
+; changes: rdx
+;
+fixnum_value:	mov	rdx, rcx
+		shr	rdx, SHIFT_TYPE
+		and	dl, BYTEMASK_TYPE
+		cmp	dl, TYPE_FIXNUM
+		jne	__panic_type
+		shl	rcx, 64 - SHIFT_TYPE
+		sar	rcx, 64 - SHIFT_TYPE
+		ret
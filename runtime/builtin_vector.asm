@@ -0,0 +1,213 @@
+%include "runtime.inc"
+%include "mem.inc"
+%include "panic.inc"
+
+extern	__cons
+
+section .text
+
+;
+; A vector is a block of cells like a closure (see mem.asm): a first word
+; left 0, a header with the number of elements, then the elements.
+;
+
+
+;
+; makes a vector of n times the same element
+;
+; input:
+;	stack:	dummy, n, x
+;
+; output:
+;	RAX	vector
+;
+		global	__builtin_make_vector
+		global	__builtin_make_vector.continue
+
+__builtin_make_vector:
+		pop	rax
+		mov	[rsp + 2*8], rax
+
+.continue:	pop	rax			; rax <- x
+		pop	rcx			; rcx <- n
+		call	fixnum_value
+		test	rcx, rcx
+		js	__panic_index
+		jmp	__mem_vector
+
+
+;
+; element of a vector
+;
+; input:
+;	stack:	dummy, vector, i
+;
+; output:
+;	RAX	element i, the first one is 0
+;
+		global	__builtin_vector_ref
+		global	__builtin_vector_ref.continue
+
+__builtin_vector_ref:
+		pop	rax
+		mov	[rsp + 2*8], rax
+
+.continue:	pop	rcx			; rcx <- i
+		pop	rbx			; rbx <- vector
+		call	vector_address
+		call	fixnum_value
+
+		mov	eax, [rbx + 8]		; negative indices are above
+		cmp	rcx, rax		; any length as well
+		jae	__panic_index
+		mov	rax, [rbx + 16 + 8*rcx]
+		ret
+
+
+;
+; number of elements of a vector
+;
+; input:
+;	stack:	dummy, vector
+;
+; output:
+;	RAX	length
+;
+		global	__builtin_vector_length
+		global	__builtin_vector_length.continue
+
+__builtin_vector_length:
+		pop	rax
+		mov	[rsp + 8], rax
+
+.continue:	pop	rbx
+		call	vector_address
+		mov	eax, [rbx + 8]
+		mov	rdx, TAG_FIXNUM
+		or	rax, rdx
+		ret
+
+
+;
+; list of the elements of a vector
+;
+; input:
+;	stack:	dummy, vector
+;
+; output:
+;	RAX	list
+;
+		global	__builtin_vector_to_list
+		global	__builtin_vector_to_list.continue
+
+__builtin_vector_to_list:
+		pop	rax
+		mov	[rsp + 8], rax
+
+.continue:	mov	rbx, [rsp]		; the vector stays on stack
+		call	vector_address		; while consing, it may move
+		mov	ecx, [rbx + 8]
+
+		xor	rbx, rbx		; build list from the end
+.element:	test	rcx, rcx
+		jz	.out
+		mov	rax, [rsp]
+		and	rax, rbp
+		mov	rax, [rax + 8 + 8*rcx]
+		call	__cons
+		mov	rbx, rax
+		dec	rcx
+		jmp	.element
+
+.out:		add	rsp, 8
+		mov	rax, rbx
+		ret
+
+
+;
+; vector of the elements of a list
+;
+; input:
+;	stack:	dummy, list
+;
+; output:
+;	RAX	vector
+;
+		global	__builtin_list_to_vector
+		global	__builtin_list_to_vector.continue
+
+__builtin_list_to_vector:
+		pop	rax
+		mov	[rsp + 8], rax
+
+.continue:	pop	rbx			; rbx <- list
+		xor	rcx, rcx		; rcx <- its length
+		mov	rsi, rbx
+.count:		mov	rdx, rsi
+		shr	rdx, SHIFT_TYPE
+		and	dl, BYTEMASK_TYPE
+		jz	.alloc
+		cmp	dl, TYPE_CONS
+		jne	__panic_type
+		and	rsi, rbp
+		jz	.alloc
+		inc	rcx
+		mov	rsi, [rsi + 8]
+		jmp	.count
+
+.alloc:		xor	rax, rax		; rbx is kept up to date by
+		call	__mem_vector		; the garbage collector
+
+		mov	rdi, rax
+		and	rdi, rbp
+		add	rdi, 16
+.copy:		and	rbx, rbp
+		jz	.out
+		mov	rdx, [rbx]
+		mov	[rdi], rdx
+		add	rdi, 8
+		mov	rbx, [rbx + 8]
+		jmp	.copy
+
+.out:		ret
+
+
+;
+; address of a vector
+;
+; input:
+;	RBX	vector
+;
+; output:
+;	RBX	its address
+;
+; changes: rdx
+;
+vector_address:	mov	rdx, rbx
+		shr	rdx, SHIFT_TYPE
+		and	dl, BYTEMASK_TYPE
+		cmp	dl, TYPE_VECTOR
+		jne	__panic_type
+		and	rbx, rbp
+		ret
+
+
+;
+; value of a fixnum
+;
+; input:
+;	RCX	fixnum
+;
+; output:
+;	RCX	its value
+;
+; changes: rdx
+;
+fixnum_value:	mov	rdx, rcx
+		shr	rdx, SHIFT_TYPE
+		and	dl, BYTEMASK_TYPE
+		cmp	dl, TYPE_FIXNUM
+		jne	__panic_type
+		shl	rcx, 64 - SHIFT_TYPE
+		sar	rcx, 64 - SHIFT_TYPE
+		ret
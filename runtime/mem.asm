@@ -2,84 +2,576 @@
 %include "syscall.inc"
 %include "panic.inc"
 %include "start.inc"
+%include "memo.inc"
+%include "puts.inc"
+%include "printnum.inc"
+
+extern	__const_start
+extern	__const_end
+extern	__memo_tables
 
 
 section .text
 ;
-; initialize memory pool
+; Cells are allocated in a fixed size nursery. When it is full, a minor
+; collection copies the live nursery cells into the old generation,
+; a segmented heap managed with a free list. Only if the old generation
+; is short of space a major collection marks and sweeps it.
 ;
-; RSI	number cells to allocate in pool
+; Cells are never changed after their initialization and a new cell is
+; always young, so old cells can't point into the nursery: the stack and
+; the tables of memoized results are the only root set of a minor
+; collection and no write barrier is needed.
 ;
+; Closures, vectors and strings are blocks of consecutive cells: a first
+; word, a header with TYPE_HEADER and the number of words following it.
+; The first word is the lambda of a closure, 0 for a vector and the
+; length of a string. The words are values, except for the characters
+; of a string. Blocks are copied as a whole and the sweep never looks
+; past the header of a block, live or dead.
 ;
-		global	__mem_init
-__mem_init:
-		; use mmap to allocate memory
-		mov	rax, SYS_MMAP
-		xor	rdi, rdi				; addr
-		shl	rsi, 4					; length
-		mov	rdx, PROT_READ | PROT_WRITE		; prot
-		mov	r10, MAP_PRIVATE | MAP_ANONYMOUS	; flags
-		xor	r8, r8					; fd
-		dec	r8
-		xor	r9, r9					; offset
-		syscall
-		mov	rbx, rax	; check for MAP_FAILED = -1
-		inc	rbx
-		jz	__panic_memory
+; Constants of the compiled program are cells in read-only data between
+; __const_start and __const_end. They are neither copied nor marked, nor
+; are symbols, which are static cells of the program or the runtime.
+;
+NURSERY_SIZE	equ	4*1024*1024
 
-		mov	[pool], rax
-		mov	[next_free], rax
-		add	rax, rsi
-		mov	[pool_end], rax
 
+;
+; initialize memory pool
+;
+; RSI	initial size of old generation in bytes
+;
+;
+		global	__mem_init
+__mem_init:	push	rsi
+		mov	rsi, NURSERY_SIZE
+		call	map_memory
+		jc	__panic_memory
+		mov	[nursery], rax
+		mov	[nursery_next], rax
+		add	rax, NURSERY_SIZE
+		mov	[nursery_end], rax
+
+		pop	rsi
+		call	grow
+		jc	__panic_memory
 		ret
 
 
 ;
-; allocates a new cell from pool
+; allocates a new cell from the nursery
 ;
 ; output:
 ;	RDI	address of new cell without any type information
 ;
-; changes: rdx, rdi, r8, r9, r10b
+; changes: rdx, rdi, r8, r9, r10
 ;
 		global	__mem_alloc
 
-__mem_alloc:	xor	r10b, r10b
-		mov	rdi, [next_free]
-.search:	cmp	rdi, [pool_end]
-		jae	.need_gc
+__mem_alloc:	mov	rdi, [nursery_next]
+		cmp	rdi, [nursery_end]
+		jae	.collect
+		lea	rdx, [rdi + 16]
+		mov	[nursery_next], rdx
+		ret
 
-.check_free:	mov	rdx, [rdi + 8]
-		rcl	rdx, 1
-		jnc	.return
+.collect:	call	collect
+		jmp	__mem_alloc
 
-		mov	rdx, [rdi + 8]		; mark as free and continue
-		shl	rdx, 1
-		shr	rdx, 1
+
+;
+; allocates consecutive cells from the nursery
+;
+; input:
+;	RCX	number of cells, at most a nursery
+;
+; output:
+;	RDI	address of first cell without any type information
+;
+; changes: rdx, rdi, r8, r9, r10
+;
+alloc_block:	mov	rdi, [nursery_next]
+		mov	rdx, rcx
+		shl	rdx, 4
+		add	rdx, rdi
+		cmp	rdx, [nursery_end]
+		ja	.collect
+		mov	[nursery_next], rdx
+		ret
+
+.collect:	call	collect
+		jmp	alloc_block
+
+
+;
+; allocates a block for a closure, vector or string
+;
+; input:
+;	RCX	number of words after the header
+;
+; output:
+;	RDI	address of block with its header, the first word and the
+;		words are left to the caller
+;
+; changes: rdx, rdi, r8, r9, r10
+;
+alloc_values:	push	rcx
+		add	rcx, 3			; first word, header and values
+		shr	rcx, 1			; in cells
+		call	alloc_block
+		pop	rcx
+
+		mov	rdx, TYPE_HEADER << SHIFT_TYPE
+		or	rdx, rcx
 		mov	[rdi + 8], rdx
-		add	rdi, 16
-		jmp	.search
+
+		test	cl, 1			; clear the word left over in
+		jz	.out			; the last cell
+		xor	rdx, rdx
+		mov	[rdi + 16 + 8*rcx], rdx
+.out:		ret
+
+
+;
+; empty the nursery
+;
+; After the minor collection the old generation must be able to take a
+; full nursery, otherwise it is collected and grown if less than a
+; quarter of it is free.
+;
+; changes: rdx, rdi, r8, r9, r10
+;
+collect:	push	rax			; preserve registers of
+		push	rbx			; __mem_alloc callers, cells
+		push	rcx			; in them are roots as well
+		push	rsi
+		push	r11
+
+		mov	rax, [nursery_next]	; count cells allocated
+		sub	rax, [nursery]
+		shr	rax, 4
+		add	[allocated], rax
+		inc	qword [minors]
+
+		call	minor
+		mov	rax, [nursery]
+		mov	[nursery_next], rax
+
+		cmp	qword [old_free], NURSERY_SIZE / 16
+		jae	.out
+
+		inc	qword [majors]
+		call	major
+		mov	rax, [old_free]
+		shl	rax, 2
+		cmp	rax, [heap_cells]
+		jb	.grow
+		cmp	qword [old_free], NURSERY_SIZE / 16
+		jae	.out
+
+.grow:		mov	rax, [pool_end]		; the rest of the newest segment
+		sub	rax, [next_free]	; is lost until the next sweep
+		shr	rax, 4
+		sub	[old_free], rax
+
+		mov	rsi, [heap_cells]	; double the heap, but take
+		shl	rsi, 4			; at least two nurseries
+		cmp	rsi, 2 * NURSERY_SIZE
+		jae	.grow_now
+		mov	rsi, 2 * NURSERY_SIZE
+.grow_now:	call	grow			; if this fails, we panic once
+						; copying really runs out
+
+.out:		pop	r11
+		pop	rsi
+		pop	rcx
+		pop	rbx
+		pop	rax
+		ret
 
 
-.need_gc:	test	r10b, r10b		; did we already collect?
-		jnz	__panic_oom
+;
+; minor collection: copy live nursery cells into the old generation
+;
+; Copied cells are queued on a worklist threaded through the nursery
+; cells they were copied from and scanned for further nursery cells.
+;
+; changes: rcx, rdx, rsi, rdi, r8, r9, r10
+;
+minor:		mov	qword [worklist], 0
 
 		lea	r8, [rsp + 8]
+.roots:		cmp	r8, [__start_stack]
+		jae	.tables
+		mov	r9, [r8]
+		call	forward
+		mov	[r8], r9
+		add	r8, 8
+		jmp	.roots
+
+.tables:	mov	rsi, [__memo_tables]
+.table:		test	rsi, rsi
+		jz	.scan
+		call	memo_slots
+.slot:		cmp	r8, rcx
+		jae	.next_table
+		mov	r9, [r8]
+		call	forward
+		mov	[r8], r9
+		add	r8, 8
+		jmp	.slot
+.next_table:	mov	rsi, [rsi + MEMO_NEXT]
+		jmp	.table
+
+.scan:		mov	rdi, [worklist]
+		test	rdi, rdi
+		jz	.out
+		mov	rdx, [rdi + 8]		; unlink nursery cell
+		and	rdx, rbp
+		mov	[worklist], rdx
+
+		mov	r8, [rdi]		; r8 <- its copy
+		mov	rdx, r8
+		shr	rdx, SHIFT_TYPE
+		and	dl, BYTEMASK_TYPE
+		and	r8, rbp
+		cmp	dl, TYPE_CONS
+		je	.both
+		cmp	dl, TYPE_CLOSURE
+		je	.block
+		cmp	dl, TYPE_VECTOR
+		je	.block
+		jmp	.scan
+
+.both:		mov	r9, [r8]
+		call	forward
+		mov	[r8], r9
+		mov	r9, [r8 + 8]
+		call	forward
+		mov	[r8 + 8], r9
+		jmp	.scan
+
+.block:		mov	ecx, [r8 + 8]		; rcx <- number of values
+.value:		test	rcx, rcx
+		jz	.first
+		mov	r9, [r8 + 8 + 8*rcx]
+		call	forward
+		mov	[r8 + 8 + 8*rcx], r9
+		dec	rcx
+		jmp	.value
+.first:		mov	r9, [r8]
+		call	forward
+		mov	[r8], r9
+		jmp	.scan
+
+.out:		ret
+
+
+;
+; copy a nursery cell into the old generation
+;
+; The nursery cell is overwritten with the typed address of its copy
+; and a link to the worklist with FLAG_USED set, which marks it as
+; forwarded.
+;
+; input:
+;	R9	cell
+;
+; output:
+;	R9	cell, moved into old generation if it was in the nursery
+;
+; changes: rdx, rdi, r10
+;
+forward:	mov	rdx, r9
+		shr	rdx, SHIFT_TYPE
+		and	dl, BYTEMASK_TYPE
+		jz	.out
+		cmp	dl, TYPE_FIXNUM		; fixnums are no pointers
+		je	.out
+		mov	rdi, r9
+		and	rdi, rbp
+		cmp	rdi, [nursery]
+		jb	.out
+		cmp	rdi, [nursery_next]
+		jae	.out
+
+		mov	rdx, [rdi + 8]		; already forwarded?
+		test	rdx, rdx
+		js	.forwarded
+
+		mov	rdx, r9
+		shr	rdx, SHIFT_TYPE
+		and	dl, BYTEMASK_TYPE
+		cmp	dl, TYPE_CLOSURE
+		je	.block
+		cmp	dl, TYPE_VECTOR
+		je	.block
+		cmp	dl, TYPE_STR
+		je	.block
+
+		mov	r10, [free_list]	; r10 <- old generation cell
+		test	r10, r10
+		jz	.bump
+		mov	rdx, [r10]
+		mov	[free_list], rdx
+		jmp	.copy
+
+.bump:		mov	r10, [next_free]
+		cmp	r10, [pool_end]
+		jb	.bumped
+		call	grow_segment
+		jmp	.bump
+.bumped:	lea	rdx, [r10 + 16]
+		mov	[next_free], rdx
+
+.copy:		dec	qword [old_free]
+		mov	rdx, [rdi]
+		mov	[r10], rdx
+		mov	rdx, [rdi + 8]
+		mov	[r10 + 8], rdx
+
+.moved:		xor	r9, rdi			; keep type, replace address
+		or	r9, r10
+		mov	[rdi], r9
+		mov	rdx, [worklist]		; queue for scanning
+		bts	rdx, 63
+		mov	[rdi + 8], rdx
+		mov	[worklist], rdi
+
+.forwarded:	mov	r9, [rdi]
+.out:		ret
+
+.block:		mov	edx, [rdi + 8]		; rdx <- size of block in bytes
+		add	rdx, 3
+		shr	rdx, 1
+		shl	rdx, 4
+
+		mov	r10, [next_free]	; blocks only fit into the
+		add	rdx, r10		; unused rest of a segment
+		cmp	rdx, [pool_end]
+		ja	.segment
+		mov	[next_free], rdx
+		sub	rdx, r10
+		shr	rdx, 4
+		sub	[old_free], rdx
+
+		push	rcx
+		push	rsi
+		push	rdi
+		lea	rcx, [2*rdx]
+		mov	rsi, rdi
+		mov	rdi, r10
+		cld
+		rep	movsq
+		pop	rdi
+		pop	rsi
+		pop	rcx
+		jmp	.moved
+
+.segment:	call	grow_segment
+		jmp	.block
+
+
+;
+; adds a segment of two nurseries to the old generation while copying
+;
+; The unused rest of the newest segment is lost until the next sweep.
+;
+; changes: rdx, r10
+;
+grow_segment:	push	rax
+		push	rcx
+		push	rsi
+		push	rdi
+		push	r8
+		push	r9
+		push	r11
+		mov	rax, [pool_end]
+		sub	rax, [next_free]
+		shr	rax, 4
+		sub	[old_free], rax
+		mov	rsi, 2 * NURSERY_SIZE
+		call	grow
+		jc	__panic_oom
+		pop	r11
+		pop	r9
+		pop	r8
+		pop	rdi
+		pop	rsi
+		pop	rcx
+		pop	rax
+		ret
+
+
+;
+; major collection: mark and sweep the old generation
+;
+; Must run with an empty nursery. Rebuilds the free list from all
+; unmarked cells. The unused rest of the newest segment is left to the
+; bump allocation, blocks of cells need it.
+;
+; changes: rcx, rdx, rsi, rdi, r8, r9, r10
+;
+major:		lea	r8, [rsp + 8]
 .mark_stack:	cmp	r8, [__start_stack]
-		jae	.done_marking
+		jae	.tables
 		mov	r9, [r8]
 		call	mark
 		add	r8, 8
 		jmp	.mark_stack
 
-.done_marking:	mov	rdi, [pool]		; restart at beginning
-		inc	r10b
-		jmp	.check_free
+.tables:	mov	rsi, [__memo_tables]
+.table:		test	rsi, rsi
+		jz	.sweep
+		call	memo_slots
+.slot:		cmp	r8, rcx
+		jae	.next_table
+		mov	r9, [r8]
+		call	mark
+		add	r8, 8
+		jmp	.slot
+.next_table:	mov	rsi, [rsi + MEMO_NEXT]
+		jmp	.table
+
+.sweep:		xor	rcx, rcx		; rcx <- number of free cells
+		xor	rsi, rsi		; rsi <- free list
+		mov	r8, [heap]
+
+.segment:	test	r8, r8
+		jz	.swept
+		lea	rdi, [r8 + 16]		; skip segment header
+		mov	r9, [r8 + 8]		; r9 <- end of segment
+		cmp	r8, [heap]		; the newest one only up to
+		jne	.cell			; next_free
+		mov	r9, [next_free]
+
+.cell:		cmp	rdi, r9
+		jae	.next_segment
+		mov	rdx, [rdi + 8]
+		shl	rdx, 1
+		jnc	.free
+		shr	rdx, 1			; unmark live cell
+		mov	[rdi + 8], rdx
+		add	rdi, 16
+
+		mov	r10, rdx		; skip the rest of a block
+		shr	r10, SHIFT_TYPE
+		cmp	r10, TYPE_HEADER
+		jne	.cell
+		mov	edx, edx
+		add	rdx, 1			; lambda and header are done
+		shr	rdx, 1
+		shl	rdx, 4
+		add	rdi, rdx
+		jmp	.cell
+
+.free:		mov	r10, [rdi + 8]		; rdx <- number of cells, all
+		shr	r10, SHIFT_TYPE		; of a dead block at once: the
+		cmp	r10, TYPE_HEADER	; characters of a string are
+		mov	edx, 1			; no cells
+		jne	.free_cell
+		mov	edx, [rdi + 8]
+		add	rdx, 3			; lambda, header and values
+		shr	rdx, 1
+
+.free_cell:	mov	[rdi], rsi		; link into free list
+		mov	qword [rdi + 8], 0
+		mov	rsi, rdi
+		inc	rcx
+		add	rdi, 16
+		dec	rdx
+		jnz	.free_cell
+		jmp	.cell
+
+.next_segment:	mov	r8, [r8]
+		jmp	.segment
+
+.swept:		mov	[free_list], rsi
+		mov	rdx, [pool_end]		; the rest of the newest segment
+		sub	rdx, [next_free]	; is free as well
+		shr	rdx, 4
+		add	rcx, rdx
+		mov	[old_free], rcx
+		ret
+
+
+;
+; words of a table of memoized results, see memo.asm
+;
+; input:
+;	RSI	table
+;
+; output:
+;	R8	first word
+;	RCX	end of words
+;
+memo_slots:	lea	r8, [rsi + MEMO_DATA]
+		mov	rcx, [rsi + MEMO_ARGC]
+		add	rcx, 2			; hash, parameter, result
+		imul	rcx, [rsi + MEMO_SLOTS]
+		lea	rcx, [r8 + 8*rcx]
+		ret
+
+
+;
+; add a segment to the old generation and allocate from it next
+;
+; Each segment starts with a header cell holding the link to the
+; previous segment and its end address.
+;
+; input:
+;	RSI	size of segment in bytes
+;
+; output:
+;	CF	set if mmap failed
+;
+; changes: rax, rcx, rdx, rsi, rdi, r8, r9, r10, r11
+;
+grow:		and	rsi, -16
+		call	map_memory
+		jc	.out
+
+		mov	rdx, [heap]		; link in segment
+		mov	[rax], rdx
+		lea	rdx, [rax + rsi]
+		mov	[rax + 8], rdx
+		mov	[heap], rax
+
+		mov	[pool_end], rdx		; allocate from it next
+		add	rax, 16
+		mov	[next_free], rax
+
+		shr	rsi, 4
+		dec	rsi
+		add	[heap_cells], rsi
+		add	[old_free], rsi
+		clc
+.out:		ret
+
 
-.return:	mov	r8, rdi
-		add	r8, 16
-		mov	[next_free], r8
+;
+; map anonymous memory
+;
+; input:
+;	RSI	size in bytes
+;
+; output:
+;	RAX	address of memory
+;	CF	set if mmap failed
+;
+; changes: rax, rcx, rdx, rdi, r8, r9, r10, r11
+;
+map_memory:	mov	rax, SYS_MMAP
+		xor	rdi, rdi				; addr
+		mov	rdx, PROT_READ | PROT_WRITE		; prot
+		mov	r10, MAP_PRIVATE | MAP_ANONYMOUS	; flags
+		xor	r8, r8					; fd
+		dec	r8
+		xor	r9, r9					; offset
+		syscall
+		cmp	rax, -4095		; -errno on failure,
+		cmc				; so CF <- rax >= -4095
 		ret
 
 
@@ -94,45 +586,122 @@ __mem_alloc:	xor	r10b, r10b
 mark:		mov	rdx, r9
 		shr	rdx, SHIFT_TYPE
 		and	dl, BYTEMASK_TYPE
+		cmp	dl, TYPE_FIXNUM		; fixnums are no pointers
+		je	.out
 		and	r9, rbp
 		jz	.out
 		test	dl, dl
 		jz	.out
+		cmp	dl, TYPE_SYMBOL		; symbols are static
+		je	.out
+
+		mov	rdi, __const_start	; constants are read-only and
+		cmp	r9, rdi			; only refer to constants
+		jb	.heap
+		mov	rdi, __const_end
+		cmp	r9, rdi
+		jb	.out
+
+.heap:		mov	rdi, [r9 + 8]		; already marked?
+		test	rdi, rdi
+		js	.out
 
-		mov	rdi, [r9 + 8]		; mark this cell
-		shl	rdi, 1
+		shl	rdi, 1			; mark this cell
 		stc
 		rcr	rdi, 1
 		mov	[r9 + 8], rdi
 
 		cmp	dl, TYPE_CONS
 		je	.mark_cons
-		cmp	dl, TYPE_STR
-		je	.mark_str
+		cmp	dl, TYPE_CLOSURE
+		je	.mark_block
+		cmp	dl, TYPE_VECTOR
+		je	.mark_block
 .out:		ret
 
 .mark_cons:	push	r9
 		mov	r9, [r9]
 		call	mark
 		pop	r9
-.mark_str:	mov	r9, [r9 + 8]
+		mov	r9, [r9 + 8]
+		jmp	mark
+
+.mark_block:	mov	edx, [r9 + 8]		; rdx <- number of values
+.mark_value:	test	rdx, rdx
+		jz	.mark_first
+		push	r9
+		push	rdx
+		mov	r9, [r9 + 8 + 8*rdx]
+		call	mark
+		pop	rdx
+		pop	r9
+		dec	rdx
+		jmp	.mark_value
+.mark_first:	mov	r9, [r9]
 		jmp	mark
 
 
 
 
 ;
-; allocate integer cell
+; print statistics of allocations and collections to stderr
+;
+; changes: rax, rbx, rcx, rdx, rsi, rdi, r11
+;
+		global	__mem_stats
+
+__mem_stats:	call	__out_stderr
+
+		lea	rsi, [stats_allocated]
+		call	__puts
+		mov	rax, [nursery_next]
+		sub	rax, [nursery]
+		shr	rax, 4
+		add	rax, [allocated]
+		call	__printnum10
+
+		lea	rsi, [stats_minors]
+		call	__puts
+		mov	rax, [minors]
+		call	__printnum10
+
+		lea	rsi, [stats_majors]
+		call	__puts
+		mov	rax, [majors]
+		call	__printnum10
+
+		lea	rsi, [stats_heap]
+		call	__puts
+		mov	rax, [heap_cells]
+		call	__printnum10
+
+		call	__putnl
+		jmp	__flush
+
+
+;
+; make integer, as fixnum if possible, otherwise allocate a cell
 ;
 ; input:
-;	RAX	integer to put into cell
+;	RAX	integer
 ;
 ; returns:
-;	RAX	cell holding integer
+;	RAX	fixnum or cell holding integer
 ;
 		global	__mem_int
 
-__mem_int:	call	__mem_alloc
+__mem_int:	mov	rdx, rax		; does it survive sign extension
+		shl	rdx, 64 - SHIFT_TYPE	; from 59 bits?
+		sar	rdx, 64 - SHIFT_TYPE
+		cmp	rdx, rax
+		jne	.box
+
+		and	rax, rbp
+		mov	rdx, TAG_FIXNUM
+		or	rax, rdx
+		ret
+
+.box:		call	__mem_alloc
 
 		mov	[rdi], rax		; left  <- integer
 		xor	rax, rax		; right <- null
@@ -145,7 +714,8 @@ __mem_int:	call	__mem_alloc
 
 
 
-; alloctes a lisp string from a buffer
+;
+; allocates a string from a buffer outside of the heap
 ;
 ; input:
 ;	RSI	string pointer
@@ -156,45 +726,47 @@ __mem_int:	call	__mem_alloc
 ;
 		global	__mem_string
 
-__mem_string:	xor	rdi, rdi
-		test	rbx, rbx		; use shortcut if empty
-		jz	.loop
-
-		lea	rsi, [rsi + rbx - 1]	; go to end of string
-		std
+__mem_string:	call	__mem_chars
+		mov	rcx, rbx
+		cld
+		rep	movsb
+		ret
 
-		call	__mem_alloc		; allocate last string block
-		xor	rdx, rdx
-		mov	[rdi], rdx		; zero fill
-		mov	[rdi + 8], rdx		; and NIL termination
 
-		xor	rcx, rcx		; rcx <- rbx mod 8
-		mov	cl, bl
-		and	cl, 0x07
-		jz	.full_block		; do we need a partial block?
+;
+; allocates a string
+;
+; input:
+;	RBX	length in bytes
+;
+; output:
+;	RAX	string, its characters are left to the caller
+;	RDI	address of the characters
+;
+; changes: rdx, rdi, r8, r9, r10
+;
+		global	__mem_chars
 
-		sub	rbx, rcx		; copy last bytes of str
-		lea	rdi, [rdi + rcx - 1]
-		rep	movsb
-		inc	rdi
+__mem_chars:	mov	rax, TYPE_STR << SHIFT_TYPE
+		test	rbx, rbx		; the empty string has no
+		jz	.out			; address
 
-.loop:		mov	al, TYPE_STR		; rax <- type marked rdi
+		push	rcx
+		lea	rcx, [rbx + 8]		; rcx <- words of characters,
+		shr	rcx, 3			; at least one 0 terminates
+		cmp	rcx, 2 * NURSERY_SIZE / 16 - 3
+		ja	__panic_oom		; blocks fit into the nursery
+
+		call	alloc_values
+		mov	[rdi], rbx
+		xor	rdx, rdx		; fill up the last word
+		mov	[rdi + 8 + 8*rcx], rdx
+		pop	rcx
+
+		mov	al, TYPE_STR
 		shl	rax, SHIFT_TYPE
 		or	rax, rdi
-		test	rbx, rbx		; done yet?
-		jz	.out
-
-		push	rax			; save current result on stack
-		call	__mem_alloc
-		pop	qword [rdi + 8]		; link old string in
-
-.full_block:	mov	rcx, 8			; fill full 8 byte block
-		sub	rbx, rcx
-		lea	rdi, [rdi + rcx - 1]
-		rep	movsb
-		inc	rdi
-		jmp	.loop
-
+		add	rdi, 16
 .out:		ret
 
 
@@ -228,48 +800,97 @@ __mem_lambda:	call	__mem_alloc
 ;
 ; input:
 ;	RAX	lambda
-;	RBX	array of indices to capture
+;	RBX	array of stack offsets to capture, 0 terminated
 ;
 ; output:
 ;	RAX	closure
+;
+; The values are stored in the order __apply pushes them back.
 ;
 
 		global	__mem_closure
 
-__mem_closure:	mov	r11, rsp
-		push	rax			; push lambda on stack
-		xor	rcx, rcx		; push end of stack-list
-		push	rcx
-		cld
+__mem_closure:	xor	rcx, rcx		; rcx <- number of values
+.count:		cmp	word [rbx + 2*rcx], 0
+		je	.alloc
+		inc	rcx
+		jmp	.count
 
-.loop:		mov	cx, [rbx]
-		test	cx, cx
-		jz	.out
-		add	rbx, 2
-		lea	rsi, [r11 + rcx]
+.alloc:		call	alloc_values
+		mov	[rdi], rax
 
-		call	__mem_alloc
-		mov	al, TYPE_CONS		; rax = marked-rdi
+		xor	rdx, rdx
+.copy:		cmp	rdx, rcx
+		je	.out
+		movzx	r8, word [rbx + 2*rdx]
+		mov	r8, [rsp + r8]		; copy stack value
+		mov	[rdi + 16 + 8*rdx], r8
+		inc	rdx
+		jmp	.copy
+
+.out:		mov	al, TYPE_CLOSURE
 		shl	rax, SHIFT_TYPE
 		or	rax, rdi
-		movsq				; copy stack value
-		pop	qword [rdi]		; link in list
-		push	rax			; push new list-head
-		jmp	.loop
+		ret
+
+
+
+;
+; allocates a vector
+;
+; input:
+;	RCX	number of elements
+;	RAX	initial value of all elements
+;
+; output:
+;	RAX	vector
+;
+; changes: rcx, rdx, rdi, r8, r9, r10
+;
+		global	__mem_vector
+
+__mem_vector:	cmp	rcx, 2 * NURSERY_SIZE / 16 - 3
+		ja	__panic_oom		; blocks fit into the nursery
+
+		call	alloc_values
+		xor	rdx, rdx
+		mov	[rdi], rdx
 
-.out:		call	__mem_alloc
-		pop	qword [rdi + 8]		; lave stack-list in right-side
-		pop	qword [rdi]		; save lambda in left-side
+		push	rdi
+		add	rdi, 16
+		cld
+		rep	stosq
+		pop	rdi
 
-		mov	al, TYPE_CLOSURE
+		mov	al, TYPE_VECTOR
 		shl	rax, SHIFT_TYPE
 		or	rax, rdi
 		ret
 
 
 
+section .data
+
+stats_allocated	db	`cells allocated: `, 0
+stats_minors	db	`\nminor collections: `, 0
+stats_majors	db	`\nmajor collections: `, 0
+stats_heap	db	`\nheap cells: `, 0
+
+
 section .bss
 
-pool		resq	1
+nursery		resq	1
+nursery_next	resq	1
+nursery_end	resq	1
+worklist	resq	1	; forwarded nursery cells to scan
+
+heap		resq	1	; newest segment of old generation
+heap_cells	resq	1	; number of cells in all segments
+old_free	resq	1	; number of free cells in all segments
+free_list	resq	1
+next_free	resq	1	; unused rest of newest segment
 pool_end	resq	1
-next_free	resq	1
+
+allocated	resq	1	; cells allocated before the last minor
+minors		resq	1	; number of minor collections
+majors		resq	1	; number of major collections
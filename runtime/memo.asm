@@ -0,0 +1,281 @@
+%include "runtime.inc"
+%include "memo.inc"
+
+section .text
+;
+; Results of memoized functions are kept in a table per function. Its
+; slots are addressed by a hash of the parameter, a new result replaces
+; the one in its slot, so recently used results stay. A slot holds the
+; hash as a fixnum, the parameter and the result, all of them cells.
+;
+; Tables are linked into __memo_tables when they are written first. The
+; garbage collector takes their slots as roots.
+;
+
+
+;
+; look up a result
+;
+; input:
+;	RSI	table
+;	RCX	number of parameter, on stack above the return address
+;
+; output:
+;	RAX	result, or the hash to store the result with
+;	CF	set if there is no result
+;
+; changes: rax, rbx, rdx, rdi, r8, r9, r10, r11
+;
+		global	__memo_lookup
+
+__memo_lookup:	lea	rbx, [rsp + 8]		; rbx <- parameter
+		call	hash_parameter
+		call	find_slot
+		cmp	[r8], r10		; empty slots hold 0, no fixnum
+		jne	.miss
+
+		xor	r9, r9
+.compare:	cmp	r9, rcx
+		je	.hit
+		push	rsi
+		mov	rsi, [r8 + 8 + 8*r9]
+		mov	rdi, [rbx + 8*r9]
+		call	equal
+		pop	rsi
+		jne	.miss
+		inc	r9
+		jmp	.compare
+
+.hit:		mov	rax, [r8 + 8 + 8*rcx]
+		inc	qword [rsi + MEMO_HITS]
+		clc
+		ret
+
+.miss:		mov	rax, r10
+		inc	qword [rsi + MEMO_MISSES]
+		stc
+		ret
+
+
+;
+; store a result
+;
+; input:
+;	RSI	table
+;	RCX	number of parameter, on stack above the return address
+;		and the hash returned by __memo_lookup
+;	RAX	result
+;
+; output:
+;	RAX	result
+;
+; changes: rbx, rdx, r8, r9, r10
+;
+		global	__memo_store
+
+__memo_store:	lea	rbx, [rsp + 16]		; rbx <- parameter
+		mov	r10, [rsp + 8]		; r10 <- hash
+		push	rax
+		call	find_slot
+		pop	rax
+
+		mov	[r8], r10
+		xor	r9, r9
+.copy:		cmp	r9, rcx
+		je	.result
+		mov	rdx, [rbx + 8*r9]
+		mov	[r8 + 8 + 8*r9], rdx
+		inc	r9
+		jmp	.copy
+.result:	mov	[r8 + 8 + 8*rcx], rax
+
+		cmp	qword [rsi + MEMO_LINKED], 0
+		jne	.out
+		mov	qword [rsi + MEMO_LINKED], 1
+		mov	rdx, [__memo_tables]
+		mov	[rsi + MEMO_NEXT], rdx
+		mov	[__memo_tables], rsi
+.out:		ret
+
+
+;
+; hash of the parameter
+;
+; input:
+;	RBX	parameter
+;	RCX	number of parameter
+;
+; output:
+;	R10	hash as fixnum
+;
+; changes: rdx, r8, r9, r10, r11
+;
+hash_parameter:	mov	r10, HASH_OFFSET
+		xor	r8, r8
+.loop:		cmp	r8, rcx
+		je	.out
+		mov	r9, [rbx + 8*r8]
+		call	hash
+		inc	r8
+		jmp	.loop
+
+.out:		and	r10, rbp
+		mov	rdx, TAG_FIXNUM
+		or	r10, rdx
+		ret
+
+
+;
+; add a cell to a hash, equal cells (see eq) add the same
+;
+; input:
+;	R9	cell
+;	R10	hash
+;
+; output:
+;	R10	hash
+;
+; changes: rdx, r9, r10, r11
+;
+hash:		mov	rdx, r9
+		shr	rdx, SHIFT_TYPE
+		and	dl, BYTEMASK_TYPE
+		cmp	dl, TYPE_FIXNUM		; before NIL check, 0 has
+		je	mix			; no address bits set
+		test	r9, rbp
+		jz	mix
+		cmp	dl, TYPE_CONS
+		je	.cons
+		cmp	dl, TYPE_INT
+		je	.boxed
+		cmp	dl, TYPE_REAL
+		je	.boxed
+		cmp	dl, TYPE_STR
+		je	.str
+		cmp	dl, TYPE_VECTOR
+		je	.vector
+		jmp	mix			; anything else by identity
+
+.boxed:		and	r9, rbp
+		mov	r9, [r9]
+		jmp	mix
+
+.str:		and	r9, rbp			; words of characters, the
+		jz	.out			; empty string has no address
+		mov	edx, [r9 + 8]		; rdx <- end of characters
+		lea	rdx, [r9 + 16 + 8*rdx]
+		add	r9, 16
+.word:		push	r9
+		mov	r9, [r9]
+		call	mix
+		pop	r9
+		add	r9, 8
+		cmp	r9, rdx
+		jb	.word
+		ret
+
+.cons:		push	r9
+		mov	r9, TYPE_CONS << SHIFT_TYPE
+		call	mix
+		mov	r9, [rsp]
+		and	r9, rbp
+		mov	r9, [r9]		; hash head
+		call	hash
+		pop	r9
+		and	r9, rbp
+		mov	r9, [r9 + 8]		; and tail
+		jmp	hash
+
+.vector:	and	r9, rbp
+		push	r9
+		mov	r9d, [r9 + 8]		; elements left to hash
+		push	r9
+		mov	r9, TYPE_VECTOR << SHIFT_TYPE
+		call	mix
+.element:	mov	r9, [rsp]
+		test	r9, r9
+		jz	.vector_done
+		dec	qword [rsp]
+		mov	rdx, [rsp + 8]
+		mov	r9, [rdx + 8 + 8*r9]
+		call	hash
+		jmp	.element
+.vector_done:	add	rsp, 16
+		ret
+
+.out:		ret
+
+mix:		xor	r10, r9
+		mov	r11, HASH_PRIME
+		imul	r10, r11
+		ret
+
+
+;
+; slot of a hash
+;
+; input:
+;	RSI	table
+;	RCX	number of parameter
+;	R10	hash
+;
+; output:
+;	R8	slot
+;
+; changes: rax, rdx, r8
+;
+find_slot:	mov	rax, [rsi + MEMO_SLOTS]
+		dec	rax
+		and	rax, r10
+		lea	rdx, [rcx + 2]		; hash, parameter, result
+		imul	rax, rdx
+		lea	r8, [rsi + MEMO_DATA + 8*rax]
+		ret
+
+
+;
+; compare two cells like eq, but without panic on closures
+;
+; input:
+;	RSI, RDI	cells
+;
+; output:
+;	ZF	set if they are equal
+;
+; changes: rax, rdx, rsi, rdi
+;
+equal:		cmp	rsi, rdi
+		je	.out
+		mov	rax, rsi
+		xor	rax, rdi
+		shr	rax, SHIFT_TYPE		; different types?
+		jnz	.out
+		mov	rax, rsi
+		shr	rax, SHIFT_TYPE
+		cmp	al, TYPE_CONS
+		je	.eq
+		cmp	al, TYPE_INT
+		je	.eq
+		cmp	al, TYPE_REAL
+		je	.eq
+		cmp	al, TYPE_STR
+		je	.eq
+		cmp	al, TYPE_VECTOR
+		je	.eq
+.out:		ret				; otherwise pointers differ
+
+.eq:		call	__eq
+		test	rax, rax
+		jz	.different
+		cmp	rax, rax
+		ret
+.different:	or	al, 1
+		ret
+
+
+
+section .data
+
+		global	__memo_tables
+
+__memo_tables:	dq	0
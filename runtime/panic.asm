@@ -63,6 +63,18 @@ __panic_notyet:
 		jmp	exit_with_msg_trace
 
 
+		global	__panic_index
+__panic_index:
+		lea	rsi, [panic_index]
+		jmp	exit_with_msg_trace
+
+
+		global	__panic_symbol
+__panic_symbol:
+		lea	rsi, [panic_symbol]
+		jmp	exit_with_msg_trace
+
+
 ;
 ; helper function that displays 'Error: <msg>\n'
 ;
@@ -88,7 +100,8 @@ exit_with_msg:
 		call	print_error_msg
 		call	__putnl
 
-exit:		mov	rax, SYS_EXIT
+exit:		call	__flush
+		mov	rax, SYS_EXIT
 		xor	rdi, rdi
 		inc	rdi
 		syscall
@@ -156,3 +169,5 @@ panic_overflow		db `overflow`, 0
 panic_underflow		db `underflow`, 0
 panic_argc		db `illegal number of parameter`, 0
 panic_notyet		db `feature not yet implemented`, 0
+panic_index		db `index out of range`, 0
+panic_symbol		db `symbol not bound`, 0
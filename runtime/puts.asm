@@ -1,7 +1,30 @@
 %include "syscall.inc"
 
+;
+; stdout is buffered: the buffer is written when it is full, on newline
+; if stdout is a terminal and by __flush, which must be called before
+; exiting
+;
+OUT_SIZE	equ	4096
+
+
 section .text
 
+;
+; initialize output buffering
+;
+		global	__out_init
+
+__out_init:	mov	rax, SYS_IOCTL
+		mov	rdi, FD_STDOUT
+		mov	rsi, TCGETS
+		lea	rdx, [out_buffer]	; still empty, use it to
+		syscall				; receive struct termios
+		test	rax, rax
+		sete	byte [out_tty]
+		ret
+
+
 ; print zero terminated sting to stdout using putc
 ;
 ; rsi	string to print
@@ -15,16 +38,115 @@ __puts:		cmp	byte [rsi], 0
 		ret
 
 
+; print characters to stdout, copied into the buffer at once unless
+; stdout is a terminal
+;
+; rsi	characters
+; rcx	number of characters
+;
+; changes: rax, rcx, rdx, rsi, rdi, r11
+;
+		global	__putn
+
+__putn:		cmp	byte [out_tty], 0	; a terminal is flushed on
+		jne	.chars			; newline, look at each one
+
+.chunk:		test	rcx, rcx
+		jz	.out
+		mov	rdx, OUT_SIZE		; rdx <- what fits into the
+		sub	rdx, [out_len]		; buffer
+		cmp	rdx, rcx
+		jbe	.copy
+		mov	rdx, rcx
+
+.copy:		sub	rcx, rdx
+		lea	rdi, [out_buffer]
+		add	rdi, [out_len]
+		add	[out_len], rdx
+		push	rcx
+		mov	rcx, rdx
+		cld
+		rep	movsb
+		pop	rcx
+
+		cmp	qword [out_len], OUT_SIZE
+		jb	.chunk
+		push	rcx
+		call	__flush
+		pop	rcx
+		jmp	.chunk
+
+.chars:		test	rcx, rcx
+		jz	.out
+		push	rcx
+		call	__putc
+		pop	rcx
+		inc	rsi
+		dec	rcx
+		jmp	.chars
+
+.out:		ret
+
+
 ; print character on stdout
 ;
 ; rsi	pointer to character to print
+;
+; changes: rax, rcx, rdx, rdi, r11
 ;
 		global	__putc
 
-__putc:		mov	rax, SYS_WRITE
-		mov	rdi, FD_STDOUT
-		mov	rdx, 1
+__putc:		mov	al, [rsi]
+		mov	rdi, [out_len]
+		mov	[out_buffer + rdi], al
+		inc	rdi
+		mov	[out_len], rdi
+
+		cmp	rdi, OUT_SIZE
+		jae	__flush
+		cmp	al, `\n`
+		jne	.out
+		cmp	byte [out_tty], 0
+		jne	__flush
+.out:		ret
+
+
+;
+; write buffered output to stdout
+;
+; changes: rax, rcx, rdx, rdi, r11
+;
+		global	__flush
+
+__flush:	push	rsi
+		lea	rsi, [out_buffer]
+		mov	rdx, [out_len]
+
+.write:		test	rdx, rdx
+		jz	.out
+		mov	rax, SYS_WRITE
+		mov	rdi, [out_fd]
 		syscall
+		test	rax, rax		; on error the output is lost
+		jle	.out
+		add	rsi, rax
+		sub	rdx, rax
+		jmp	.write
+
+.out:		mov	qword [out_len], 0
+		pop	rsi
+		ret
+
+
+;
+; send further output to stderr, after flushing stdout
+;
+; changes: rax, rcx, rdx, rdi, r11
+;
+		global	__out_stderr
+
+__out_stderr:	call	__flush
+		mov	qword [out_fd], FD_STDERR
 		ret
 
 
@@ -45,5 +167,13 @@ __putsp:	lea	rsi, [char_space]
 
 section .data
 
+out_fd		dq	FD_STDOUT
 char_nl		db `\n`
 char_space	db ` `
+
+
+section .bss
+
+out_buffer	resb	OUT_SIZE
+out_len		resq	1
+out_tty		resb	1
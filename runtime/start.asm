@@ -2,9 +2,12 @@
 %include "syscall.inc"
 %include "mem.inc"
 %include "panic.inc"
+%include "puts.inc"
 
 extern	main
-extern	__type_is_int
+extern	__heap_size
+extern	__show_stats
+extern	__int_value
 
 global	__start_stack
 
@@ -14,8 +17,9 @@ section .text
 
 _start:		mov	rbp, MASK_ADDR
 
-		mov	rsi, 64*1024*1024
+		mov	rsi, [__heap_size]
 		call	__mem_init
+		call	__out_init
 
 		mov	[__start_stack], rsp
 
@@ -25,10 +29,16 @@ _start:		mov	rbp, MASK_ADDR
 
 		; if main returns an integer use it as return code
 		xor	rdi, rdi
-		call	__type_is_int
+		call	__int_value
 		jc	.exit
-		mov	rdi, [rax]
-.exit:		mov	rax, SYS_EXIT
+		mov	rdi, rax
+.exit:		push	rdi
+		call	__flush
+		cmp	qword [__show_stats], 0
+		je	.quit
+		call	__mem_stats
+.quit:		pop	rdi
+		mov	rax, SYS_EXIT
 		syscall
 
 
@@ -18,6 +18,8 @@ __true:		mov	rdx, rax
 		and	dl, BYTEMASK_TYPE
 		cmp	dl, TYPE_TRUE		; check for 'true' symbol
 		je	.true
+		cmp	dl, TYPE_FIXNUM		; fixnum 0 is no NIL
+		je	.true
 		test	rax, rbp		; otherwise NIL means false
 		jz	.false
 .true:		clc				; everthing else is true again
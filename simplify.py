@@ -0,0 +1,256 @@
+#
+# simplification of baked expressions
+#
+# Folds calls of pure builtins with constant parameter, drops the branch of
+# an if with a constant condition and inlines small functions that never
+# call themselves. Expressions are baked: parameter are LispRefs, globals
+# are symbols looked up in the symbol table when simplifying.
+#
+
+from copy import copy
+
+import builtin
+from lisp import *
+
+
+# builtins without side effects
+PURE = { "head", "tail", "cons", "atom", "list", "eq", "lt", "le", "gt", "ge",
+         "+", "-", "*", "/", "mod", "not", "and", "or",
+         "vector_ref", "vector_length", "vector_to_list", "list_to_vector",
+         "string_length", "string_append", "substring", "string_to_list" }
+
+# largest function body inlined
+INLINE_SIZE = 16
+
+# calls inlined into one lambda at most
+INLINE_BUDGET = 32
+
+
+def size(expr):
+    if isinstance(expr, LispLambda):
+        return 1 + size(expr.body)
+    if type(expr) == LispList and len(expr) > 0 and expr[0] is not SYM_QUOTE:
+        return sum(size(x) for x in expr)
+    return 1
+
+
+def has_lambda(expr):
+    if isinstance(expr, LispLambda):
+        return True
+    if type(expr) == LispList and len(expr) > 0 and expr[0] is not SYM_QUOTE:
+        return any(has_lambda(x) for x in expr)
+    return False
+
+
+def is_constant(expr):
+    if type(expr) in (LispInt, LispReal, LispStr, LispTrue, LispVector):
+        return True
+    if type(expr) == LispList:
+        return len(expr) == 0 or len(expr) == 2 and expr[0] is SYM_QUOTE
+    return False
+
+
+def value(expr):
+    """ value of a constant expression """
+    if type(expr) == LispList and len(expr) == 2:
+        return expr[1]
+    return expr
+
+
+def constant(value):
+    """ expression for value, None if there is no literal for it """
+    if type(value) in (LispInt, LispReal, LispStr, LispTrue, LispVector):
+        return value
+    if type(value) == LispList and len(value) == 0:
+        return value
+    if type(value) in (LispList, LispSym):
+        return LispList([ SYM_QUOTE, value ])
+    return None
+
+
+
+class Simplifier:
+    """
+    Globals may change until a program is complete. Only the builtins are
+    taken as they are bound now, inline=True also takes the functions and
+    is meant for whole programs like the compiler sees them.
+    """
+
+    def __init__(self, symbols, inline=True):
+        self.symbols = symbols
+        self.inline = inline
+        self.recursive = {}
+
+
+    def simplify_lambda(self, function):
+        self.budget = INLINE_BUDGET
+
+        body = self.simplify(function.body, frozenset())
+        if body is function.body:
+            return function
+
+        new = copy(function)
+        new.compiled = None
+        new.body = body
+        return new
+
+
+    def simplify(self, expr, active):
+        if isinstance(expr, LispLambda):
+            body = self.simplify(expr.body, active)
+            if body is expr.body:
+                return expr
+
+            new = copy(expr)
+            new.compiled = None
+            new.body = body
+            return new
+
+        if type(expr) != LispList or len(expr) == 0:
+            return expr
+
+        function = expr[0]
+        if function is SYM_QUOTE:
+            return expr
+
+        if function is SYM_IF:
+            condition = self.simplify(expr[1], active)
+            if is_constant(condition):
+                return self.simplify(expr[2] if value(condition).is_true() else expr[3],
+                                     active)
+
+            return LispList([ SYM_IF, condition ] +
+                            [ self.simplify(x, active) for x in expr[2:] ])
+
+        function = self.simplify(function, active)
+        parameter = [ self.simplify(p, active) for p in expr[1:] ]
+
+        if type(function) == LispSym:
+            item = self.symbols.get(function)
+
+            if type(item) == LispBuiltin:
+                result = self.fold(function, item, parameter)
+                if result is not None:
+                    return result
+
+            elif type(item) == LispLambda and self.inline:
+                result = self.inline_call(function, item, parameter, active)
+                if result is not None:
+                    return result
+
+        return LispList([ function ] + parameter)
+
+
+    def fold(self, sym, item, parameter):
+        if sym not in PURE or builtin.TABLE.get(sym) is not item:
+            return None
+        if not all(is_constant(p) for p in parameter):
+            return None
+        if item.argc is not None and item.argc != len(parameter):
+            return None
+
+        # errors are left to run time
+        try:
+            result = item.function(*[ value(p) for p in parameter ])
+        except (LispError, ArithmeticError):
+            return None
+
+        return constant(result)
+
+
+    def inline_call(self, sym, function, parameter, active):
+        if sym in active or self.budget <= 0:
+            return None
+        if function.argc != len(parameter) or size(function.body) > INLINE_SIZE:
+            return None
+        if self.is_recursive(sym):
+            return None
+
+        self.budget -= 1
+        active = active | { sym }
+
+        # constants and references can replace the parameter in the body,
+        # as long as no lambda inside has to be rewritten as well
+        if all(is_constant(p) or type(p) == LispRef for p in parameter) \
+                and not has_lambda(function.body):
+            return self.simplify(function.body._rewrite(parameter), active)
+
+        # otherwise bind them like a local lambda
+        local = LispLambda()
+        local.argc = function.argc
+        local.body = self.simplify(function.body, active)
+        return LispList([ local ] + parameter)
+
+
+    def is_recursive(self, sym):
+        """ can the function bound to sym end up calling itself? """
+        if sym not in self.recursive:
+            self.find_cycles(sym)
+        return self.recursive[sym]
+
+
+    def callees(self, sym):
+        """ symbols of the functions the function bound to sym refers to """
+        result = []
+        todo = [ self.symbols.get(sym).body ]
+
+        while todo:
+            expr = todo.pop()
+            if isinstance(expr, LispLambda):
+                todo.append(expr.body)
+            elif type(expr) == LispList and len(expr) > 0 and expr[0] is not SYM_QUOTE:
+                todo.extend(expr)
+            elif type(expr) == LispSym and isinstance(self.symbols.get(expr), LispLambda):
+                result.append(expr)
+
+        return result
+
+
+    def find_cycles(self, root):
+        """
+        Tarjan's strongly connected components of the functions reachable
+        from root, a function is recursive if its component has more than
+        one member or it refers to itself. Iterative, as call chains can
+        be long.
+        """
+        index = { root: 0 }
+        low = { root: 0 }
+        stack = [ root ]
+        on_stack = { root }
+        self_loop = set()
+        work = [ (root, iter(self.callees(root))) ]
+
+        while work:
+            sym, callees = work[-1]
+
+            for callee in callees:
+                if callee == sym:
+                    self_loop.add(sym)
+                if callee in self.recursive:
+                    continue
+                if callee not in index:
+                    index[callee] = low[callee] = len(index)
+                    stack.append(callee)
+                    on_stack.add(callee)
+                    work.append((callee, iter(self.callees(callee))))
+                    break
+                if callee in on_stack:
+                    low[sym] = min(low[sym], index[callee])
+
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[sym])
+
+                if low[sym] == index[sym]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == sym:
+                            break
+
+                    for member in component:
+                        self.recursive[member] = len(component) > 1 or member in self_loop
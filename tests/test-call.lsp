@@ -0,0 +1,24 @@
+(defun six (a b c d e f)
+  (list a b c d e f))
+
+(defun seven (a b c d e f g)
+  (list a b c d e f g))
+
+(defun swap (n a b)
+  (if (lt n 1) (list a b) (swap (- n 1) b (inc a))))
+
+(defun count_to (n acc)
+  (if (lt n 1) acc (count_to (- n 1) (+ acc 1))))
+
+; an equal lambda is compiled anonymously first, count_to still gets
+; its own entry for static calls
+(defun constantly (x) (lambda (y) x))
+(set get_count_to (constantly count_to))
+
+(defun main ()
+  (test (list (six 1 (inc 1) 3 (inc 3) 5 (inc 5))
+              (seven 1 2 (inc 2) 4 5 6 (inc 6))
+              (swap 3 0 10)
+              ((get_count_to 0) 5 1)
+              (count_to 7 0))
+        '((1 2 3 4 5 6) (1 2 3 4 5 6 7) (11 2) 6 7)))
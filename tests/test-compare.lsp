@@ -0,0 +1,24 @@
+; 2^58 - 1 is the largest fixnum
+(set M 288230376151711743)
+
+(defun sign (x)
+  (if (lt x 0) (- 0 1) (if (gt x 0) 1 0)))
+
+(defun between (x a b)
+  (if (not (lt x a)) (not (gt x b)) #nil))
+
+(defun bit (x) (if x 1 0))
+
+(defun main ()
+  (test (list (sign (- 0 5)) (sign 0) (sign 5)
+              (bit (between 3 1 5)) (bit (between 7 1 5))
+              (bit (le 2 2)) (bit (ge 1 2)) (bit (eq '(1 2) (list 1 2)))
+              (if (not (not (eq 3 3))) 1 0)
+              (/ 7 (- 0 2)) (mod 7 (- 0 2)) (mod (- 0 7) 3)
+              (- (+ M 1) M) (bit (lt M (+ M 1))) (* (- 0 4) (- 0 5)))
+        (list (- 0 1) 0 1
+              1 0
+              1 0 1
+              1
+              (- 0 4) (- 0 1) 2
+              1 1 20)))
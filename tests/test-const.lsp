@@ -0,0 +1,13 @@
+; 2^58 is boxed, all other integers here are fixnums
+(defun nested ()
+  '(1 (2 "two" (3)) "exactly 16 chars" 288230376151711744 #t))
+
+(defun count (L n)
+  (if L (count (tail L) (inc n)) n))
+
+(defun main ()
+  (test (list (count (nested) 0) (head (tail (nested)))
+              (head (tail (tail (nested))))
+              (- (head (tail (tail (tail (nested))))) 288230376151711743)
+              (if (head (tail (tail (tail (tail (nested)))))) 1 0))
+        '(5 (2 "two" (3)) "exactly 16 chars" 1 1)))
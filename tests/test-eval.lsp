@@ -0,0 +1,23 @@
+(defun power_code (n)
+  (if (eq n 0)
+    1
+    (list '* 'x (power_code (- n 1)))))
+
+(defun power (n)
+  (eval (list 'lambda '(x) (power_code n))))
+
+(defun count_down (n)
+  (eval (list '(lambda (f n) (f f n))
+              '(lambda (f n) (if (eq n 0) "done" (f f (- n 1))))
+              n)))
+
+(defun main ()
+  (test (list (eval '(+ 1 2))
+              (eval '(if (lt 1 2) "a" "b"))
+              (eval ''x)
+              (map (power 3) '(1 2 3))
+              (count_down 1000)
+              (count_down 1000000)
+              (eval (list 'vector_ref #(1 2 3) 1))
+              (map eval '((head '(4 5)) (string_length "abc"))))
+        '(3 "a" x (1 8 27) "done" "done" 2 (4 3))))
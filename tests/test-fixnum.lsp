@@ -0,0 +1,26 @@
+; 2^58 is the smallest integer that doesn't fit into a fixnum
+(set B 288230376151711744)
+
+; not folded at compile time, unlike literals
+(set ONE 1)
+(set FIVE 5)
+
+(defun neg (x) (- 0 x))
+
+(defun bit (x) (if x 1 0))
+
+; boxed literal operands must not take the inline fixnum path
+(defun add_big (x) (+ x 288230376151711744))
+(defun sub_big (x) (- 288230376151711744 x))
+(defun lt_big (x) (bit (lt x 288230376151711744)))
+(defun ge_big (x) (bit (ge x 288230376151711744)))
+
+(defun main ()
+  (test (list (neg 7) (/ (neg 7) 2) (mod (neg 7) 2) (* (neg 3) 4)
+	      (bit (lt (neg 1) 0)) (bit 0) (bit (eq 0 (- 5 5)))
+	      (bit (eq (+ (- B 1) 1) B)) (- (+ B B) B) (/ (* B 4) B)
+	      (add_big (neg ONE)) (sub_big ONE) (lt_big FIVE) (ge_big FIVE))
+	(list (neg 7) (neg 4) 1 (neg 12)
+	      1 1 1
+	      1 B 4
+	      (- B 1) (- B 1) 1 0)))
@@ -0,0 +1,11 @@
+(defun sq (x) (* x x))
+
+(defun twice (f x) (f (f x)))
+
+(defun pick (x)
+  (if (eq 'a 'a) (sq x) (sq (sq x))))
+
+(defun main ()
+  (test (list (pick 3) (sq (+ 1 (head '(2)))) (twice sq 3)
+              (if "" 1 2) (* 2 3) (tail (list 1 2)))
+        '(9 9 81 2 6 (2))))
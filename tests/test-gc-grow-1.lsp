@@ -0,0 +1,13 @@
+; live data outgrowing a heap of 8 MiB (see Makefile): growing the heap
+; after a major collection must not count the rest of the old segment
+(defun build (n acc)
+  (if (eq n 0)
+    acc
+    (build (- n 1) (cons n acc))))
+
+(defun sum (L acc)
+  (if L (sum (tail L) (+ acc (head L))) acc))
+
+(defun main ()
+  (test (sum (build 800000 #NIL) 0)
+        320000400000))
@@ -0,0 +1,13 @@
+; live data outgrowing a heap of 1 MiB (see Makefile): a minor
+; collection has to grow the heap while it copies
+(defun build (n acc)
+  (if (eq n 0)
+    acc
+    (build (- n 1) (cons n acc))))
+
+(defun sum (L acc)
+  (if L (sum (tail L) (+ acc (head L))) acc))
+
+(defun main ()
+  (test (sum (build 300000 #NIL) 0)
+        45000150000))
@@ -0,0 +1,27 @@
+; strings of characters with the high bit set, promoted and dropped again
+; so that the sweep of the old generation meets dead ones
+(set S (string_append "ÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿ" "ÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿ"
+                       "ÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿ" "ÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿÿ"))
+
+(defun strings (n acc)
+  (if (eq n 0)
+    acc
+    (strings (- n 1) (cons (string_append S S) acc))))
+
+(defun churn (n total)
+  (if (eq n 0)
+    total
+    (churn (- n 1) (+ total (length (strings 6000 #NIL))))))
+
+(defun intact (L)
+  (if L
+    (if (eq (head L) (string_append S S)) (intact (tail L)) #NIL)
+    #T))
+
+; L stays alive while the collections run
+(defun check (L)
+  (list (churn 100 0) (if (intact L) 1 0)))
+
+(defun main ()
+  (test (check (strings 1000 #NIL))
+        '(600000 1)))
@@ -0,0 +1,18 @@
+(defmemo fib (n)
+  (if (lt n 2)
+    n
+    (+ (fib (- n 1)) (fib (- n 2)))))
+
+(defmemo paths (a b)
+  (if (eq a #nil)
+    1
+    (if (eq b #nil)
+      1
+      (+ (paths (tail a) b) (paths a (tail b))))))
+
+(defmemo greet (s) (list s (length s)))
+
+(defun main ()
+  (test (list (fib 90) (paths (range 0 16) (range 0 16))
+              (greet '(1 "a")) (greet (list 1 "a")))
+        '(2880067194370816120 601080390 ((1 "a") 2) ((1 "a") 2))))
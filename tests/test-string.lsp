@@ -0,0 +1,23 @@
+(defun join (L sep)
+  (if (tail L)
+    (string_append (head L) sep (join (tail L) sep))
+    (head L)))
+
+(defun reverse_string (s)
+  (_reverse_string (string_to_list s) ""))
+(defun _reverse_string (L acc)
+  (if L (_reverse_string (tail L) (string_append (head L) acc)) acc))
+
+(defun main ()
+  (test (list (string_length "hello, world")
+              (string_length "")
+              (string_append "abc" "" "defghijk" "l")
+              (string_append)
+              (substring "hello, world" 7 12)
+              (substring "abc" 1 1)
+              (string_to_list "abc")
+              (join (list "a" "bb" "ccc") ", ")
+              (reverse_string "0123456789abcdef")
+              (if (eq (substring "abcdefghij" 2 10) "cdefghij") 1 0))
+        '(12 0 "abcdefghijkl" "" "world" "" ("a" "b" "c") "a, bb, ccc"
+          "fedcba9876543210" 1)))
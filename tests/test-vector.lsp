@@ -0,0 +1,18 @@
+(defun vector_sum (v i acc)
+  (if (lt i (vector_length v))
+    (vector_sum v (+ i 1) (+ acc (vector_ref v i)))
+    acc))
+
+(defun squares (n)
+  (list_to_vector (map (lambda (x) (* x x)) (range 0 n))))
+
+(defun main ()
+  (test (list (vector_ref #(10 20 30) 2)
+              (vector_length (make_vector 5 "y"))
+              (vector_sum (squares 100) 0 0)
+              (vector_ref (squares 100) 99)
+              (vector_to_list (make_vector 3 "x"))
+              (list_to_vector '((1 2) "a"))
+              (if (eq #(1 (2 3)) (list_to_vector (list 1 (list 2 3)))) 1 0)
+              (vector_length #()))
+        '(30 5 328350 9801 ("x" "x" "x") #((1 2) "a") 1 0)))